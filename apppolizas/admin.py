@@ -2,9 +2,19 @@ from django.contrib import admin
 
 # ... otros imports
 from .models import Bien  # Asegúrate de importar Bien
-from .models import (Aseguradora, Broker, DocumentoPoliza, DocumentoSiniestro,
-                     Factura, Finiquito, Notificacion, Poliza,
-                     ResponsableCustodio, Siniestro, Usuario)
+from .models import (
+    Aseguradora,
+    Broker,
+    DocumentoPoliza,
+    DocumentoSiniestro,
+    Factura,
+    Finiquito,
+    Notificacion,
+    Poliza,
+    ResponsableCustodio,
+    Siniestro,
+    Usuario,
+)
 
 
 @admin.register(Bien)
@@ -40,7 +50,12 @@ class BrokerAdmin(admin.ModelAdmin):
 
 @admin.register(ResponsableCustodio)
 class CustodioAdmin(admin.ModelAdmin):
-    list_display = ("nombre_completo", "identificacion", "departamento")
+    list_display = (
+        "nombre_completo",
+        "identificacion",
+        "departamento",
+        "bienes_activos",
+    )
     search_fields = ("nombre_completo", "identificacion")
 
 
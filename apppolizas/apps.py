@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class ApppolizasConfig(AppConfig):
     name = "apppolizas"
+
+    def ready(self):
+        # Registra las señales del índice de custodios y de las cachés
+        from . import busqueda, services  # noqa: F401
@@ -0,0 +1,50 @@
+"""
+Manejador de logs en cola.
+
+`ManejadorCola` se configura en LOGGING como cualquier otro handler pero no
+escribe nada en el hilo de la petición: formatea el registro, lo deja en una
+cola en memoria y un QueueListener (un hilo por manejador) hace la escritura
+real con el handler de destino (consola, archivo rotativo, ...).
+
+    "consola": {
+        "()": "apppolizas.bitacora.ManejadorCola",
+        "destino": "logging.StreamHandler",
+        "formatter": "simple",
+    }
+
+Los demás parámetros se pasan tal cual al constructor del destino
+(filename, maxBytes, ...). Los mensajes de nivel inferior al del logger ni
+siquiera llegan aquí: usar siempre logger.debug("... %s", valor) y no
+f-strings, así el texto solo se arma si el nivel está activo.
+"""
+
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+from django.utils.module_loading import import_string
+
+
+class ManejadorCola(QueueHandler):
+    def __init__(self, destino, **opciones):
+        super().__init__(queue.SimpleQueue())
+        self.destino = import_string(destino)(**opciones)
+        # El registro llega ya formateado (QueueHandler.prepare): el destino
+        # solo lo escribe
+        self.destino.setFormatter(logging.Formatter("%(message)s"))
+        self.escucha = QueueListener(self.queue, self.destino)
+        self.escucha.start()
+        self._activa = True
+        atexit.register(self.cerrar_cola)
+
+    def cerrar_cola(self):
+        """Vacía lo pendiente y detiene el hilo (idempotente)"""
+        if self._activa:
+            self._activa = False
+            self.escucha.stop()
+            self.destino.close()
+
+    def close(self):
+        self.cerrar_cola()
+        super().close()
@@ -0,0 +1,209 @@
+"""
+Índice en memoria para el autocompletado de custodios.
+
+Se carga una vez por proceso (worker) y se mantiene al día con las
+señales post_save/post_delete de ResponsableCustodio, de modo que cada
+pulsación del buscador se responde sin consultar la base de datos.
+La búsqueda ignora tildes y mayúsculas ("Ramon" encuentra "Ramón").
+
+Los cambios hechos en otro worker llegan por la versión guardada en la caché
+compartida (CACHES). Además el índice se recarga entero cada
+INDICE_CUSTODIOS_TTL segundos, lo que acota lo que puede quedar desfasado
+si la caché no es compartida o un cambio no pasó por las señales.
+"""
+
+import bisect
+import heapq
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ResponsableCustodio
+
+# Clave compartida para avisar a otros workers que su índice quedó viejo
+CLAVE_VERSION = "custodios:indice:version"
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes: 'Ramón Núñez' -> 'ramon nunez'"""
+    descompuesto = unicodedata.normalize("NFKD", texto or "")
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).casefold()
+
+
+def trigramas(texto):
+    return {texto[i : i + 3] for i in range(len(texto) - 2)}
+
+
+class IndiceCustodios:
+    """
+    Índice de trigramas para subcadenas de 3+ letras y lista ordenada de
+    palabras para prefijos cortos (1-2 letras).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._vence = 0.0  # time.monotonic() en que toca recargar
+        self._custodios = {}  # id -> (nombre, identificacion, texto normalizado)
+        self._trigramas = defaultdict(set)
+        self._palabras = []  # [(palabra normalizada, id)] ordenada
+
+    # ---------------- Carga y mantenimiento ----------------
+
+    def cargar(self):
+        filas = ResponsableCustodio.objects.values_list(
+            "id", "nombre_completo", "identificacion"
+        )
+        custodios, tri, palabras = {}, defaultdict(set), []
+        for pk, nombre, identificacion in filas.iterator(chunk_size=2000):
+            texto = self._indexar(pk, nombre, identificacion, custodios, tri)
+            palabras.extend((p, pk) for p in texto.split())
+        palabras.sort()
+
+        with self._lock:
+            self._custodios, self._trigramas, self._palabras = custodios, tri, palabras
+            self._version = cache.get_or_set(CLAVE_VERSION, 0)
+            self._vence = time.monotonic() + getattr(
+                settings, "INDICE_CUSTODIOS_TTL", 60
+            )
+
+    def agregar(self, pk, nombre, identificacion):
+        with self._lock:
+            if self._version is None:
+                return  # Aún no se carga: la carga inicial lo incluirá
+            self._quitar(pk)
+            texto = self._indexar(
+                pk, nombre, identificacion, self._custodios, self._trigramas
+            )
+            for palabra in texto.split():
+                bisect.insort(self._palabras, (palabra, pk))
+
+    def quitar(self, pk):
+        with self._lock:
+            self._quitar(pk)
+
+    def registrar_cambio(self):
+        """Sube la versión compartida; este proceso ya aplicó el cambio"""
+        try:
+            version = cache.incr(CLAVE_VERSION)
+        except ValueError:
+            version = 1
+            cache.set(CLAVE_VERSION, version)
+        with self._lock:
+            if self._version is not None:
+                self._version = version
+
+    def invalidar(self):
+        """Obliga a recargar en la próxima búsqueda (ej. tras un bulk_create)"""
+        with self._lock:
+            self._version = None
+
+    @staticmethod
+    def _indexar(pk, nombre, identificacion, custodios, tri):
+        texto = f"{normalizar(nombre)} {normalizar(identificacion)}"
+        custodios[pk] = (nombre, identificacion, texto)
+        for t in trigramas(texto):
+            tri[t].add(pk)
+        return texto
+
+    def _quitar(self, pk):
+        anterior = self._custodios.pop(pk, None)
+        if anterior is None:
+            return
+        texto = anterior[2]
+        for t in trigramas(texto):
+            ids = self._trigramas.get(t)
+            if ids is not None:
+                ids.discard(pk)
+                if not ids:
+                    del self._trigramas[t]
+        for palabra in texto.split():
+            i = bisect.bisect_left(self._palabras, (palabra, pk))
+            if i < len(self._palabras) and self._palabras[i] == (palabra, pk):
+                del self._palabras[i]
+
+    def _asegurar_vigente(self):
+        if (
+            self._version is None
+            or time.monotonic() >= self._vence
+            or self._version != cache.get(CLAVE_VERSION)
+        ):
+            self.cargar()
+
+    # ---------------- Consulta ----------------
+
+    def buscar(self, termino, limite=10):
+        """Devuelve [(id, nombre_completo, identificacion)] ordenados por nombre"""
+        self._asegurar_vigente()
+        consulta = normalizar(termino).strip()
+
+        with self._lock:
+            if not consulta:
+                candidatos = self._custodios.keys()
+            elif len(consulta) < 3:
+                candidatos = self._por_prefijo(consulta)
+            else:
+                candidatos = self._por_trigramas(consulta)
+
+            # Primero los que empiezan por el término, luego por nombre
+            encontrados = heapq.nsmallest(
+                limite,
+                candidatos,
+                key=lambda pk: (
+                    not self._custodios[pk][2].startswith(consulta),
+                    self._custodios[pk][2],
+                ),
+            )
+            return [
+                (pk, self._custodios[pk][0], self._custodios[pk][1])
+                for pk in encontrados
+            ]
+
+    def _por_prefijo(self, consulta):
+        ids = set()
+        i = bisect.bisect_left(self._palabras, (consulta,))
+        while i < len(self._palabras) and self._palabras[i][0].startswith(consulta):
+            ids.add(self._palabras[i][1])
+            i += 1
+        return ids
+
+    def _por_trigramas(self, consulta):
+        conjuntos = sorted(
+            (self._trigramas.get(t, set()) for t in trigramas(consulta)), key=len
+        )
+        ids = set(conjuntos[0]).intersection(*conjuntos[1:])
+        # Los trigramas solo filtran: confirmamos la subcadena completa
+        return {pk for pk in ids if consulta in self._custodios[pk][2]}
+
+
+indice_custodios = IndiceCustodios()
+
+
+@receiver(post_save, sender=ResponsableCustodio)
+def actualizar_indice_custodio(sender, instance, **kwargs):
+    datos = (instance.pk, instance.nombre_completo, instance.identificacion)
+
+    def aplicar():
+        indice_custodios.agregar(*datos)
+        indice_custodios.registrar_cambio()
+
+    # Si la transacción se revierte, el índice no debe ver el cambio
+    transaction.on_commit(aplicar)
+
+
+@receiver(post_delete, sender=ResponsableCustodio)
+def quitar_del_indice_custodio(sender, instance, **kwargs):
+    pk = instance.pk
+
+    def aplicar():
+        indice_custodios.quitar(pk)
+        indice_custodios.registrar_cambio()
+
+    transaction.on_commit(aplicar)
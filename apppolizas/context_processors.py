@@ -0,0 +1,18 @@
+from django.utils.functional import SimpleLazyObject
+
+from .services import NotificacionService
+
+
+def notificaciones(request):
+    """
+    Expone `notificaciones_no_leidas` para el badge del menú. Es perezoso:
+    las páginas que no pintan el badge no consultan ni la caché.
+    """
+    usuario = getattr(request, "user", None)
+    if usuario is None or not usuario.is_authenticated:
+        return {}
+    return {
+        "notificaciones_no_leidas": SimpleLazyObject(
+            lambda: NotificacionService.contar_no_leidas(usuario)
+        )
+    }
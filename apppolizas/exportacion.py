@@ -0,0 +1,66 @@
+"""
+Exportación CSV en streaming.
+
+Las filas llegan por bloques paginados por id (ver
+repositories.recorrer_por_id) y se convierten a bytes por trozos, de modo que la respuesta empieza a enviarse de inmediato y la
+memoria no crece con el número de filas. Opcionalmente se comprimen con
+gzip sobre la marcha.
+"""
+
+import csv
+import zlib
+
+# Filas que se juntan antes de entregar un trozo a la respuesta
+FILAS_POR_TROZO = 500
+# Filas que trae cada consulta a la base de datos
+TAMANO_CURSOR = 2000
+
+# Una celda que empieza así puede ejecutarse como fórmula en Excel
+PREFIJOS_FORMULA = ("=", "+", "-", "@")
+
+
+class _Eco:
+    """Pseudo-archivo: csv.writer devuelve la línea en lugar de guardarla"""
+
+    def write(self, valor):
+        return valor
+
+
+def celda(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, bool):
+        return "Sí" if valor else "No"
+    if isinstance(valor, str) and valor.startswith(PREFIJOS_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def lineas_csv(encabezados, filas):
+    """Genera el CSV en bytes UTF-8 (con BOM para que Excel respete tildes)"""
+    escritor = csv.writer(_Eco())
+    yield ("\ufeff" + escritor.writerow(encabezados)).encode("utf-8")
+
+    trozo = []
+    for fila in filas:
+        trozo.append(escritor.writerow([celda(v) for v in fila]))
+        if len(trozo) >= FILAS_POR_TROZO:
+            yield "".join(trozo).encode("utf-8")
+            trozo = []
+    if trozo:
+        yield "".join(trozo).encode("utf-8")
+
+
+def comprimir_gzip(trozos, nivel=6):
+    """Comprime un flujo de bytes en formato gzip sin acumularlo"""
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    primero = True
+    for trozo in trozos:
+        datos = compresor.compress(trozo)
+        if primero:
+            # El encabezado sale enseguida: el navegador empieza la descarga
+            datos += compresor.flush(zlib.Z_SYNC_FLUSH)
+            primero = False
+        if datos:
+            yield datos
+    yield compresor.flush()
@@ -0,0 +1,135 @@
+"""
+Motor de cálculo de facturas, sin acceso a la base de datos.
+
+Concentra la matemática que antes vivía en Factura.save (contribución a la
+Superintendencia, Seguro Campesino, derechos de emisión, IVA, descuento por
+pronto pago y valor a pagar) para que la usen por igual el guardado fila a
+fila y las rutas masivas (bulk_create / bulk_update), que no pasan por save().
+"""
+
+from bisect import bisect_left
+from decimal import ROUND_HALF_EVEN, Decimal
+from typing import NamedTuple
+
+CENTAVOS = Decimal("0.01")
+
+TASA_SUPER = Decimal("0.035")
+TASA_CAMPESINO = Decimal("0.005")
+TASA_IVA = Decimal("0.15")
+TASA_PRONTO_PAGO = Decimal("0.05")
+DIAS_PRONTO_PAGO = 20
+
+# Derechos de emisión: prima <= límite -> valor; por encima del último, 9.00
+LIMITES_DERECHOS = (250, 500, 1000, 2000, 4000)
+VALORES_DERECHOS = (
+    Decimal("0.50"),
+    Decimal("1.00"),
+    Decimal("3.00"),
+    Decimal("5.00"),
+    Decimal("7.00"),
+    Decimal("9.00"),
+)
+
+# Campos de Factura que escribe el cálculo
+CAMPOS_CALCULADOS = (
+    "contribucion_super",
+    "seguro_campesino",
+    "derechos_emision",
+    "base_imponible",
+    "iva",
+    "total_facturado",
+    "descuento_pronto_pago",
+    "valor_a_pagar",
+    "mensaje_resultado",
+)
+
+
+class ValoresFactura(NamedTuple):
+    contribucion_super: Decimal
+    seguro_campesino: Decimal
+    derechos_emision: Decimal
+    base_imponible: Decimal
+    iva: Decimal
+    total_facturado: Decimal
+    descuento_pronto_pago: Decimal
+    valor_a_pagar: Decimal
+    mensaje_resultado: str
+
+
+def redondear(valor):
+    # Igual que round(Decimal, 2): redondeo bancario
+    return valor.quantize(CENTAVOS, rounding=ROUND_HALF_EVEN)
+
+
+def derechos_emision(prima):
+    return VALORES_DERECHOS[bisect_left(LIMITES_DERECHOS, prima)]
+
+
+def descuento_pronto_pago(prima, fecha_emision, fecha_pago):
+    if fecha_pago and fecha_emision:
+        if (fecha_pago - fecha_emision).days <= DIAS_PRONTO_PAGO:
+            return prima * TASA_PRONTO_PAGO
+    return Decimal("0.00")
+
+
+def calcular(prima, fecha_emision=None, fecha_pago=None, retenciones=0, pagado=False):
+    """Valores calculados de una factura"""
+    return calcular_lote(
+        [prima], [fecha_emision], [fecha_pago], [retenciones], [pagado]
+    )[0]
+
+
+def calcular_lote(primas, fechas_emision, fechas_pago, retenciones, pagados):
+    """
+    Cálculo por columnas para muchas facturas a la vez: cada paso recorre
+    la lista completa, sin objetos intermedios por fila.
+    Devuelve una lista de ValoresFactura en el mismo orden.
+    """
+    primas = [Decimal(p) for p in primas]
+    retenciones = [Decimal(r or 0) for r in retenciones]
+
+    supers = [redondear(p * TASA_SUPER) for p in primas]
+    campesinos = [redondear(p * TASA_CAMPESINO) for p in primas]
+    derechos = [derechos_emision(p) for p in primas]
+    bases = [p + s + c + d for p, s, c, d in zip(primas, supers, campesinos, derechos)]
+    ivas = [redondear(b * TASA_IVA) for b in bases]
+    totales = [b + i for b, i in zip(bases, ivas)]
+    descuentos = [
+        redondear(descuento_pronto_pago(p, fe, fp))
+        for p, fe, fp in zip(primas, fechas_emision, fechas_pago)
+    ]
+    a_pagar = [t - r - d for t, r, d in zip(totales, retenciones, descuentos)]
+    mensajes = [
+        "Pagado" if pagado else "Saldado" if valor <= 0 else "Pendiente"
+        for pagado, valor in zip(pagados, a_pagar)
+    ]
+    return [
+        ValoresFactura(*fila)
+        for fila in zip(
+            supers,
+            campesinos,
+            derechos,
+            bases,
+            ivas,
+            totales,
+            descuentos,
+            a_pagar,
+            mensajes,
+        )
+    ]
+
+
+def aplicar_lote(facturas):
+    """Calcula y asigna los campos de muchas instancias de Factura (sin guardar)"""
+    facturas = list(facturas)
+    valores = calcular_lote(
+        [f.prima for f in facturas],
+        [f.fecha_emision for f in facturas],
+        [f.fecha_pago for f in facturas],
+        [f.retenciones for f in facturas],
+        [f.pagado for f in facturas],
+    )
+    for factura, calculados in zip(facturas, valores):
+        for campo, valor in zip(CAMPOS_CALCULADOS, calculados):
+            setattr(factura, campo, valor)
+    return facturas
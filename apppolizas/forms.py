@@ -1,7 +1,19 @@
+import logging
+
 from django import forms
 
-from .models import (Aseguradora, Bien, Broker, Factura, Finiquito, Poliza,
-                     ResponsableCustodio, Siniestro)
+from .models import (
+    Aseguradora,
+    Bien,
+    Broker,
+    Factura,
+    Finiquito,
+    Poliza,
+    ResponsableCustodio,
+    Siniestro,
+)
+
+logger = logging.getLogger(__name__)
 
 
 class LoginForm(forms.Form):
@@ -129,38 +141,25 @@ class SiniestroForm(forms.ModelForm):
     )
 
     def clean(self):
-        print("=== INICIANDO VALIDACIÓN DEL FORMULARIO SINIESTRO ===")
         cleaned_data = super().clean()
-        print(f"Cleaned data inicial: {cleaned_data}")
 
         custodio = cleaned_data.get("custodio")
         bien = cleaned_data.get("bien")
 
-        print(f"Custodio seleccionado: {custodio}")
-        print(f"Bien seleccionado: {bien}")
-
         if custodio and bien:
-            print(f"Verificando si el bien {bien} pertenece al custodio {custodio}")
-            print(f"Bien.custodio: {bien.custodio}")
-            print(f"Custodio: {custodio}")
-            print(f"¿Son iguales?: {bien.custodio == custodio}")
-
             # Validar que el bien pertenezca realmente a ese custodio
-            if bien.custodio != custodio:
+            if bien.custodio_id != custodio.pk:
+                logger.debug(
+                    "Bien %s no pertenece al custodio %s", bien.pk, custodio.pk
+                )
                 error_msg = f"Error de Integridad: El bien '{bien.detalle}' no está registrado a nombre del custodio {custodio.nombre_completo}."
-                print(f"❌ ERROR DE VALIDACIÓN: {error_msg}")
                 raise forms.ValidationError(error_msg)
-            else:
-                print("✅ Validación de integridad OK")
             # Validar que el bien esté activo
             if bien.estado_operativo == "INACTIVO":
+                logger.debug("Bien %s inactivo", bien.pk)
                 error_msg = f"El bien '{bien.detalle}' está inactivo y no se le puede registrar un siniestro."
-                print(f"❌ ERROR DE VALIDACIÓN: {error_msg}")
                 raise forms.ValidationError(error_msg)
-        else:
-            print("⚠️ Faltan custodio o bien para validar integridad")
 
-        print("=== VALIDACIÓN DEL FORMULARIO COMPLETADA ===")
         return cleaned_data
 
     class Meta:
@@ -307,38 +306,25 @@ class SiniestroEditForm(forms.ModelForm):
     )
 
     def clean(self):
-        print("=== INICIANDO VALIDACIÓN DEL FORMULARIO DE EDICIÓN SINIESTRO ===")
         cleaned_data = super().clean()
-        print(f"Cleaned data inicial: {cleaned_data}")
 
         custodio = cleaned_data.get("custodio")
         bien = cleaned_data.get("bien")
 
-        print(f"Custodio seleccionado: {custodio}")
-        print(f"Bien seleccionado: {bien}")
-
         if custodio and bien:
-            print(f"Verificando si el bien {bien} pertenece al custodio {custodio}")
-            print(f"Bien.custodio: {bien.custodio}")
-            print(f"Custodio: {custodio}")
-            print(f"¿Son iguales?: {bien.custodio == custodio}")
-
             # Validar que el bien pertenezca realmente a ese custodio
-            if bien.custodio != custodio:
+            if bien.custodio_id != custodio.pk:
+                logger.debug(
+                    "Bien %s no pertenece al custodio %s", bien.pk, custodio.pk
+                )
                 error_msg = f"Error de Integridad: El bien '{bien.detalle}' no está registrado a nombre del custodio {custodio.nombre_completo}."
-                print(f"❌ ERROR DE VALIDACIÓN: {error_msg}")
                 raise forms.ValidationError(error_msg)
-            else:
-                print("✅ Validación de integridad OK")
             # Validar que el bien esté activo
             if bien.estado_operativo == "INACTIVO":
+                logger.debug("Bien %s inactivo", bien.pk)
                 error_msg = f"El bien '{bien.detalle}' está inactivo y no se le puede registrar un siniestro."
-                print(f"❌ ERROR DE VALIDACIÓN: {error_msg}")
                 raise forms.ValidationError(error_msg)
-        else:
-            print("⚠️ Faltan custodio o bien para validar integridad")
 
-        print("=== VALIDACIÓN DEL FORMULARIO DE EDICIÓN COMPLETADA ===")
         return cleaned_data
 
     class Meta(SiniestroForm.Meta):
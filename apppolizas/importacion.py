@@ -0,0 +1,142 @@
+"""
+Lectura en streaming de hojas de cálculo (CSV o XLSX) para las cargas masivas.
+
+Las filas se entregan una a una como diccionarios {columna: valor} con los
+encabezados normalizados ("Cédula" -> "cedula"), así el archivo nunca se
+carga entero en memoria. Los XLSX se leen con openpyxl (requirements.txt).
+"""
+
+import csv
+import io
+from collections import Counter
+from itertools import islice
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+
+from .busqueda import normalizar
+
+
+class ResultadoImportacion:
+    """Registros guardados por modelo y errores por número de fila"""
+
+    def __init__(self):
+        self.guardados = Counter()
+        self.errores = []  # [(fila, mensaje)]
+
+    def error(self, fila, mensaje):
+        self.errores.append((fila, mensaje))
+
+    @property
+    def filas_con_error(self):
+        return len({fila for fila, _ in self.errores})
+
+
+def normalizar_encabezado(texto):
+    return "_".join(normalizar(str(texto or "")).split())
+
+
+def leer_filas(archivo, nombre):
+    """
+    Genera (numero_fila, datos) para cada fila con datos. `archivo` es un
+    binario abierto (archivo en disco o UploadedFile); `nombre` decide el
+    formato por la extensión. La fila 1 es el encabezado.
+    """
+    extension = nombre.rsplit(".", 1)[-1].lower()
+    if extension == "csv":
+        filas = _filas_csv(archivo)
+    elif extension == "xlsx":
+        filas = _filas_xlsx(archivo)
+    else:
+        raise ValidationError(f"Formato no soportado: .{extension} (use CSV o XLSX)")
+
+    encabezados = [normalizar_encabezado(c) for c in next(filas, [])]
+    for numero, valores in enumerate(filas, start=2):
+        datos = {
+            columna: str(valor).strip()
+            for columna, valor in zip(encabezados, valores)
+            if columna and valor is not None and str(valor).strip()
+        }
+        if datos:
+            yield numero, datos
+
+
+def en_lotes(filas, tamano_lote):
+    filas = iter(filas)
+    while lote := list(islice(filas, tamano_lote)):
+        yield lote
+
+
+def procesar_por_lotes(filas, tamano_lote, procesar, resultado):
+    """
+    Llama a procesar(lote, resultado) con cada lote en su propia transacción.
+    Si la base de datos rechaza un lote, sus filas quedan como error y la
+    carga sigue con el siguiente.
+    """
+    for lote in en_lotes(filas, tamano_lote):
+        try:
+            with transaction.atomic():
+                procesar(lote, resultado)
+        except DatabaseError as e:
+            for fila, _ in lote:
+                resultado.error(fila, f"Lote rechazado por la base de datos: {e}")
+    resultado.errores.sort()
+    return resultado
+
+
+# Conversión de celdas con los mismos campos que usan los formularios.
+# XLSX entrega las fechas como "2025-01-31 00:00:00".
+_FECHA = forms.DateField(
+    input_formats=["%Y-%m-%d", "%d/%m/%Y", "%Y-%m-%d %H:%M:%S"], required=False
+)
+_DECIMAL = forms.DecimalField(max_digits=15, decimal_places=2, required=False)
+VERDADEROS = {"1", "si", "s", "x", "true", "verdadero"}
+
+
+def a_fecha(valor, columna):
+    try:
+        return _FECHA.clean(valor)
+    except ValidationError:
+        raise ValidationError(f"'{columna}' no es una fecha válida: {valor}")
+
+
+def a_decimal(valor, columna):
+    try:
+        return _DECIMAL.clean(valor)
+    except ValidationError:
+        raise ValidationError(f"'{columna}' no es un valor válido: {valor}")
+
+
+def a_booleano(valor):
+    return normalizar(valor or "") in VERDADEROS
+
+
+def _filas_csv(archivo):
+    # utf-8-sig descarta el BOM que agrega Excel al exportar CSV
+    texto = io.TextIOWrapper(archivo, encoding="utf-8-sig", newline="")
+    try:
+        muestra = texto.read(4096)
+        texto.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+        except csv.Error:
+            dialecto = csv.excel
+        yield from csv.reader(texto, dialecto)
+    finally:
+        # El archivo es de quien llamó: no dejamos que el wrapper lo cierre
+        texto.detach()
+
+
+def _filas_xlsx(archivo):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValidationError(
+            "Para importar archivos XLSX instale openpyxl (o exporte la hoja a CSV)."
+        )
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        yield from libro.active.iter_rows(values_only=True)
+    finally:
+        libro.close()
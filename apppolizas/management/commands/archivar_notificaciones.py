@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from apppolizas.services import NotificacionService
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve las notificaciones leídas más antiguas que la retención "
+        "configurada a la tabla de archivo comprimida, por lotes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dias",
+            type=int,
+            default=None,
+            help="Antigüedad mínima (por defecto NOTIFICACIONES_RETENCION_DIAS)",
+        )
+        parser.add_argument(
+            "--lote", type=int, default=None, help="Filas por transacción"
+        )
+
+    def handle(self, *args, **options):
+        archivadas = NotificacionService.archivar_antiguas(
+            dias=options["dias"], tamano_lote=options["lote"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Notificaciones archivadas: {archivadas}")
+        )
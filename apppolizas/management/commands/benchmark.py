@@ -0,0 +1,320 @@
+import json
+import platform
+import time
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apppolizas.models import Factura, Poliza, Usuario
+from apppolizas.repositories import (
+    BienRepository,
+    FacturaRepository,
+    PolizaEstadisticaRepository,
+    PolizaRepository,
+    SiniestroRepository,
+)
+from apppolizas.services import CarteraSinteticaService, FacturaPDFService
+
+# Los PDFs de factura se cachean en el storage: se usa uno en memoria para
+# no escribir en MinIO
+STORAGE_EN_MEMORIA = {
+    "default": {"BACKEND": "django.core.files.storage.InMemoryStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+# Por debajo de esta diferencia (segundos) no se habla de regresión: es ruido
+PISO_RUIDO = 0.002
+
+
+class Command(BaseCommand):
+    help = (
+        "Siembra carteras sintéticas de varios tamaños y mide tiempo y número "
+        "de consultas de repositorios, listados, búsquedas AJAX, Factura.save "
+        "y PDFs. Guarda el resultado en JSON y lo compara con la línea base. "
+        "Por defecto trabaja en una base de datos temporal (como los tests)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--tamanos",
+            default="100,1000",
+            help="Pólizas a sembrar, separadas por comas (de menor a mayor)",
+        )
+        parser.add_argument("--repeticiones", type=int, default=3)
+        parser.add_argument("--semilla", type=int, default=42)
+        parser.add_argument(
+            "--base",
+            default="benchmark_base.json",
+            help="Línea base con la que se compara (JSON)",
+        )
+        parser.add_argument(
+            "--guardar",
+            action="store_true",
+            help="Sobrescribe la línea base con esta corrida",
+        )
+        parser.add_argument(
+            "--salida", help="Además escribe el resultado de esta corrida aquí"
+        )
+        parser.add_argument(
+            "--tolerancia",
+            type=float,
+            default=0.25,
+            help="Fracción de tiempo extra admitida antes de marcar regresión",
+        )
+        parser.add_argument(
+            "--estricto",
+            action="store_true",
+            help="Termina con error si hay regresiones",
+        )
+        parser.add_argument(
+            "--bd-actual",
+            action="store_true",
+            help="Usa la base configurada en lugar de una temporal (le agrega datos)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            tamanos = sorted({int(t) for t in options["tamanos"].split(",")})
+        except ValueError:
+            raise CommandError("--tamanos debe ser una lista de enteros: 100,1000")
+
+        if options["bd_actual"]:
+            resultado = self.correr(tamanos, options)
+        else:
+            nombre_original = connection.settings_dict["NAME"]
+            connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False
+            )
+            try:
+                resultado = self.correr(tamanos, options)
+            finally:
+                connection.creation.destroy_test_db(nombre_original, verbosity=0)
+
+        base = self.leer_base(options["base"])
+        regresiones = self.comparar(resultado, base, options["tolerancia"])
+
+        if options["salida"]:
+            self.escribir(options["salida"], resultado)
+        if options["guardar"]:
+            self.escribir(options["base"], resultado)
+            self.stdout.write(f"Línea base guardada en {options['base']}")
+
+        if regresiones:
+            self.stdout.write(self.style.WARNING(f"{regresiones} regresiones"))
+            if options["estricto"]:
+                raise CommandError(f"{regresiones} regresiones frente a la línea base")
+
+    def correr(self, tamanos, options):
+        resultado = {
+            "motor": connection.vendor,
+            "python": platform.python_version(),
+            "fecha": date.today().isoformat(),
+            "semilla": options["semilla"],
+            "repeticiones": options["repeticiones"],
+            "resultados": {},
+        }
+        with override_settings(
+            STORAGES=STORAGE_EN_MEMORIA, ALLOWED_HOSTS=["*"], PERFIL_CONSULTAS=False
+        ):
+            analista, admin = self.usuarios()
+            sembradas = Poliza.objects.count()
+            for tamano in tamanos:
+                if tamano > sembradas:
+                    inicio = time.perf_counter()
+                    CarteraSinteticaService.generar(
+                        tamano - sembradas, options["semilla"], [analista]
+                    )
+                    sembradas = tamano
+                    self.stdout.write(
+                        f"\nCartera de {tamano} pólizas "
+                        f"(sembrada en {time.perf_counter() - inicio:.1f} s)"
+                    )
+                casos = self.casos(analista, admin)
+                medidas = {
+                    nombre: self.medir(funcion, preparar, options["repeticiones"])
+                    for nombre, funcion, preparar in casos
+                }
+                resultado["resultados"][str(tamano)] = medidas
+        return resultado
+
+    @staticmethod
+    def usuarios():
+        analista, _ = Usuario.objects.get_or_create(
+            username="benchmark_analista", defaults={"rol": Usuario.ANALISTA}
+        )
+        admin, _ = Usuario.objects.get_or_create(
+            username="benchmark_admin", defaults={"rol": Usuario.ADMINISTRADOR}
+        )
+        return analista, admin
+
+    def casos(self, analista, admin):
+        """[(nombre, función, preparar)]; `preparar` corre antes de cada medición"""
+        cliente = Client()
+        cliente.force_login(analista)
+        cliente_admin = Client()
+        cliente_admin.force_login(admin)
+        factura = Factura.objects.order_by("id").first()
+        poliza_id = factura.poliza_id
+
+        def get(cliente, nombre, *args, **parametros):
+            url = reverse(nombre, args=args)
+
+            def pedir():
+                response = cliente.get(url, parametros)
+                if response.status_code != 200:
+                    raise CommandError(f"{url} respondió {response.status_code}")
+                if response.streaming:
+                    b"".join(response.streaming_content)
+
+            return pedir
+
+        def guardar_factura():
+            Factura(
+                poliza_id=poliza_id,
+                numero_factura=f"BENCH-{time.time_ns()}",
+                fecha_emision=date.today(),
+                prima=Decimal("1234.56"),
+            ).save()
+
+        def sin_pdf_cacheado():
+            cache.clear()
+            FacturaPDFService.invalidar(factura.pk)
+
+        hoy = date.today()
+        return [
+            ("repo.polizas.pagina", PolizaRepository.get_pagina, cache.clear),
+            (
+                "repo.polizas.indicadores",
+                lambda: PolizaRepository.get_indicadores(hoy),
+                cache.clear,
+            ),
+            ("repo.siniestros.pagina", SiniestroRepository.get_pagina, cache.clear),
+            (
+                "repo.siniestros.busqueda",
+                lambda: SiniestroRepository.get_pagina(busqueda="Robo"),
+                cache.clear,
+            ),
+            ("repo.facturas.pagina", FacturaRepository.get_pagina, cache.clear),
+            (
+                "repo.bienes.buscar",
+                lambda: BienRepository.buscar("laptop"),
+                cache.clear,
+            ),
+            (
+                "repo.estadisticas.mas_siniestrada",
+                PolizaEstadisticaRepository.get_mas_siniestrada,
+                cache.clear,
+            ),
+            (
+                "vista.dashboard_analista",
+                get(cliente, "dashboard_analista"),
+                cache.clear,
+            ),
+            (
+                "vista.dashboard_admin",
+                get(cliente_admin, "dashboard_admin"),
+                cache.clear,
+            ),
+            ("vista.polizas", get(cliente, "polizas_list"), cache.clear),
+            ("vista.siniestros", get(cliente, "siniestros"), cache.clear),
+            ("vista.facturas", get(cliente, "lista_facturas"), cache.clear),
+            ("vista.custodios", get(cliente, "custodios_list"), cache.clear),
+            (
+                "ajax.buscar_custodios",
+                get(cliente, "buscar_custodios_ajax", term="sintetico"),
+                cache.clear,
+            ),
+            (
+                "ajax.buscar_bienes",
+                get(cliente, "buscar_bienes_ajax", term="laptop"),
+                cache.clear,
+            ),
+            ("modelo.factura.save", guardar_factura, cache.clear),
+            (
+                "pdf.factura",
+                get(cliente, "generar_pdf_factura", factura.pk),
+                sin_pdf_cacheado,
+            ),
+            (
+                "pdf.reporte_general",
+                get(cliente_admin, "reporte_general_pdf"),
+                cache.clear,
+            ),
+        ]
+
+    @staticmethod
+    def medir(funcion, preparar, repeticiones):
+        # Mejor tiempo de varias corridas (aísla el ruido del sistema); las
+        # consultas son las de la última, que no dependen de la suerte
+        tiempos = []
+        for _ in range(max(1, repeticiones)):
+            preparar()
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.perf_counter()
+                funcion()
+                tiempos.append(time.perf_counter() - inicio)
+        return {"segundos": round(min(tiempos), 6), "consultas": len(consultas)}
+
+    @staticmethod
+    def leer_base(ruta):
+        if not Path(ruta).exists():
+            return None
+        with open(ruta) as archivo:
+            return json.load(archivo)
+
+    @staticmethod
+    def escribir(ruta, resultado):
+        with open(ruta, "w") as archivo:
+            json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+
+    def comparar(self, resultado, base, tolerancia):
+        """Imprime la tabla y devuelve cuántas mediciones empeoraron"""
+        if base and base.get("motor") != resultado["motor"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"La línea base es de {base.get('motor')}, no de "
+                    f"{resultado['motor']}: no se compara."
+                )
+            )
+            base = None
+        anteriores = (base or {}).get("resultados", {})
+
+        regresiones = 0
+        for tamano, medidas in resultado["resultados"].items():
+            self.stdout.write(f"\n== {tamano} pólizas ==")
+            self.stdout.write(f"{'caso':36} {'ms':>9} {'consultas':>9}  vs base")
+            for nombre, medida in medidas.items():
+                previa = anteriores.get(tamano, {}).get(nombre)
+                nota, empeoro = self.diferencia(medida, previa, tolerancia)
+                linea = (
+                    f"{nombre:36} {medida['segundos'] * 1000:9.1f} "
+                    f"{medida['consultas']:9d}  {nota}"
+                )
+                if empeoro:
+                    regresiones += 1
+                    linea = self.style.ERROR(f"{linea}  <- regresión")
+                self.stdout.write(linea)
+        return regresiones
+
+    @staticmethod
+    def diferencia(medida, previa, tolerancia):
+        if previa is None:
+            return "(nuevo)", False
+        notas = []
+        empeoro = False
+        if medida["consultas"] != previa["consultas"]:
+            notas.append(f"consultas {previa['consultas']} -> {medida['consultas']}")
+            empeoro = medida["consultas"] > previa["consultas"]
+        antes, ahora = previa["segundos"], medida["segundos"]
+        if antes > 0:
+            notas.append(f"x{ahora / antes:.2f}")
+        if ahora > antes * (1 + tolerancia) and ahora - antes > PISO_RUIDO:
+            empeoro = True
+        return ", ".join(notas), empeoro
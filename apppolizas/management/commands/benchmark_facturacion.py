@@ -0,0 +1,92 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apppolizas.models import Factura, Poliza
+from apppolizas.repositories import FacturaRepository
+from apppolizas.services import CarteraSinteticaService
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el alta de facturas una a una con Factura.save() frente al alta "
+        "por lotes (FacturaRepository.crear_lote) sobre datos sintéticos. "
+        "Todo corre dentro de una transacción que se revierte al terminar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--filas", type=int, default=5000)
+        parser.add_argument("--repeticiones", type=int, default=3)
+        parser.add_argument("--semilla", type=int, default=42)
+
+    def handle(self, *args, **options):
+        filas, semilla = options["filas"], options["semilla"]
+
+        with transaction.atomic():
+            poliza_id = self.poliza_de_prueba(semilla)
+
+            def preparar():
+                return self.generar(filas, semilla, poliza_id)
+
+            fila_a_fila = self.medir(
+                lambda facturas: [factura.save() for factura in facturas],
+                preparar,
+                options["repeticiones"],
+            )
+            por_lote = self.medir(
+                FacturaRepository.crear_lote, preparar, options["repeticiones"]
+            )
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"Filas: {filas}")
+        self.stdout.write(f"Factura.save(): {fila_a_fila:.3f} s")
+        self.stdout.write(f"crear_lote:     {por_lote:.3f} s")
+        self.stdout.write(
+            self.style.SUCCESS(f"Aceleración: x{fila_a_fila / por_lote:.2f}")
+        )
+
+    @staticmethod
+    def poliza_de_prueba(semilla):
+        """Póliza a la que se cuelgan las facturas (se revierte con el resto)"""
+        CarteraSinteticaService.generar(1, semilla)
+        return Poliza.objects.order_by("-id").values_list("id", flat=True).first()
+
+    @staticmethod
+    def generar(filas, semilla, poliza_id):
+        azar = random.Random(semilla)
+        inicio = date(2024, 1, 1)
+        facturas = []
+        for i in range(filas):
+            emision = inicio + timedelta(days=azar.randrange(365))
+            pago = emision + timedelta(days=azar.randrange(60))
+            facturas.append(
+                Factura(
+                    poliza_id=poliza_id,
+                    numero_factura=f"BENCH-FAC-{i}",
+                    prima=Decimal(azar.randrange(1000, 600000)) / 100,
+                    fecha_emision=emision,
+                    fecha_pago=pago if azar.random() < 0.7 else None,
+                    retenciones=Decimal(azar.randrange(0, 5000)) / 100,
+                    pagado=azar.random() < 0.3,
+                )
+            )
+        return facturas
+
+    @staticmethod
+    def medir(funcion, preparar, repeticiones):
+        # Mejor tiempo de varias corridas, para aislar ruido del sistema. Cada
+        # corrida parte de facturas nuevas y se revierte (no cuenta el tiempo
+        # de armar los datos ni el del rollback)
+        tiempos = []
+        for _ in range(max(1, repeticiones)):
+            facturas = preparar()
+            with transaction.atomic():
+                inicio = time.perf_counter()
+                funcion(facturas)
+                tiempos.append(time.perf_counter() - inicio)
+                transaction.set_rollback(True)
+        return min(tiempos)
@@ -0,0 +1,29 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from apppolizas.services import VencimientoPolizaService
+
+
+class Command(BaseCommand):
+    help = (
+        "Busca pólizas activas que vencen en 30, 15 o 7 días y avisa a su "
+        "gestor. Es idempotente: repetirlo no duplica alertas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fecha",
+            type=date.fromisoformat,
+            default=None,
+            help="Fecha de referencia AAAA-MM-DD (por defecto hoy)",
+        )
+        parser.add_argument("--lote", type=int, default=1000, help="Pólizas por lote")
+
+    def handle(self, *args, **options):
+        creadas = VencimientoPolizaService.escanear(
+            hoy=options["fecha"], tamano_lote=options["lote"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Alertas de vencimiento creadas: {creadas}")
+        )
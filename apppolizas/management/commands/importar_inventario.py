@@ -0,0 +1,43 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from apppolizas.services import ImportacionInventarioService
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa custodios y bienes desde un CSV o XLSX (hoja del Acta de "
+        "Entrega). Crea o actualiza por cédula y por código; las filas con "
+        "errores se reportan y no detienen la carga."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivo", help="Ruta del archivo .csv o .xlsx")
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=ImportacionInventarioService.TAMANO_LOTE,
+            help="Filas por lote",
+        )
+
+    def handle(self, *args, **options):
+        ruta = options["archivo"]
+        try:
+            with open(ruta, "rb") as archivo:
+                resultado = ImportacionInventarioService.importar(
+                    archivo, ruta, tamano_lote=options["lote"]
+                )
+        except ValidationError as e:
+            raise CommandError("; ".join(e.messages))
+        except OSError as e:
+            raise CommandError(e)
+
+        for fila, mensaje in resultado.errores:
+            self.stderr.write(f"Fila {fila}: {mensaje}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Custodios: {resultado.guardados['custodios']} - "
+                f"Bienes: {resultado.guardados['bienes']} - "
+                f"Filas con error: {resultado.filas_con_error}"
+            )
+        )
@@ -0,0 +1,66 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from apppolizas.models import Usuario
+from apppolizas.services import ImportacionPolizasService
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa pólizas o facturas desde el cronograma de la aseguradora "
+        "(CSV o XLSX). Con --simular valida todo sin guardar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivo", help="Ruta del archivo .csv o .xlsx")
+        parser.add_argument(
+            "--tipo", choices=ImportacionPolizasService.TIPOS, default="polizas"
+        )
+        parser.add_argument(
+            "--usuario", help="Usuario gestor de las pólizas importadas"
+        )
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=ImportacionPolizasService.TAMANO_LOTE,
+            help="Filas por lote (cada lote es una transacción)",
+        )
+        parser.add_argument(
+            "--simular",
+            action="store_true",
+            help="Valida e inserta dentro de una transacción que se revierte",
+        )
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options["usuario"]:
+            usuario = Usuario.objects.filter(username=options["usuario"]).first()
+            if usuario is None:
+                raise CommandError(f"No existe el usuario {options['usuario']}")
+
+        ruta = options["archivo"]
+        try:
+            with open(ruta, "rb") as archivo:
+                resultado = ImportacionPolizasService.importar(
+                    archivo,
+                    ruta,
+                    options["tipo"],
+                    usuario=usuario,
+                    simular=options["simular"],
+                    tamano_lote=options["lote"],
+                )
+        except ValidationError as e:
+            raise CommandError("; ".join(e.messages))
+        except OSError as e:
+            raise CommandError(e)
+
+        for fila, mensaje in resultado.errores:
+            self.stderr.write(f"Fila {fila}: {mensaje}")
+        prefijo = "[SIMULACIÓN] " if options["simular"] else ""
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefijo}{options['tipo'].capitalize()}: "
+                f"{resultado.guardados[options['tipo']]} - "
+                f"Filas con error: {resultado.filas_con_error}"
+            )
+        )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from apppolizas.services import CustodioService, EstadisticaPolizaService
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula desde cero la tabla de estadísticas por póliza y los "
+        "contadores de bienes activos por custodio, y reporta cuántos "
+        "registros estaban desfasados respecto al conteo real."
+    )
+
+    def handle(self, *args, **options):
+        corregidas = EstadisticaPolizaService.reconstruir()
+        if corregidas:
+            self.stdout.write(
+                self.style.WARNING(f"Se corrigieron {corregidas} pólizas desfasadas.")
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS("Las estadísticas ya estaban al día."))
+
+        custodios = CustodioService.recalcular_bienes_activos()
+        if custodios:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Se corrigieron {custodios} contadores de bienes activos."
+                )
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS("Los contadores de bienes ya estaban al día.")
+            )
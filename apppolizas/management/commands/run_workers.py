@@ -0,0 +1,64 @@
+import os
+import signal
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from apppolizas import tareas
+
+
+class Command(BaseCommand):
+    help = (
+        "Ejecuta las tareas en segundo plano de la cola (tabla Tarea) con un "
+        "pool de hilos. Se pueden lanzar varios procesos en paralelo: cada "
+        "tarea la toma un solo trabajador."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hilos", type=int, default=4, help="Tareas simultáneas por proceso"
+        )
+        parser.add_argument(
+            "--espera",
+            type=float,
+            default=2.0,
+            help="Segundos entre consultas cuando la cola está vacía",
+        )
+        parser.add_argument(
+            "--una-vez",
+            action="store_true",
+            help="Vacía la cola una vez y termina (útil en cron o pruebas)",
+        )
+
+    def handle(self, *args, **options):
+        hilos = options["hilos"]
+        trabajador = f"{socket.gethostname()}:{os.getpid()}"
+        self.detener = False
+        signal.signal(signal.SIGTERM, self.solicitar_detencion)
+        signal.signal(signal.SIGINT, self.solicitar_detencion)
+
+        self.stdout.write(f"Trabajador {trabajador} iniciado con {hilos} hilos.")
+        ejecutadas = fallidas = 0
+        # El latido se detiene después de que el pool terminó lo pendiente
+        with tareas.latiendo(trabajador), ThreadPoolExecutor(max_workers=hilos) as pool:
+            while not self.detener:
+                lote = tareas.reclamar(trabajador, limite=hilos * 2)
+                for exito in pool.map(tareas.ejecutar_en_hilo, lote):
+                    ejecutadas += 1
+                    fallidas += not exito
+                if not lote:
+                    if options["una_vez"]:
+                        break
+                    time.sleep(options["espera"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Trabajador detenido: {ejecutadas} tareas, {fallidas} con error."
+            )
+        )
+
+    def solicitar_detencion(self, *args):
+        # Termina el lote en curso antes de salir
+        self.detener = True
@@ -0,0 +1,79 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apppolizas.models import Usuario
+from apppolizas.services import CarteraSinteticaService
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera una cartera sintética coherente para pruebas de carga: "
+        "aseguradoras, brokers, custodios (hasta 5 bienes cada uno), pólizas, "
+        "siniestros en todos los estados, finiquitos, facturas y alertas. "
+        "Con la misma semilla sobre la misma base produce los mismos datos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("polizas", type=int, help="Número de pólizas a generar")
+        parser.add_argument("--semilla", type=int, default=42)
+        parser.add_argument(
+            "--bloque",
+            type=int,
+            default=CarteraSinteticaService.TAMANO_BLOQUE,
+            help="Pólizas por bloque (cada bloque es una transacción)",
+        )
+        parser.add_argument(
+            "--hilos",
+            type=int,
+            default=min(4, os.cpu_count() or 1),
+            help="Bloques que se insertan a la vez (en SQLite siempre 1)",
+        )
+        parser.add_argument(
+            "--usuario",
+            action="append",
+            help="Gestor de las pólizas y destinatario de las alertas "
+            "(se puede repetir; por defecto, todos los analistas activos)",
+        )
+
+    def handle(self, *args, **options):
+        if options["polizas"] < 1 or options["bloque"] < 1 or options["hilos"] < 1:
+            raise CommandError("polizas, --bloque y --hilos deben ser mayores que 0")
+
+        if options["usuario"]:
+            usuarios = list(Usuario.objects.filter(username__in=options["usuario"]))
+            faltantes = set(options["usuario"]) - {u.username for u in usuarios}
+            if faltantes:
+                raise CommandError(
+                    f"No existen los usuarios: {', '.join(sorted(faltantes))}"
+                )
+        else:
+            usuarios = list(
+                Usuario.objects.filter(rol=Usuario.ANALISTA, estado=True).order_by("id")
+            )
+        if not usuarios:
+            self.stdout.write(
+                self.style.WARNING(
+                    "No hay analistas: las pólizas quedan sin gestor ni alertas."
+                )
+            )
+
+        inicio = time.perf_counter()
+        creadas = CarteraSinteticaService.generar(
+            options["polizas"],
+            semilla=options["semilla"],
+            usuarios=usuarios,
+            tamano_bloque=options["bloque"],
+            hilos=options["hilos"],
+        )
+        duracion = time.perf_counter() - inicio
+
+        for modelo, cantidad in creadas.items():
+            self.stdout.write(f"{modelo.__name__:22} {cantidad:>10}")
+        total = sum(creadas.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{total} filas en {duracion:.1f} s ({total / max(duracion, 1e-9):.0f} filas/s)"
+            )
+        )
@@ -0,0 +1,314 @@
+"""
+Métricas de la aplicación en formato de texto de Prometheus.
+
+Registro en memoria con contadores e histogramas etiquetados: latencia por
+vista (MetricasMiddleware), operaciones de negocio (siniestros creados,
+liquidaciones, evidencias subidas) y tiempo de renderizado de PDFs. Se
+publican en /metricas/ con el formato de exposición 0.0.4.
+
+Con varios procesos (workers de gunicorn) cada uno tiene su propio registro.
+Si METRICAS_DIRECTORIO está definido, cada proceso vuelca su registro a
+`metricas_<pid>.json` en ese directorio (como mucho una vez por segundo, desde
+un hilo aparte para no escribir en el hilo de la petición, y al terminar) y el
+endpoint suma los volcados de todos. El directorio se debe vaciar al arrancar
+el servidor, igual que con el modo multiproceso de prometheus_client.
+"""
+
+import atexit
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from glob import glob
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Cubetas en segundos (las mismas que usa prometheus_client por defecto)
+CUBETAS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CUBETAS_PDF = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Segundos mínimos entre dos volcados a disco del mismo proceso
+INTERVALO_VOLCADO = 1.0
+
+_lock = threading.Lock()
+
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.valores = {}  # (valores de etiquetas) -> total
+
+    def inc(self, cantidad=1, **etiquetas):
+        clave = tuple(str(etiquetas[e]) for e in self.etiquetas)
+        with _lock:
+            self.valores[clave] = self.valores.get(clave, 0) + cantidad
+        registro.programar_volcado()
+
+    def muestras(self):
+        for clave, valor in sorted(self.valores.items()):
+            yield self.nombre, dict(zip(self.etiquetas, clave)), valor
+
+    def vacia(self):
+        return Contador(self.nombre, self.ayuda, self.etiquetas)
+
+    def volcar(self):
+        return [[list(clave), valor] for clave, valor in self.valores.items()]
+
+    def sumar(self, volcado):
+        for clave, valor in volcado:
+            clave = tuple(clave)
+            self.valores[clave] = self.valores.get(clave, 0) + valor
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), cubetas=CUBETAS_LATENCIA):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.cubetas = tuple(cubetas)
+        # (valores de etiquetas) -> [conteo por cubeta (+Inf al final), suma]
+        self.valores = {}
+
+    def observar(self, valor, **etiquetas):
+        clave = tuple(str(etiquetas[e]) for e in self.etiquetas)
+        posicion = len(self.cubetas)
+        for i, limite in enumerate(self.cubetas):
+            if valor <= limite:
+                posicion = i
+                break
+        with _lock:
+            serie = self.valores.get(clave)
+            if serie is None:
+                serie = self.valores[clave] = [[0] * (len(self.cubetas) + 1), 0.0]
+            serie[0][posicion] += 1
+            serie[1] += valor
+        registro.programar_volcado()
+
+    @contextmanager
+    def medir(self, **etiquetas):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **etiquetas)
+
+    def muestras(self):
+        limites = [_numero(float(c)) for c in self.cubetas] + ["+Inf"]
+        for clave, (conteos, suma) in sorted(self.valores.items()):
+            etiquetas = dict(zip(self.etiquetas, clave))
+            acumulado = 0
+            for limite, conteo in zip(limites, conteos):
+                acumulado += conteo
+                yield f"{self.nombre}_bucket", {**etiquetas, "le": limite}, acumulado
+            yield f"{self.nombre}_sum", etiquetas, suma
+            yield f"{self.nombre}_count", etiquetas, acumulado
+
+    def vacia(self):
+        return Histograma(self.nombre, self.ayuda, self.etiquetas, self.cubetas)
+
+    def volcar(self):
+        return [
+            [list(clave), list(conteos), suma]
+            for clave, (conteos, suma) in self.valores.items()
+        ]
+
+    def sumar(self, volcado):
+        for clave, conteos, suma in volcado:
+            serie = self.valores.setdefault(
+                tuple(clave), [[0] * (len(self.cubetas) + 1), 0.0]
+            )
+            serie[0] = [a + b for a, b in zip(serie[0], conteos)]
+            serie[1] += suma
+
+
+class Registro:
+    def __init__(self):
+        self.metricas = {}
+        self._ultimo_volcado = 0.0
+        self._pendiente = threading.Event()
+        self._lock_hilo = threading.Lock()
+        self._pid_hilo = None  # proceso en el que corre el hilo de volcado
+
+    def registrar(self, metrica):
+        self.metricas[metrica.nombre] = metrica
+        return metrica
+
+    @staticmethod
+    def directorio():
+        return getattr(settings, "METRICAS_DIRECTORIO", None)
+
+    def programar_volcado(self):
+        """Avisa al hilo de volcado; la petición no espera la escritura"""
+        if not self.directorio():
+            return
+        if self._pid_hilo != os.getpid():
+            self._iniciar_hilo()
+        self._pendiente.set()
+
+    def _iniciar_hilo(self):
+        # Tras un fork (gunicorn --preload) el hilo del padre no existe en el
+        # hijo: cada proceso arranca el suyo
+        with self._lock_hilo:
+            if self._pid_hilo == os.getpid():
+                return
+            self._pendiente = threading.Event()
+            threading.Thread(
+                target=self._volcar_en_segundo_plano,
+                args=(self._pendiente,),
+                name="metricas-volcado",
+                daemon=True,
+            ).start()
+            self._pid_hilo = os.getpid()
+
+    def _volcar_en_segundo_plano(self, pendiente):
+        while True:
+            pendiente.wait()
+            espera = self._ultimo_volcado + INTERVALO_VOLCADO - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            pendiente.clear()
+            try:
+                self.volcar_a_disco()
+            except OSError:
+                logger.exception("No se pudieron volcar las métricas")
+
+    def _volcado(self):
+        with _lock:
+            return {nombre: m.volcar() for nombre, m in self.metricas.items()}
+
+    def volcar_a_disco(self):
+        """Escribe el registro de este proceso en metricas_<pid>.json"""
+        directorio = self.directorio()
+        if not directorio:
+            return
+        self._ultimo_volcado = time.monotonic()
+        datos = self._volcado()
+        os.makedirs(directorio, exist_ok=True)
+        ruta = os.path.join(directorio, f"metricas_{os.getpid()}.json")
+        # Escribir aparte y renombrar: quien lee nunca ve un archivo a medias
+        temporal = f"{ruta}.tmp"
+        with open(temporal, "w") as archivo:
+            json.dump(datos, archivo)
+        os.replace(temporal, ruta)
+
+    def agregado(self):
+        """
+        Copia de las métricas a publicar: las de este proceso o, en modo
+        multiproceso, la suma de los volcados de todos los procesos.
+        """
+        suma = {nombre: m.vacia() for nombre, m in self.metricas.items()}
+        volcados = [self._volcado()]
+        if self.directorio():
+            # El archivo propio se salta: lo de este proceso está en memoria
+            propio = f"metricas_{os.getpid()}.json"
+            patron = os.path.join(self.directorio(), "metricas_*.json")
+            for ruta in sorted(glob(patron)):
+                if os.path.basename(ruta) == propio:
+                    continue
+                try:
+                    with open(ruta) as archivo:
+                        volcados.append(json.load(archivo))
+                except (OSError, ValueError):
+                    continue
+        for datos in volcados:
+            for nombre, volcado in datos.items():
+                if nombre in suma:
+                    suma[nombre].sumar(volcado)
+        return list(suma.values())
+
+    def exposicion(self):
+        """Texto en el formato de exposición de Prometheus"""
+        lineas = []
+        for metrica in self.agregado():
+            lineas.append(f"# HELP {metrica.nombre} {_escapar_ayuda(metrica.ayuda)}")
+            lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+            for nombre, etiquetas, valor in metrica.muestras():
+                lineas.append(f"{nombre}{_etiquetas(etiquetas)} {_numero(valor)}")
+        return "\n".join(lineas) + "\n"
+
+
+def _numero(valor):
+    if isinstance(valor, float) and valor.is_integer():
+        return f"{valor:.1f}"
+    return repr(valor) if isinstance(valor, float) else str(valor)
+
+
+def _escapar_ayuda(texto):
+    return texto.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _etiquetas(etiquetas):
+    if not etiquetas:
+        return ""
+    pares = ",".join(
+        '{}="{}"'.format(
+            nombre,
+            str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'),
+        )
+        for nombre, valor in etiquetas.items()
+    )
+    return "{" + pares + "}"
+
+
+registro = Registro()
+atexit.register(registro.volcar_a_disco)
+
+peticiones_duracion = registro.registrar(
+    Histograma(
+        "apppolizas_http_peticion_duracion_segundos",
+        "Duración de las peticiones HTTP por vista",
+        ("vista", "metodo"),
+    )
+)
+peticiones_total = registro.registrar(
+    Contador(
+        "apppolizas_http_peticiones_total",
+        "Peticiones HTTP atendidas por vista y código de estado",
+        ("vista", "metodo", "estado"),
+    )
+)
+operaciones_total = registro.registrar(
+    Contador(
+        "apppolizas_operaciones_total",
+        "Operaciones de negocio ejecutadas (resultado ok o error)",
+        ("operacion", "resultado"),
+    )
+)
+pdf_duracion = registro.registrar(
+    Histograma(
+        "apppolizas_pdf_render_duracion_segundos",
+        "Tiempo de renderizado de PDFs con xhtml2pdf",
+        ("documento",),
+        cubetas=CUBETAS_PDF,
+    )
+)
+
+
+def contar_operacion(operacion):
+    """Decorador: cuenta cada llamada en apppolizas_operaciones_total"""
+
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            try:
+                resultado = funcion(*args, **kwargs)
+            except Exception:
+                operaciones_total.inc(operacion=operacion, resultado="error")
+                raise
+            operaciones_total.inc(operacion=operacion, resultado="ok")
+            return resultado
+
+        return envoltura
+
+    return decorador
@@ -0,0 +1,183 @@
+"""
+Perfil de consultas por petición.
+
+`PerfilConsultasMiddleware` envuelve cada petición con
+`connection.execute_wrapper` para contar las consultas y el tiempo de base de
+datos, y agrupa las que tienen la misma forma (mismo SQL salvo parámetros).
+Una forma que se repite muchas veces en una petición suele ser un N+1: se
+informa junto con la línea de la plantilla o del código de la app que la
+disparó.
+
+Los totales viajan en cabeceras (X-Consultas-BD, X-Tiempo-BD-ms,
+X-Consultas-N1, X-Consultas-N1-Origen) y se escriben en el log
+"apppolizas.middleware". Se activa con PERFIL_CONSULTAS (por defecto sigue a
+DEBUG). Las respuestas en streaming solo cuentan lo ejecutado en la vista.
+
+`MetricasMiddleware` mide la duración de cada petición por nombre de URL para
+el endpoint de métricas (ver apppolizas.metricas).
+"""
+
+import logging
+import os
+import re
+import sys
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import metricas
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO_APP = os.path.dirname(os.path.abspath(__file__)) + os.sep
+ARCHIVO_PLANTILLAS = os.path.join("django", "template", "base.py")
+
+# "IN (%s, %s, %s)" y "VALUES (%s, %s), (%s, %s)" cuentan como una sola forma
+_LISTA_PARAMETROS = re.compile(r"\((?:%s, )*%s\)")
+_LISTAS_REPETIDAS = re.compile(r"\(\.\.\.\)(?:, \(\.\.\.\))+")
+
+
+def forma_sql(sql):
+    return _LISTAS_REPETIDAS.sub("(...)", _LISTA_PARAMETROS.sub("(...)", sql))
+
+
+def origen_consulta():
+    """
+    Nodo de plantilla más interno ("siniestros.html:68") y primera línea de
+    código de la app ("apppolizas/views.py:310 (get)") en la pila actual.
+    """
+    plantilla = codigo = None
+    frame = sys._getframe(1)
+    while frame is not None and not (plantilla and codigo):
+        archivo = frame.f_code.co_filename
+        if (
+            plantilla is None
+            and frame.f_code.co_name == "render_annotated"
+            and archivo.endswith(ARCHIVO_PLANTILLAS)
+        ):
+            nodo = frame.f_locals.get("self")
+            origen = getattr(nodo, "origin", None)
+            token = getattr(nodo, "token", None)
+            if origen is not None and token is not None:
+                plantilla = f"{origen.template_name}:{token.lineno}"
+        elif (
+            codigo is None
+            and archivo.startswith(DIRECTORIO_APP)
+            and archivo != __file__
+        ):
+            ruta = os.path.relpath(archivo, os.path.dirname(DIRECTORIO_APP[:-1]))
+            codigo = f"{ruta}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    if plantilla and codigo:
+        return f"{plantilla} <- {codigo}"
+    return plantilla or codigo or "desconocido"
+
+
+class PerfilConsultas:
+    """Se instala con execute_wrapper; acumula consultas de una petición"""
+
+    def __init__(self):
+        self.total = 0
+        self.tiempo = 0.0
+        self.formas = {}  # forma -> [veces, segundos, origen de la primera]
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.total += 1
+            self.tiempo += duracion
+            forma = forma_sql(sql)
+            registro = self.formas.get(forma)
+            if registro is None:
+                self.formas[forma] = [1, duracion, origen_consulta()]
+            else:
+                registro[0] += 1
+                registro[1] += duracion
+
+    def repetidas(self, umbral):
+        """[(forma, veces, segundos, origen)] que se repiten `umbral`+ veces"""
+        return sorted(
+            (
+                (forma, veces, segundos, origen)
+                for forma, (veces, segundos, origen) in self.formas.items()
+                if veces >= umbral
+            ),
+            key=lambda r: -r[1],
+        )
+
+
+def _ascii(texto):
+    return texto.encode("ascii", "replace").decode("ascii")
+
+
+class PerfilConsultasMiddleware:
+    def __init__(self, get_response):
+        activo = getattr(settings, "PERFIL_CONSULTAS", None)
+        if not (settings.DEBUG if activo is None else activo):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.umbral = getattr(settings, "PERFIL_CONSULTAS_UMBRAL_N1", 5)
+
+    def __call__(self, request):
+        perfil = PerfilConsultas()
+        with ExitStack() as pila:
+            for alias in connections:
+                pila.enter_context(connections[alias].execute_wrapper(perfil))
+            response = self.get_response(request)
+
+        repetidas = perfil.repetidas(self.umbral)
+        response["X-Consultas-BD"] = str(perfil.total)
+        response["X-Tiempo-BD-ms"] = f"{perfil.tiempo * 1000:.1f}"
+        response["X-Consultas-N1"] = str(len(repetidas))
+        if repetidas:
+            response["X-Consultas-N1-Origen"] = _ascii(repetidas[0][3])
+
+        logger.info(
+            "%s %s -> %s consultas, %.1f ms de BD",
+            request.method,
+            request.path,
+            perfil.total,
+            perfil.tiempo * 1000,
+        )
+        for forma, veces, segundos, origen in repetidas:
+            logger.warning(
+                "Posible N+1 en %s: %s veces (%.1f ms) desde %s: %s",
+                request.path,
+                veces,
+                segundos * 1000,
+                origen,
+                forma[:300],
+            )
+        return response
+
+
+class MetricasMiddleware:
+    """Histograma de latencia y conteo de respuestas por vista (url name)"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICAS_ACTIVAS", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        inicio = time.perf_counter()
+        response = self.get_response(request)
+        duracion = time.perf_counter() - inicio
+
+        # Por nombre de URL y no por ruta: /polizas/15/ y /polizas/16/ son la
+        # misma serie. Lo que no resolvió ninguna URL se agrupa aparte.
+        coincidencia = getattr(request, "resolver_match", None)
+        vista = (coincidencia and coincidencia.view_name) or "sin_ruta"
+        metricas.peticiones_duracion.observar(
+            duracion, vista=vista, metodo=request.method
+        )
+        metricas.peticiones_total.inc(
+            vista=vista, metodo=request.method, estado=response.status_code
+        )
+        return response
@@ -0,0 +1,63 @@
+# Generated by Django 5.2 on 2026-10-17 01:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apppolizas", "0005_bien_ubicacion"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="bien",
+            index=models.Index(
+                fields=["custodio", "estado_operativo", "codigo"],
+                name="bien_custodio_estado_cod_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="factura",
+            index=models.Index(
+                fields=["fecha_emision"], name="factura_fecha_emision_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notificacion",
+            index=models.Index(
+                fields=["usuario", "fecha_emision"], name="notif_usuario_fecha_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notificacion",
+            index=models.Index(
+                fields=["usuario", "estado", "fecha_emision"],
+                name="notif_usuario_estado_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="poliza",
+            index=models.Index(
+                fields=["fecha_registro"], name="poliza_fecha_registro_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="poliza",
+            index=models.Index(fields=["vigencia_fin"], name="poliza_vigencia_fin_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="poliza",
+            index=models.Index(fields=["estado"], name="poliza_estado_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="siniestro",
+            index=models.Index(
+                fields=["poliza", "fecha_siniestro"], name="siniestro_poliza_fecha_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="siniestro",
+            index=models.Index(fields=["fecha_siniestro"], name="siniestro_fecha_idx"),
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+# Índice FULLTEXT sobre Bien.detalle para el buscador de bienes.
+# Django no tiene un Index portable de texto completo, así que se crea
+# solo en MySQL; en otros motores el buscador usa icontains.
+
+
+def crear_indice_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor != "mysql":
+        return
+    schema_editor.execute(
+        "CREATE FULLTEXT INDEX bien_detalle_ft_idx ON apppolizas_bien (detalle)"
+    )
+
+
+def eliminar_indice_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor != "mysql":
+        return
+    schema_editor.execute("DROP INDEX bien_detalle_ft_idx ON apppolizas_bien")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apppolizas", "0006_bien_bien_custodio_estado_cod_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice_fulltext, eliminar_indice_fulltext),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2 on 2026-10-17 01:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Q, Sum
+
+CAMPO_POR_ESTADO = {
+    "REPORTADO": "reportados",
+    "DOCUMENTACION": "en_documentacion",
+    "ENVIADO_ASEGURADORA": "enviados_aseguradora",
+    "REPARACION": "en_reparacion",
+    "LIQUIDADO": "liquidados",
+    "RECHAZADO": "rechazados",
+}
+
+
+def poblar_estadisticas(apps, schema_editor):
+    """Carga inicial con los siniestros existentes"""
+    Siniestro = apps.get_model("apppolizas", "Siniestro")
+    PolizaEstadistica = apps.get_model("apppolizas", "PolizaEstadistica")
+
+    filas = (
+        Siniestro.objects.order_by()
+        .values("poliza_id")
+        .annotate(
+            total_siniestros=Count("id"),
+            valor_reclamado=Sum("valor_reclamo_estimado"),
+            valor_pagado=Sum("finiquito__valor_final_pago"),
+            ultimo_siniestro=Max("fecha_siniestro"),
+            **{
+                campo: Count("id", filter=Q(estado_tramite=estado))
+                for estado, campo in CAMPO_POR_ESTADO.items()
+            },
+        )
+    )
+    PolizaEstadistica.objects.bulk_create(
+        (
+            PolizaEstadistica(**{k: v for k, v in fila.items() if v is not None})
+            for fila in filas.iterator(chunk_size=1000)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apppolizas", "0007_bien_detalle_fulltext"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PolizaEstadistica",
+            fields=[
+                (
+                    "poliza",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="estadistica",
+                        serialize=False,
+                        to="apppolizas.poliza",
+                    ),
+                ),
+                ("total_siniestros", models.IntegerField(default=0)),
+                ("reportados", models.IntegerField(default=0)),
+                ("en_documentacion", models.IntegerField(default=0)),
+                ("enviados_aseguradora", models.IntegerField(default=0)),
+                ("en_reparacion", models.IntegerField(default=0)),
+                ("liquidados", models.IntegerField(default=0)),
+                ("rechazados", models.IntegerField(default=0)),
+                (
+                    "valor_reclamado",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=15),
+                ),
+                (
+                    "valor_pagado",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=15),
+                ),
+                ("ultimo_siniestro", models.DateField(blank=True, null=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["-total_siniestros"], name="estadistica_total_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(poblar_estadisticas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2 on 2026-10-17 01:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apppolizas", "0008_polizaestadistica"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Tarea",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tipo", models.CharField(max_length=100)),
+                ("argumentos", models.JSONField(default=dict)),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[
+                            ("PENDIENTE", "Pendiente"),
+                            ("EN_PROCESO", "En proceso"),
+                            ("COMPLETADA", "Completada"),
+                            ("FALLIDA", "Fallida"),
+                        ],
+                        default="PENDIENTE",
+                        max_length=20,
+                    ),
+                ),
+                ("intentos", models.PositiveSmallIntegerField(default=0)),
+                ("max_intentos", models.PositiveSmallIntegerField(default=5)),
+                (
+                    "ejecutar_despues",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("trabajador", models.CharField(blank=True, max_length=100, null=True)),
+                ("fecha_inicio", models.DateTimeField(blank=True, null=True)),
+                ("resultado", models.JSONField(blank=True, null=True)),
+                ("ultimo_error", models.TextField(blank=True, null=True)),
+                ("fecha_creacion", models.DateTimeField(auto_now_add=True)),
+                ("fecha_fin", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["estado", "ejecutar_despues"],
+                        name="tarea_estado_ejecutar_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-17 01:59
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def poblar_contador(apps, schema_editor):
+    """Un GROUP BY y un UPDATE por cada valor distinto del contador"""
+    Notificacion = apps.get_model("apppolizas", "Notificacion")
+    Usuario = apps.get_model("apppolizas", "Usuario")
+
+    usuarios_por_total = defaultdict(list)
+    filas = (
+        Notificacion.objects.filter(estado="PENDIENTE")
+        .order_by()
+        .values("usuario_id")
+        .annotate(total=Count("id"))
+    )
+    for fila in filas.iterator(chunk_size=2000):
+        usuarios_por_total[fila["total"]].append(fila["usuario_id"])
+    for total, ids in usuarios_por_total.items():
+        for i in range(0, len(ids), 1000):
+            Usuario.objects.filter(pk__in=ids[i : i + 1000]).update(
+                notificaciones_no_leidas=total
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apppolizas", "0009_tarea"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="usuario",
+            name="notificaciones_no_leidas",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(poblar_contador, migrations.RunPython.noop),
+    ]
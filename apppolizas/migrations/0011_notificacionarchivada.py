@@ -0,0 +1,55 @@
+# Generated by Django 5.2 on 2026-10-17 02:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apppolizas", "0010_usuario_notificaciones_no_leidas"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NotificacionArchivada",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("fecha_desde", models.DateTimeField()),
+                ("fecha_hasta", models.DateTimeField()),
+                ("cantidad", models.PositiveIntegerField()),
+                ("datos", models.BinaryField()),
+                ("fecha_archivo", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="notificacion",
+            index=models.Index(
+                fields=["estado", "fecha_emision"], name="notif_estado_fecha_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="notificacionarchivada",
+            name="usuario",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="notificaciones_archivadas",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notificacionarchivada",
+            index=models.Index(
+                fields=["usuario", "fecha_hasta"], name="notif_arch_usuario_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 02:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apppolizas", "0011_notificacionarchivada"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notificacion",
+            name="clave_deduplicacion",
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
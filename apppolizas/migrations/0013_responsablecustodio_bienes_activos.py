@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-17 09:12
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def poblar_contador(apps, schema_editor):
+    """Un GROUP BY y un UPDATE por cada valor distinto del contador"""
+    Bien = apps.get_model("apppolizas", "Bien")
+    ResponsableCustodio = apps.get_model("apppolizas", "ResponsableCustodio")
+
+    custodios_por_total = defaultdict(list)
+    filas = (
+        Bien.objects.filter(estado_operativo="ACTIVO")
+        .order_by()
+        .values("custodio_id")
+        .annotate(total=Count("id"))
+    )
+    for fila in filas.iterator(chunk_size=2000):
+        custodios_por_total[fila["total"]].append(fila["custodio_id"])
+    for total, ids in custodios_por_total.items():
+        for i in range(0, len(ids), 1000):
+            ResponsableCustodio.objects.filter(pk__in=ids[i : i + 1000]).update(
+                bienes_activos=total
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apppolizas", "0012_notificacion_clave_deduplicacion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="responsablecustodio",
+            name="bienes_activos",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(poblar_contador, migrations.RunPython.noop),
+    ]
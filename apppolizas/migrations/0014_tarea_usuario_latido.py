@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-17 02:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def latido_desde_inicio(apps, schema_editor):
+    """Las tareas en curso arrancan con el latido en su fecha de inicio"""
+    Tarea = apps.get_model("apppolizas", "Tarea")
+    Tarea.objects.filter(estado="EN_PROCESO").update(latido=F("fecha_inicio"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apppolizas", "0013_responsablecustodio_bienes_activos"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tarea",
+            name="latido",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="tarea",
+            name="usuario",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="tareas",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(latido_desde_inicio, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,33 @@
+import json
+import zlib
 from datetime import date
-from decimal import Decimal
 
 from django.contrib.auth.models import AbstractUser
-from django.db import models
-from django.db.models.signals import post_delete
-from django.dispatch import receiver
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.utils import timezone
+
+from . import facturacion
+
+
+class ValoresOriginalesMixin:
+    """
+    Recuerda los valores con que la fila se leyó de la BD, para que las
+    señales puedan calcular diferencias (ej. estadísticas incrementales).
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._valores_originales = dict(zip(field_names, values))
+        return instancia
+
+    def valores_originales(self):
+        return getattr(self, "_valores_originales", None)
+
+    def recordar_valores_actuales(self, campos):
+        self._valores_originales = {campo: getattr(self, campo) for campo in campos}
+
 
 # ========================================================
 # 1. GESTIÓN DE USUARIOS Y ROLES
@@ -31,6 +54,10 @@ class Usuario(AbstractUser):
     telefono = models.CharField(max_length=15, null=True, blank=True)
     estado = models.BooleanField(default=True)
 
+    # Contador desnormalizado de Notificacion en estado PENDIENTE (para el
+    # badge); lo mantienen con UPDATEs atómicos las señales y los lotes
+    notificaciones_no_leidas = models.PositiveIntegerField(default=0, editable=False)
+
     def __str__(self):
         return f"{self.username} - {self.rol}"
 
@@ -84,6 +111,10 @@ class ResponsableCustodio(models.Model):
         max_length=150, blank=True, null=True, help_text="Ej: D4D06-6-PUESTO DE DOCENTE"
     )
 
+    # Bienes ACTIVO asignados; lo mantienen las señales de Bien con UPDATE
+    # condicionales (ver CustodioRepository.reservar_bien)
+    bienes_activos = models.PositiveSmallIntegerField(default=0, editable=False)
+
     def __str__(self):
         return f"{self.nombre_completo} ({self.identificacion})"
 
@@ -93,7 +124,7 @@ class ResponsableCustodio(models.Model):
 # ========================================================
 
 
-class Bien(models.Model):
+class Bien(ValoresOriginalesMixin, models.Model):
     """
     Representa los activos fijos asignados a un custodio.
     Basado en la tabla del Acta de Entrega Recepción.
@@ -105,6 +136,9 @@ class Bien(models.Model):
         ("M", "Malo"),
     ]
 
+    # Tope de bienes asignados a un mismo custodio
+    MAX_POR_CUSTODIO = 5
+
     # Relación: Un custodio tiene varios bienes (1 a 5)
     custodio = models.ForeignKey(
         ResponsableCustodio, on_delete=models.CASCADE, related_name="bienes"
@@ -145,21 +179,44 @@ class Bien(models.Model):
         verbose_name="Estado Operativo",
     )
 
+    class Meta:
+        indexes = [
+            # BienRepository.get_by_custodio: filtro + orden por código
+            models.Index(
+                fields=["custodio", "estado_operativo", "codigo"],
+                name="bien_custodio_estado_cod_idx",
+            ),
+        ]
+
     def clean(self):
         """Validación personalizada para limitar a 5 bienes por custodio"""
         from django.core.exceptions import ValidationError
 
-        # Si es un registro nuevo (no tiene ID aún) verificamos el conteo actual
-        if self.pk is None:
-            cantidad_actual = self.custodio.bienes.count()
-            if cantidad_actual >= 5:
+        # Aviso temprano para formularios: se lee solo el contador por
+        # custodio_id (sin cargar el custodio). La garantía real es la
+        # reserva atómica al guardar (pre_save).
+        if (
+            self.pk is None
+            and self.custodio_id is not None
+            and self.estado_operativo == "ACTIVO"
+        ):
+            lleno = (
+                ResponsableCustodio.objects.filter(
+                    pk=self.custodio_id, bienes_activos__gte=self.MAX_POR_CUSTODIO
+                )
+                .values_list("nombre_completo", flat=True)
+                .first()
+            )
+            if lleno is not None:
                 raise ValidationError(
-                    f"El custodio {self.custodio.nombre_completo} ya tiene el máximo permitido de 5 bienes asignados."
+                    f"El custodio {lleno} ya tiene el máximo permitido de {self.MAX_POR_CUSTODIO} bienes asignados."
                 )
 
     def save(self, *args, **kwargs):
-        self.clean()  # Ejecutar validación antes de guardar
-        super(Bien, self).save(*args, **kwargs)
+        # La reserva del cupo (pre_save) y el INSERT/UPDATE van juntos: si
+        # uno falla, el contador no queda desfasado
+        with transaction.atomic():
+            super(Bien, self).save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.detalle[:30]}... ({self.codigo})"
@@ -198,6 +255,16 @@ class Poliza(models.Model):
 
     usuario_gestor = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True)
 
+    class Meta:
+        indexes = [
+            # Listado paginado por fecha de registro (desempate por id)
+            models.Index(fields=["fecha_registro"], name="poliza_fecha_registro_idx"),
+            # contar_polizas_vencidas y el escaneo de vencimientos
+            models.Index(fields=["vigencia_fin"], name="poliza_vigencia_fin_idx"),
+            # contar_polizas_activas
+            models.Index(fields=["estado"], name="poliza_estado_idx"),
+        ]
+
     def __str__(self):
         return f"Póliza {self.numero_poliza}"
 
@@ -216,7 +283,7 @@ class DocumentoPoliza(models.Model):
 # ========================================================
 
 
-class Siniestro(models.Model):
+class Siniestro(ValoresOriginalesMixin, models.Model):
     numero_reclamo = models.CharField(max_length=50, unique=True, null=True, blank=True)
 
     poliza = models.ForeignKey(
@@ -280,6 +347,17 @@ class Siniestro(models.Model):
         max_digits=12, decimal_places=2, default=0
     )
 
+    class Meta:
+        indexes = [
+            # Siniestros de una póliza ordenados por fecha
+            models.Index(
+                fields=["poliza", "fecha_siniestro"],
+                name="siniestro_poliza_fecha_idx",
+            ),
+            # Listado general paginado por fecha
+            models.Index(fields=["fecha_siniestro"], name="siniestro_fecha_idx"),
+        ]
+
     def clean(self):
         """
         Validación opcional: Verificar que el Bien seleccionado
@@ -305,7 +383,7 @@ class Siniestro(models.Model):
 # ========================================================
 
 
-class Finiquito(models.Model):
+class Finiquito(ValoresOriginalesMixin, models.Model):
     siniestro = models.OneToOneField(
         Siniestro, on_delete=models.CASCADE, related_name="finiquito"
     )
@@ -335,12 +413,57 @@ class Finiquito(models.Model):
         return f"Finiquito {self.id_finiquito} - Siniestro {self.siniestro.id}"
 
 
+class PolizaEstadistica(models.Model):
+    """
+    Resumen de siniestros por póliza. Se mantiene de forma incremental desde
+    las señales de Siniestro y Finiquito (ver EstadisticaPolizaService) y se
+    puede reconciliar con `manage.py reconstruir_estadisticas`.
+    """
+
+    # Columna que acumula cada estado de Siniestro.ESTADO_CHOICES
+    CAMPO_POR_ESTADO = {
+        "REPORTADO": "reportados",
+        "DOCUMENTACION": "en_documentacion",
+        "ENVIADO_ASEGURADORA": "enviados_aseguradora",
+        "REPARACION": "en_reparacion",
+        "LIQUIDADO": "liquidados",
+        "RECHAZADO": "rechazados",
+    }
+
+    poliza = models.OneToOneField(
+        Poliza, on_delete=models.CASCADE, primary_key=True, related_name="estadistica"
+    )
+    total_siniestros = models.IntegerField(default=0)
+
+    reportados = models.IntegerField(default=0)
+    en_documentacion = models.IntegerField(default=0)
+    enviados_aseguradora = models.IntegerField(default=0)
+    en_reparacion = models.IntegerField(default=0)
+    liquidados = models.IntegerField(default=0)
+    rechazados = models.IntegerField(default=0)
+
+    # Suma de Siniestro.valor_reclamo_estimado
+    valor_reclamado = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    # Suma de Finiquito.valor_final_pago
+    valor_pagado = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    ultimo_siniestro = models.DateField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Ranking de "póliza más siniestrada"
+            models.Index(fields=["-total_siniestros"], name="estadistica_total_idx"),
+        ]
+
+    def __str__(self):
+        return f"Estadística {self.poliza_id} - {self.total_siniestros} siniestros"
+
+
 # ========================================================
 # 6. FACTURACIÓN Y PAGOS
 # ========================================================
 
 
-class Factura(models.Model):
+class Factura(ValoresOriginalesMixin, models.Model):
     poliza = models.ForeignKey(
         Poliza, on_delete=models.CASCADE, related_name="facturas"
     )
@@ -369,51 +492,22 @@ class Factura(models.Model):
     mensaje_resultado = models.CharField(max_length=255, null=True, blank=True)
     pagado = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["fecha_emision"], name="factura_fecha_emision_idx"),
+        ]
+
     def calcular_derechos_emision(self):
-        if self.prima <= 250:
-            return Decimal("0.50")
-        elif self.prima <= 500:
-            return Decimal("1.00")
-        elif self.prima <= 1000:
-            return Decimal("3.00")
-        elif self.prima <= 2000:
-            return Decimal("5.00")
-        elif self.prima <= 4000:
-            return Decimal("7.00")
-        else:
-            return Decimal("9.00")
+        return facturacion.derechos_emision(self.prima)
 
     def calcular_descuento(self):
-        if self.fecha_pago and self.fecha_emision:
-            dias_diferencia = (self.fecha_pago - self.fecha_emision).days
-            if dias_diferencia <= 20:
-                return self.prima * Decimal("0.05")
-        return Decimal("0.00")
-
-    def save(self, *args, **kwargs):
-        self.contribucion_super = round(self.prima * Decimal("0.035"), 2)
-        self.seguro_campesino = round(self.prima * Decimal("0.005"), 2)
-        self.derechos_emision = self.calcular_derechos_emision()
-        self.base_imponible = (
-            self.prima
-            + self.contribucion_super
-            + self.seguro_campesino
-            + self.derechos_emision
-        )
-        self.iva = round(self.base_imponible * Decimal("0.15"), 2)
-        self.total_facturado = self.base_imponible + self.iva
-        self.descuento_pronto_pago = round(self.calcular_descuento(), 2)
-        self.valor_a_pagar = (
-            self.total_facturado - self.retenciones - self.descuento_pronto_pago
+        return facturacion.descuento_pronto_pago(
+            self.prima, self.fecha_emision, self.fecha_pago
         )
 
-        if self.pagado:
-            self.mensaje_resultado = "Pagado"
-        elif self.valor_a_pagar <= 0:
-            self.mensaje_resultado = "Saldado"
-        else:
-            self.mensaje_resultado = "Pendiente"
-
+    def save(self, *args, **kwargs):
+        # Misma fórmula que las cargas masivas (ver facturacion.py)
+        facturacion.aplicar_lote([self])
         super(Factura, self).save(*args, **kwargs)
 
     def __str__(self):
@@ -423,7 +517,7 @@ class Factura(models.Model):
 # --------------------------------------------------------
 # 7. SISTEMA DE ALERTAS Y NOTIFICACIONES
 # --------------------------------------------------------
-class Notificacion(models.Model):
+class Notificacion(ValoresOriginalesMixin, models.Model):
     """
     Sistema de alertas basado en el TDR.
     """
@@ -459,10 +553,80 @@ class Notificacion(models.Model):
     # Para guardar el ID de la Póliza (ej: "15") o Siniestro relacionado
     id_referencia = models.CharField(max_length=50, null=True, blank=True)
 
+    # Alertas automáticas (ej. "venc:15:2026-12-31:30"): el UNIQUE impide
+    # que un escaneo repetido cree la misma alerta dos veces
+    clave_deduplicacion = models.CharField(
+        max_length=100, unique=True, null=True, blank=True
+    )
+
+    class Meta:
+        indexes = [
+            # Bandeja del usuario ordenada por fecha
+            models.Index(
+                fields=["usuario", "fecha_emision"], name="notif_usuario_fecha_idx"
+            ),
+            # get_pendientes_count
+            models.Index(
+                fields=["usuario", "estado", "fecha_emision"],
+                name="notif_usuario_estado_idx",
+            ),
+            # Retención: leídas más antiguas que N días (archivar_notificaciones)
+            models.Index(
+                fields=["estado", "fecha_emision"], name="notif_estado_fecha_idx"
+            ),
+        ]
+
     def __str__(self):
         return f"Alerta {self.id} - {self.tipo_alerta} para {self.usuario.username}"
 
 
+class NotificacionArchivada(models.Model):
+    """
+    Alertas leídas antiguas que salieron de Notificacion. Cada fila guarda
+    un bloque de alertas de un mismo usuario como JSON comprimido con zlib,
+    así la tabla viva solo conserva lo reciente y el histórico ocupa poco.
+    """
+
+    usuario = models.ForeignKey(
+        Usuario, on_delete=models.CASCADE, related_name="notificaciones_archivadas"
+    )
+    fecha_desde = models.DateTimeField()
+    fecha_hasta = models.DateTimeField()
+    cantidad = models.PositiveIntegerField()
+    datos = models.BinaryField()
+    fecha_archivo = models.DateTimeField(auto_now_add=True)
+
+    CAMPOS = (
+        "id",
+        "mensaje",
+        "tipo_alerta",
+        "fecha_emision",
+        "estado",
+        "enviado_por_correo",
+        "id_referencia",
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["usuario", "fecha_hasta"], name="notif_arch_usuario_idx"
+            ),
+        ]
+
+    @staticmethod
+    def comprimir(filas):
+        return zlib.compress(
+            json.dumps(filas, cls=DjangoJSONEncoder, ensure_ascii=False).encode(), 9
+        )
+
+    def notificaciones(self):
+        """Las alertas del bloque como lista de diccionarios"""
+        return json.loads(zlib.decompress(bytes(self.datos)))
+
+    def __str__(self):
+        return f"Archivo {self.id} - {self.cantidad} alertas de {self.usuario_id}"
+
+
 # ========================================================
 # 8. DOCUMENTOS DE SINIESTROS
 # ========================================================
@@ -491,13 +655,64 @@ class DocumentoSiniestro(models.Model):
     subido_por = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True)
 
 
-@receiver(post_delete, sender=DocumentoSiniestro)
-def eliminar_archivo_de_minio(sender, instance, **kwargs):
-    if instance.archivo:
-        instance.archivo.delete(save=False)
+# ========================================================
+# 9. COLA DE TAREAS EN SEGUNDO PLANO
+# ========================================================
+
+
+class Tarea(models.Model):
+    """
+    Trabajo diferido que ejecuta `manage.py run_workers` (ver tareas.py).
+    Se guarda en la misma transacción que el cambio que la origina.
+    """
+
+    PENDIENTE = "PENDIENTE"
+    EN_PROCESO = "EN_PROCESO"
+    COMPLETADA = "COMPLETADA"
+    FALLIDA = "FALLIDA"
+
+    ESTADO_CHOICES = [
+        (PENDIENTE, "Pendiente"),
+        (EN_PROCESO, "En proceso"),
+        (COMPLETADA, "Completada"),
+        (FALLIDA, "Fallida"),
+    ]
+
+    tipo = models.CharField(max_length=100)
+    argumentos = models.JSONField(default=dict)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default=PENDIENTE)
+
+    intentos = models.PositiveSmallIntegerField(default=0)
+    max_intentos = models.PositiveSmallIntegerField(default=5)
+    # Los reintentos se posponen con backoff exponencial
+    ejecutar_despues = models.DateTimeField(default=timezone.now)
+
+    # Quien la pidió: solo ese usuario o un administrador ven su estado
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="tareas",
+    )
+
+    trabajador = models.CharField(max_length=100, null=True, blank=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    # Lo renueva el trabajador mientras ejecuta: si deja de latir, murió
+    latido = models.DateTimeField(null=True, blank=True)
 
+    resultado = models.JSONField(null=True, blank=True)
+    ultimo_error = models.TextField(null=True, blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
 
-@receiver(post_delete, sender=DocumentoPoliza)
-def eliminar_archivo_poliza(sender, instance, **kwargs):
-    if instance.archivo:
-        instance.archivo.delete(save=False)
+    class Meta:
+        indexes = [
+            # Siguiente lote de tareas listas para ejecutarse
+            models.Index(
+                fields=["estado", "ejecutar_despues"], name="tarea_estado_ejecutar_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Tarea {self.id} - {self.tipo} ({self.estado})"
@@ -1,8 +1,153 @@
+import base64
+import binascii
+import json
+import logging
+import re
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import (
+    Count,
+    F,
+    FloatField,
+    Func,
+    IntegerField,
+    Max,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce, Greatest
 from django.shortcuts import get_object_or_404
 
-from .models import (Bien, DocumentoSiniestro, Factura, Finiquito,
-                     Notificacion, Poliza, ResponsableCustodio, Siniestro,
-                     Usuario)
+from . import facturacion
+from .models import (
+    Aseguradora,
+    Bien,
+    Broker,
+    DocumentoSiniestro,
+    Factura,
+    Finiquito,
+    Notificacion,
+    NotificacionArchivada,
+    Poliza,
+    PolizaEstadistica,
+    ResponsableCustodio,
+    Siniestro,
+    Tarea,
+    Usuario,
+)
+
+logger = logging.getLogger(__name__)
+
+# ========================================================
+# PAGINACIÓN POR CURSOR (KEYSET)
+# ========================================================
+
+TAMANO_PAGINA = 25
+
+
+class PaginaCursor:
+    """
+    Una página de resultados paginada por cursor.
+    Se puede iterar en los templates igual que un queryset.
+    """
+
+    def __init__(self, elementos, siguiente_cursor=None, cursor_actual=None):
+        self.elementos = elementos
+        self.siguiente_cursor = siguiente_cursor
+        self.cursor_actual = cursor_actual
+
+    @property
+    def tiene_siguiente(self):
+        return self.siguiente_cursor is not None
+
+    @property
+    def es_primera(self):
+        return self.cursor_actual is None
+
+    def __iter__(self):
+        return iter(self.elementos)
+
+    def __len__(self):
+        return len(self.elementos)
+
+    def __bool__(self):
+        return bool(self.elementos)
+
+
+def _codificar_cursor(valor, pk):
+    # isoformat conserva los microsegundos que DjangoJSONEncoder recorta
+    crudo = json.dumps([valor.isoformat(), pk])
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip("=")
+
+
+def _decodificar_cursor(cursor, campo):
+    """Devuelve (valor, pk) o lanza ValidationError si el cursor está corrupto"""
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        valor, pk = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return campo.to_python(valor), int(pk)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise ValidationError("Cursor de paginación inválido") from e
+
+
+def paginar_por_cursor(queryset, orden, cursor=None, tamano=TAMANO_PAGINA):
+    """
+    Pagina `queryset` por la columna `orden` (ej. "-fecha_registro") usando el
+    id como desempate. En vez de OFFSET se filtra por la última fila vista,
+    así la página 100 cuesta lo mismo que la primera.
+    """
+    descendente = orden.startswith("-")
+    nombre = orden.lstrip("-")
+    campo = queryset.model._meta.get_field(nombre)
+
+    queryset = queryset.order_by(orden, "-id" if descendente else "id")
+
+    if cursor:
+        try:
+            valor, pk = _decodificar_cursor(cursor, campo)
+        except ValidationError:
+            # Un cursor manipulado o viejo simplemente vuelve a la primera página
+            cursor = None
+        else:
+            comparador = "lt" if descendente else "gt"
+            queryset = queryset.filter(
+                Q(**{f"{nombre}__{comparador}": valor})
+                | Q(**{nombre: valor, f"id__{comparador}": pk})
+            )
+
+    # Pedimos una fila extra para saber si existe una página siguiente
+    elementos = list(queryset[: tamano + 1])
+    siguiente = None
+    if len(elementos) > tamano:
+        elementos = elementos[:tamano]
+        ultimo = elementos[-1]
+        siguiente = _codificar_cursor(getattr(ultimo, nombre), ultimo.pk)
+
+    return PaginaCursor(elementos, siguiente, cursor or None)
+
+
+def recorrer_por_id(queryset, campos, tamano):
+    """
+    Genera las filas de `values_list(*campos)` en orden de id, pidiendo
+    bloques de `tamano` con id > último visto. Cada bloque es una consulta
+    corta: la memoria no depende del total aunque el driver (mysqlclient)
+    traiga completo cada resultado.
+    """
+    queryset = queryset.order_by("id").values_list("id", *campos)
+    ultimo = None
+    while True:
+        pendientes = queryset if ultimo is None else queryset.filter(id__gt=ultimo)
+        bloque = list(pendientes[:tamano])
+        for fila in bloque:
+            yield fila[1:]
+        if len(bloque) < tamano:
+            return
+        ultimo = bloque[-1][0]
 
 
 class UsuarioRepository:
@@ -43,13 +188,129 @@ class UsuarioRepository:
     def delete_usuario(usuario_id):
         Usuario.objects.filter(id=usuario_id).delete()
 
+    @staticmethod
+    def get_ids_por_rol(rol):
+        """Ids de los usuarios activos de un rol, leídos por bloques"""
+        return (
+            Usuario.objects.filter(rol=rol, is_active=True)
+            .values_list("id", flat=True)
+            .iterator(chunk_size=2000)
+        )
+
+
+class TotalFilas(Subquery):
+    """
+    COUNT(*) de otro queryset como subconsulta escalar. Se marca como
+    agregado para poder combinarlo con Count(..., filter=...) dentro de un
+    mismo aggregate() y resolver varios conteos en una sola consulta.
+    """
+
+    template = "(SELECT COUNT(*) FROM (%(subquery)s) AS filas)"
+    contains_aggregate = True
+    output_field = IntegerField()
+
+    def __init__(self, queryset):
+        super().__init__(queryset.order_by().values("pk"))
+
+
+class AseguradoraRepository:
+    """Catálogo de aseguradoras"""
+
+    @staticmethod
+    def get_claves():
+        """[(id, ruc, nombre)] de todas las aseguradoras (son pocas)"""
+        return list(Aseguradora.objects.values_list("id", "ruc", "nombre"))
+
+
+class BrokerRepository:
+    """Catálogo de brokers"""
+
+    @staticmethod
+    def get_claves():
+        """[(id, id_broker, nombre)] de todos los brokers"""
+        return list(Broker.objects.values_list("id", "id_broker", "nombre"))
+
 
 class PolizaRepository:
     """Repositorio para operaciones de acceso a datos de Pólizas"""
 
+    # Columnas que pinta polizas.html; el resto de la fila no viaja por la red
+    CAMPOS_LISTADO = (
+        "id",
+        "numero_poliza",
+        "ramo",
+        "objeto_asegurado",
+        "monto_asegurado",
+        "vigencia_fin",
+        "estado",
+        "fecha_registro",
+        "aseguradora__nombre",
+        "broker__nombre",
+    )
+
     @staticmethod
     def get_all():
-        return Poliza.objects.all().order_by("-fecha_registro")
+        return (
+            Poliza.objects.select_related("aseguradora", "broker")
+            .only(*PolizaRepository.CAMPOS_LISTADO)
+            .order_by("-fecha_registro")
+        )
+
+    @staticmethod
+    def get_pagina(cursor=None, tamano=TAMANO_PAGINA):
+        return paginar_por_cursor(
+            PolizaRepository.get_all(), "-fecha_registro", cursor, tamano
+        )
+
+    @staticmethod
+    def get_para_reporte():
+        """
+        Pólizas del reporte general con su desglose de siniestros (cantidad y
+        valor reclamado) leído de PolizaEstadistica: un LEFT JOIN, sin
+        agrupar los siniestros.
+        """
+        return (
+            Poliza.objects.select_related("aseguradora", "usuario_gestor")
+            .only(
+                "numero_poliza",
+                "estado",
+                "vigencia_inicio",
+                "vigencia_fin",
+                "fecha_registro",
+                "aseguradora__nombre",
+                "usuario_gestor__username",
+            )
+            .annotate(
+                num_siniestros=Coalesce(F("estadistica__total_siniestros"), 0),
+                valor_reclamado=F("estadistica__valor_reclamado"),
+            )
+            .order_by("-fecha_registro")
+        )
+
+    @staticmethod
+    def get_por_vencer(desde, hasta):
+        """
+        Pólizas activas con vigencia_fin en [desde, hasta]: rango sobre el
+        índice poliza_vigencia_fin_idx, leído por bloques.
+        """
+        return (
+            Poliza.objects.filter(estado=True, vigencia_fin__range=(desde, hasta))
+            .order_by("vigencia_fin", "id")
+            .values_list("id", "numero_poliza", "vigencia_fin", "usuario_gestor_id")
+            .iterator(chunk_size=2000)
+        )
+
+    @staticmethod
+    def get_indicadores(hoy):
+        """Conteos de los dashboards resueltos en una sola consulta"""
+        return Poliza.objects.aggregate(
+            total_polizas=Count("id"),
+            total_activas=Count("id", filter=Q(estado=True)),
+            total_vencidas=Count("id", filter=Q(vigencia_fin__lt=hoy)),
+            total_siniestros=TotalFilas(Siniestro.objects.all()),
+            total_facturas=TotalFilas(Factura.objects.all()),
+            total_usuarios=TotalFilas(Usuario.objects.all()),
+        )
 
     @staticmethod
     def get_by_id(poliza_id):
@@ -62,6 +323,22 @@ class PolizaRepository:
     def create(data):
         return Poliza.objects.create(**data)
 
+    @staticmethod
+    def crear_lote(polizas, tamano_lote=1000):
+        return Poliza.objects.bulk_create(polizas, batch_size=tamano_lote)
+
+    @staticmethod
+    def get_para_exportar(campos, tamano):
+        return recorrer_por_id(Poliza.objects.all(), campos, tamano)
+
+    @staticmethod
+    def get_ids_por_numero(numeros):
+        return dict(
+            Poliza.objects.filter(numero_poliza__in=numeros).values_list(
+                "numero_poliza", "id"
+            )
+        )
+
     @staticmethod
     def update(poliza, data):
         for field, value in data.items():
@@ -75,16 +352,81 @@ class PolizaRepository:
 
 
 class SiniestroRepository:
+    # Columnas propias que muestran las tablas de siniestros
+    CAMPOS_LISTADO = (
+        "id",
+        "numero_reclamo",
+        "tipo_siniestro",
+        "fecha_siniestro",
+        "estado_tramite",
+    )
+
     @staticmethod
     def get_all():
-        return Siniestro.objects.all().order_by("-fecha_siniestro")
+        # siniestros.html, el dashboard y el reporte leen la póliza, el custodio
+        # y el bien de cada fila: se traen en el mismo JOIN
+        return (
+            Siniestro.objects.select_related("poliza", "custodio", "bien")
+            .only(
+                *SiniestroRepository.CAMPOS_LISTADO,
+                "poliza__numero_poliza",
+                "custodio__nombre_completo",
+                "custodio__identificacion",
+                "bien__codigo",
+                "bien__detalle",
+            )
+            .order_by("-fecha_siniestro")
+        )
 
     @staticmethod
     def get_by_poliza(poliza_id):
-        return Siniestro.objects.filter(poliza_id=poliza_id).order_by(
-            "-fecha_siniestro"
+        # El detalle de póliza solo muestra columnas propias del siniestro
+        return (
+            Siniestro.objects.filter(poliza_id=poliza_id)
+            .only(*SiniestroRepository.CAMPOS_LISTADO, "poliza_id")
+            .order_by("-fecha_siniestro")
+        )
+
+    @staticmethod
+    def get_pagina(cursor=None, busqueda=None, tamano=TAMANO_PAGINA):
+        return paginar_por_cursor(
+            SiniestroRepository.buscar(busqueda), "-fecha_siniestro", cursor, tamano
+        )
+
+    @staticmethod
+    def get_pagina_por_poliza(poliza_id, cursor=None, tamano=TAMANO_PAGINA):
+        return paginar_por_cursor(
+            SiniestroRepository.get_by_poliza(poliza_id),
+            "-fecha_siniestro",
+            cursor,
+            tamano,
         )
 
+    @staticmethod
+    def buscar(busqueda=None):
+        """Siniestros filtrados por nombre o cédula del custodio"""
+        siniestros = SiniestroRepository.get_all()
+        if busqueda:
+            siniestros = siniestros.filter(
+                Q(custodio__nombre_completo__icontains=busqueda)
+                | Q(custodio__identificacion__icontains=busqueda)
+            )
+        return siniestros
+
+    @staticmethod
+    def get_conteo_por_estado():
+        """[{estado_tramite, total}] agrupado en la base de datos"""
+        return (
+            Siniestro.objects.order_by()
+            .values("estado_tramite")
+            .annotate(total=Count("id"))
+        )
+
+    @staticmethod
+    def get_para_exportar(campos, tamano):
+        # Los JOIN a custodio, bien y finiquito salen de los nombres de campo
+        return recorrer_por_id(Siniestro.objects.all(), campos, tamano)
+
     @staticmethod
     def get_by_id(id):
         return Siniestro.objects.filter(id=id).first()
@@ -115,12 +457,7 @@ class SiniestroRepository:
     @staticmethod
     def update(siniestro_id, data):
         siniestro = get_object_or_404(Siniestro, id=siniestro_id)
-
-        print("🔍 DEPURACIÓN - ACTUALIZACIÓN DE SINIESTRO")
-        print(f"ANTES - Bien actual: {siniestro.bien}")
-        print(f"ANTES - Custodio actual: {siniestro.custodio}")
-        print(f"NUEVO - Bien a asignar: {data.get('bien')}")
-        print(f"NUEVO - Custodio a asignar: {data.get('custodio')}")
+        anterior = (siniestro.bien_id, siniestro.custodio_id)
 
         # Lista para llevar registro de qué campos estamos cambiando
         campos_a_actualizar = []
@@ -142,7 +479,6 @@ class SiniestroRepository:
         if "bien" in data:
             siniestro.bien = data.get("bien")
             campos_a_actualizar.append("bien")
-            print("✅ Bien asignado correctamente")
 
         if "nombre_bien" in data:
             siniestro.nombre_bien = data.get("nombre_bien")
@@ -175,12 +511,16 @@ class SiniestroRepository:
         # EL CAMBIO CLAVE:
         # Si hay campos para actualizar, usamos update_fields
         if campos_a_actualizar:
-            print(f"🔄 Guardando cambios en campos: {campos_a_actualizar}")
             siniestro.save(update_fields=campos_a_actualizar)
-            print(f"✅ DESPUÉS - Bien actualizado: {siniestro.bien}")
-            print(f"✅ DESPUÉS - Custodio actualizado: {siniestro.custodio}")
+            logger.debug(
+                "Siniestro %s actualizado: campos=%s (bien, custodio) %s -> %s",
+                siniestro_id,
+                campos_a_actualizar,
+                anterior,
+                (siniestro.bien_id, siniestro.custodio_id),
+            )
         else:
-            print("⚠️ No hay campos para actualizar")
+            logger.debug("Siniestro %s sin campos para actualizar", siniestro_id)
 
         return siniestro
 
@@ -188,15 +528,37 @@ class SiniestroRepository:
 class FacturaRepository:
     """Repositorio para operaciones de acceso a datos de Facturas"""
 
+    # Columnas que pinta lista_facturas.html
+    CAMPOS_LISTADO = (
+        "id",
+        "numero_factura",
+        "fecha_emision",
+        "total_facturado",
+        "valor_a_pagar",
+        "mensaje_resultado",
+        "poliza__numero_poliza",
+    )
+
     @staticmethod
     def get_all():
         # Ordenamos por fecha de emisión (más recientes primero)
-        return Factura.objects.all().order_by("-fecha_emision")
+        return (
+            Factura.objects.select_related("poliza")
+            .only(*FacturaRepository.CAMPOS_LISTADO)
+            .order_by("-fecha_emision")
+        )
+
+    @staticmethod
+    def get_pagina(cursor=None, tamano=TAMANO_PAGINA):
+        return paginar_por_cursor(
+            FacturaRepository.get_all(), "-fecha_emision", cursor, tamano
+        )
 
     @staticmethod
     def get_by_id(factura_id):
         try:
-            return Factura.objects.get(id=factura_id)
+            # El PDF muestra el número de póliza: se trae en el mismo JOIN
+            return Factura.objects.select_related("poliza").get(id=factura_id)
         except Factura.DoesNotExist:
             return None
 
@@ -206,6 +568,38 @@ class FacturaRepository:
         # por lo que tus cálculos automáticos (IVA, descuentos) SE EJECUTARÁN.
         return Factura.objects.create(**data)
 
+    @staticmethod
+    def get_numeros_existentes(numeros):
+        return set(
+            Factura.objects.filter(numero_factura__in=numeros).values_list(
+                "numero_factura", flat=True
+            )
+        )
+
+    @staticmethod
+    def get_para_exportar(campos, tamano):
+        return recorrer_por_id(Factura.objects.all(), campos, tamano)
+
+    @staticmethod
+    def crear_lote(facturas, tamano_lote=1000):
+        """
+        Inserta muchas facturas sin pasar por save(): los valores calculados
+        se obtienen de una sola pasada con facturacion.aplicar_lote.
+        """
+        facturas = facturacion.aplicar_lote(facturas)
+        with transaction.atomic():
+            return Factura.objects.bulk_create(facturas, batch_size=tamano_lote)
+
+    @staticmethod
+    def recalcular_lote(facturas, tamano_lote=1000):
+        """Vuelve a calcular y guarda (bulk_update) facturas ya existentes"""
+        facturas = facturacion.aplicar_lote(facturas)
+        with transaction.atomic():
+            Factura.objects.bulk_update(
+                facturas, facturacion.CAMPOS_CALCULADOS, batch_size=tamano_lote
+            )
+        return len(facturas)
+
 
 # DocumentoSiniestroRepository
 
@@ -239,6 +633,17 @@ class DocumentoRepository:
         return DocumentoSiniestro.objects.filter(id=documento_id).delete()
 
 
+def campos_conflicto(*campos):
+    """
+    Columnas únicas para bulk_create(update_conflicts=True). MySQL no admite
+    indicarlas (ON DUPLICATE KEY usa cualquier clave única), PostgreSQL y
+    SQLite las exigen.
+    """
+    if connection.features.supports_update_conflicts_with_target:
+        return list(campos)
+    return None
+
+
 class CustodioRepository:
     """Repositorio para gestión de Responsables/Custodios"""
 
@@ -268,10 +673,128 @@ class CustodioRepository:
     def delete(custodio_id):
         return ResponsableCustodio.objects.filter(id=custodio_id).delete()
 
+    # Columnas que una importación puede sobrescribir (la cédula es la clave)
+    CAMPOS_IMPORTACION = (
+        "nombre_completo",
+        "correo",
+        "departamento",
+        "ciudad",
+        "edificio",
+        "puesto",
+    )
+
+    @staticmethod
+    def upsert_lote(custodios):
+        """Un solo INSERT ... ON CONFLICT/ON DUPLICATE KEY por lote"""
+        return ResponsableCustodio.objects.bulk_create(
+            custodios,
+            update_conflicts=True,
+            unique_fields=campos_conflicto("identificacion"),
+            update_fields=CustodioRepository.CAMPOS_IMPORTACION,
+        )
+
+    @staticmethod
+    def get_cupos(identificaciones):
+        """
+        {cédula: (id, bienes_activos)} con las filas bloqueadas hasta el fin
+        de la transacción: nadie más reserva cupo mientras se arma el lote.
+        """
+        filas = (
+            ResponsableCustodio.objects.select_for_update()
+            .filter(identificacion__in=identificaciones)
+            .values_list("identificacion", "id", "bienes_activos")
+        )
+        return {cedula: (pk, activos) for cedula, pk, activos in filas}
+
+    @staticmethod
+    def reservar_bien(custodio_id):
+        """
+        Suma un bien activo solo si el custodio está bajo el tope. El filtro
+        y el incremento son un mismo UPDATE, así que dos altas simultáneas
+        no pueden pasar ambas del 4 al 5. Devuelve False si no había cupo.
+        """
+        return bool(
+            ResponsableCustodio.objects.filter(
+                pk=custodio_id, bienes_activos__lt=Bien.MAX_POR_CUSTODIO
+            ).update(bienes_activos=F("bienes_activos") + 1)
+        )
+
+    @staticmethod
+    def liberar_bien(custodio_id):
+        ResponsableCustodio.objects.filter(pk=custodio_id, bienes_activos__gt=0).update(
+            bienes_activos=F("bienes_activos") - 1
+        )
+
+    @staticmethod
+    def ajustar_bienes_activos(deltas):
+        """{custodio_id: delta} con un UPDATE por cada delta distinto"""
+        custodios_por_delta = defaultdict(list)
+        for custodio_id, delta in deltas.items():
+            if delta:
+                custodios_por_delta[delta].append(custodio_id)
+        for delta, ids in custodios_por_delta.items():
+            ResponsableCustodio.objects.filter(pk__in=ids).update(
+                bienes_activos=Greatest(F("bienes_activos") + delta, Value(0))
+            )
+
+    @staticmethod
+    def recalcular_bienes_activos():
+        """Corrige los contadores que no coincidan con los bienes reales"""
+        reales = dict(
+            Bien.objects.filter(estado_operativo="ACTIVO")
+            .order_by()
+            .values("custodio_id")
+            .annotate(total=Count("id"))
+            .values_list("custodio_id", "total")
+        )
+        custodios_por_total = defaultdict(list)
+        guardados = ResponsableCustodio.objects.values_list("id", "bienes_activos")
+        for pk, activos in guardados.iterator(chunk_size=2000):
+            if activos != reales.get(pk, 0):
+                custodios_por_total[reales.get(pk, 0)].append(pk)
+        for total, ids in custodios_por_total.items():
+            for i in range(0, len(ids), 1000):
+                ResponsableCustodio.objects.filter(pk__in=ids[i : i + 1000]).update(
+                    bienes_activos=total
+                )
+        return sum(len(ids) for ids in custodios_por_total.values())
+
+
+class CoincidenciaTexto(Func):
+    """
+    Puntaje de MATCH ... AGAINST sobre un índice FULLTEXT de MySQL.
+    Solo se usa cuando la conexión es MySQL (ver BienRepository.buscar).
+    """
+
+    output_field = FloatField()
+
+    def __init__(self, campo, consulta):
+        super().__init__(campo)
+        self.consulta = consulta
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        sql, params = compiler.compile(self.source_expressions[0])
+        return f"MATCH ({sql}) AGAINST (%s IN BOOLEAN MODE)", [*params, self.consulta]
+
 
 class BienRepository:
     """Repositorio para acceso a datos de Activos Fijos (Bienes)"""
 
+    # Tope de resultados por cada pulsación del buscador
+    LIMITE_BUSQUEDA = 20
+
+    # Lo que necesita buscar_bienes_ajax para armar la respuesta
+    CAMPOS_BUSQUEDA = (
+        "id",
+        "codigo",
+        "detalle",
+        "marca",
+        "modelo",
+        "serie",
+        "custodio__edificio",
+        "custodio__puesto",
+    )
+
     @staticmethod
     def get_by_custodio(custodio_id):
         """Obtener todos los bienes asignados a un custodio"""
@@ -288,6 +811,244 @@ class BienRepository:
         except Bien.DoesNotExist:
             return None
 
+    @staticmethod
+    def buscar(termino, custodio_id=None, limite=LIMITE_BUSQUEDA):
+        """
+        Buscador de bienes activos, acotado a `limite` resultados:
+        1. Códigos que empiezan por el término (índice único de `codigo`);
+           el código exacto sale primero por orden alfabético.
+        2. Si sobra espacio, coincidencias en `detalle` (índice FULLTEXT en
+           MySQL, ordenadas por relevancia).
+        El custodio viaja en el mismo JOIN para armar la ubicación.
+        """
+        bienes = (
+            Bien.objects.filter(estado_operativo="ACTIVO")
+            .select_related("custodio")
+            .only(*BienRepository.CAMPOS_BUSQUEDA)
+        )
+        if custodio_id:
+            bienes = bienes.filter(custodio_id=custodio_id)
+
+        termino = (termino or "").strip()
+        if not termino:
+            return list(bienes.order_by("codigo")[:limite])
+
+        resultados = list(
+            bienes.filter(codigo__istartswith=termino).order_by("codigo")[:limite]
+        )
+
+        faltan = limite - len(resultados)
+        if faltan > 0:
+            por_detalle = BienRepository._buscar_en_detalle(bienes, termino)
+            if por_detalle is not None:
+                resultados.extend(
+                    por_detalle.exclude(id__in=[b.id for b in resultados])[:faltan]
+                )
+        return resultados
+
+    CAMPOS_IMPORTACION = (
+        "custodio",
+        "baan_v",
+        "detalle",
+        "serie",
+        "modelo",
+        "marca",
+        "ubicacion",
+        "estado_fisico",
+        "estado_operativo",
+    )
+
+    @staticmethod
+    def get_custodios_activos(codigos):
+        """{codigo: custodio_id} de los bienes ACTIVO (los que ocupan cupo)"""
+        return dict(
+            Bien.objects.filter(
+                codigo__in=codigos, estado_operativo="ACTIVO"
+            ).values_list("codigo", "custodio_id")
+        )
+
+    @staticmethod
+    def upsert_lote(bienes):
+        # bulk_create no pasa por las señales de Bien: el tope y el contador
+        # bienes_activos los maneja quien arma el lote
+        return Bien.objects.bulk_create(
+            bienes,
+            update_conflicts=True,
+            unique_fields=campos_conflicto("codigo"),
+            update_fields=BienRepository.CAMPOS_IMPORTACION,
+        )
+
+    @staticmethod
+    def _buscar_en_detalle(bienes, termino):
+        if connection.vendor != "mysql":
+            return bienes.filter(detalle__icontains=termino).order_by("codigo")
+
+        # Modo booleano: todas las palabras obligatorias y con comodín final.
+        # InnoDB ignora palabras de menos de 3 letras, así que no las enviamos.
+        palabras = [p for p in re.findall(r"\w+", termino) if len(p) >= 3]
+        if not palabras:
+            return None
+        consulta = " ".join(f"+{p}*" for p in palabras)
+        return (
+            bienes.annotate(relevancia=CoincidenciaTexto("detalle", consulta))
+            .filter(relevancia__gt=0)
+            .order_by("-relevancia", "codigo")
+        )
+
+
+class PolizaEstadisticaRepository:
+    """Repositorio para el resumen de siniestros por póliza"""
+
+    CAMPOS = (
+        "total_siniestros",
+        *PolizaEstadistica.CAMPO_POR_ESTADO.values(),
+        "valor_reclamado",
+        "valor_pagado",
+        "ultimo_siniestro",
+    )
+
+    @staticmethod
+    def get_by_poliza(poliza_id):
+        return PolizaEstadistica.objects.filter(poliza_id=poliza_id).first()
+
+    @staticmethod
+    def get_mas_siniestrada():
+        return (
+            PolizaEstadistica.objects.select_related("poliza")
+            .only("total_siniestros", "poliza__numero_poliza")
+            .filter(total_siniestros__gt=0)
+            .order_by("-total_siniestros")
+            .first()
+        )
+
+    @staticmethod
+    def aplicar_cambios(poliza_id, cambios, crear=False):
+        """
+        Suma `cambios` ({campo: delta}) a la fila de la póliza con un UPDATE
+        atómico (F()), sin leerla antes. Con crear=True la fila se crea si
+        aún no existe; las bajas nunca crean filas.
+        """
+        expresiones = {
+            campo: F(campo) + delta for campo, delta in cambios.items() if delta
+        }
+        if not expresiones:
+            return
+        filas = PolizaEstadistica.objects.filter(poliza_id=poliza_id)
+        if not filas.update(**expresiones) and crear:
+            PolizaEstadistica.objects.bulk_create(
+                [PolizaEstadistica(poliza_id=poliza_id)], ignore_conflicts=True
+            )
+            filas.update(**expresiones)
+
+    @staticmethod
+    def aplicar_pago(siniestro_id, delta):
+        """Suma `delta` a valor_pagado de la póliza del siniestro"""
+        if delta:
+            PolizaEstadistica.objects.filter(poliza__siniestros=siniestro_id).update(
+                valor_pagado=F("valor_pagado") + delta
+            )
+
+    @staticmethod
+    def get_pago_de_siniestro(siniestro_id):
+        return (
+            Finiquito.objects.filter(siniestro_id=siniestro_id)
+            .values_list("valor_final_pago", flat=True)
+            .first()
+            or 0
+        )
+
+    @staticmethod
+    def registrar_fecha(poliza_id, fecha):
+        """Adelanta ultimo_siniestro si `fecha` es más reciente"""
+        PolizaEstadistica.objects.filter(poliza_id=poliza_id).filter(
+            Q(ultimo_siniestro__isnull=True) | Q(ultimo_siniestro__lt=fecha)
+        ).update(ultimo_siniestro=fecha)
+
+    @staticmethod
+    def recalcular_fecha(poliza_id):
+        """Tras una baja o un cambio de fecha: Max() sobre el índice (poliza, fecha)"""
+        ultimo = Siniestro.objects.filter(poliza_id=poliza_id).aggregate(
+            ultimo=Max("fecha_siniestro")
+        )["ultimo"]
+        PolizaEstadistica.objects.filter(poliza_id=poliza_id).update(
+            ultimo_siniestro=ultimo
+        )
+
+    @staticmethod
+    def calcular_desde_cero():
+        """Estadísticas de todas las pólizas con un único GROUP BY"""
+        return (
+            Siniestro.objects.order_by()
+            .values("poliza_id")
+            .annotate(
+                total_siniestros=Count("id"),
+                valor_reclamado=Sum("valor_reclamo_estimado"),
+                valor_pagado=Sum("finiquito__valor_final_pago"),
+                ultimo_siniestro=Max("fecha_siniestro"),
+                **{
+                    campo: Count("id", filter=Q(estado_tramite=estado))
+                    for estado, campo in PolizaEstadistica.CAMPO_POR_ESTADO.items()
+                },
+            )
+        )
+
+    @staticmethod
+    def reconstruir(tamano_lote=1000):
+        """
+        Reconcilia la tabla con el cálculo desde cero, por bloques de
+        `tamano_lote` pólizas en orden de id: solo se escriben las filas que
+        difieren y solo se borran las de pólizas que ya no tienen siniestros.
+        Devuelve cuántas pólizas tenían valores distintos a los mantenidos
+        incrementalmente.
+        """
+        campos = PolizaEstadisticaRepository.CAMPOS
+        calculo = PolizaEstadisticaRepository.calcular_desde_cero().order_by(
+            "poliza_id"
+        )
+        corregidas, desde = 0, None
+        while True:
+            if desde is not None:
+                calculo_bloque = calculo.filter(poliza_id__gt=desde)
+            else:
+                calculo_bloque = calculo
+            bloque = list(calculo_bloque[:tamano_lote])
+            ultimo_bloque = len(bloque) < tamano_lote
+
+            # Filas actuales del mismo tramo de ids, incluidas las huérfanas
+            actuales = PolizaEstadistica.objects.all()
+            if desde is not None:
+                actuales = actuales.filter(poliza_id__gt=desde)
+            if not ultimo_bloque:
+                actuales = actuales.filter(poliza_id__lte=bloque[-1]["poliza_id"])
+            actuales = {
+                fila["poliza_id"]: fila
+                for fila in actuales.values("poliza_id", *campos)
+            }
+
+            distintas = []
+            for fila in bloque:
+                fila["valor_reclamado"] = fila["valor_reclamado"] or 0
+                fila["valor_pagado"] = fila["valor_pagado"] or 0
+                anterior = actuales.pop(fila["poliza_id"], None)
+                if anterior is None or any(anterior[c] != fila[c] for c in campos):
+                    distintas.append(PolizaEstadistica(**fila))
+            # Lo que queda en `actuales` son pólizas sin siniestros que tenían fila
+            corregidas += len(distintas)
+            corregidas += sum(1 for a in actuales.values() if a["total_siniestros"])
+
+            with transaction.atomic():
+                PolizaEstadistica.objects.bulk_create(
+                    distintas,
+                    update_conflicts=True,
+                    unique_fields=campos_conflicto("poliza"),
+                    update_fields=campos,
+                )
+                PolizaEstadistica.objects.filter(poliza_id__in=list(actuales)).delete()
+
+            if ultimo_bloque:
+                return corregidas
+            desde = bloque[-1]["poliza_id"]
+
 
 class FiniquitoRepository:
     """Repositorio para manejo de Finiquitos (Cierre de Siniestros)"""
@@ -312,14 +1073,142 @@ class FiniquitoRepository:
 class NotificacionRepository:
     """Repositorio para gestión de Notificaciones"""
 
+    TAMANO_LOTE = 1000
+
     @staticmethod
     def crear(data):
         return Notificacion.objects.create(**data)
 
+    @staticmethod
+    def crear_lote(notificaciones, tamano_lote=TAMANO_LOTE):
+        """
+        Inserta un iterable (puede ser un generador) de Notificacion sin
+        guardar, en INSERTs de `tamano_lote` filas dentro de una sola
+        transacción: o entran todas o ninguna. Las que traen una clave de
+        deduplicación que ya existe se omiten. Devuelve cuántas se crearon.
+        """
+        notificaciones = iter(notificaciones)
+        total = 0
+        with transaction.atomic():
+            while lote := list(islice(notificaciones, tamano_lote)):
+                lote = NotificacionRepository._insertar_sin_duplicadas(lote)
+                # bulk_create no dispara señales: el contador se ajusta aquí
+                NotificacionRepository.ajustar_no_leidas(
+                    Counter(n.usuario_id for n in lote if n.estado == "PENDIENTE")
+                )
+                total += len(lote)
+        return total
+
+    @staticmethod
+    def _insertar_sin_duplicadas(lote):
+        """
+        Inserta el lote y devuelve las notificaciones que entraron. Si otra
+        corrida insertó alguna de las mismas claves de deduplicación entre
+        la consulta previa y el INSERT, se descartan esas y se reintenta.
+        """
+        while lote:
+            try:
+                # Savepoint: el error no invalida la transacción de crear_lote
+                with transaction.atomic():
+                    Notificacion.objects.bulk_create(lote, batch_size=len(lote))
+                return lote
+            except IntegrityError:
+                claves = [n.clave_deduplicacion for n in lote if n.clave_deduplicacion]
+                # Lectura con bloqueo: ve la fila que la otra corrida ya confirmó
+                existentes = set(
+                    Notificacion.objects.select_for_update()
+                    .filter(clave_deduplicacion__in=claves)
+                    .values_list("clave_deduplicacion", flat=True)
+                )
+                restantes = [
+                    n for n in lote if n.clave_deduplicacion not in existentes
+                ]
+                if len(restantes) == len(lote):
+                    raise  # No era una clave repetida
+                lote = restantes
+        return lote
+
+    @staticmethod
+    def get_claves_existentes(claves):
+        """Cuáles de estas claves de deduplicación ya tienen alerta"""
+        return set(
+            Notificacion.objects.filter(clave_deduplicacion__in=claves).values_list(
+                "clave_deduplicacion", flat=True
+            )
+        )
+
+    @staticmethod
+    def ajustar_no_leidas(deltas):
+        """
+        Suma a Usuario.notificaciones_no_leidas el delta de cada usuario
+        ({usuario_id: delta}) con un UPDATE atómico por cada delta distinto.
+        """
+        usuarios_por_delta = defaultdict(list)
+        for usuario_id, delta in deltas.items():
+            if delta:
+                usuarios_por_delta[delta].append(usuario_id)
+        for delta, ids in usuarios_por_delta.items():
+            for i in range(0, len(ids), NotificacionRepository.TAMANO_LOTE):
+                Usuario.objects.filter(
+                    pk__in=ids[i : i + NotificacionRepository.TAMANO_LOTE]
+                ).update(
+                    notificaciones_no_leidas=Greatest(
+                        F("notificaciones_no_leidas") + delta, Value(0)
+                    )
+                )
+
+    @staticmethod
+    def recalcular_no_leidas(usuario_ids):
+        """Pone Usuario.notificaciones_no_leidas igual al conteo real"""
+        pendientes = dict(
+            Notificacion.objects.filter(usuario_id__in=usuario_ids, estado="PENDIENTE")
+            .order_by()
+            .values("usuario_id")
+            .annotate(total=Count("id"))
+            .values_list("usuario_id", "total")
+        )
+        for usuario_id in usuario_ids:
+            Usuario.objects.filter(pk=usuario_id).update(
+                notificaciones_no_leidas=pendientes.get(usuario_id, 0)
+            )
+
+    @staticmethod
+    def get_no_leidas(usuario_id):
+        """Lee el contador desnormalizado (búsqueda por PK, sin COUNT)"""
+        return (
+            Usuario.objects.filter(pk=usuario_id)
+            .values_list("notificaciones_no_leidas", flat=True)
+            .first()
+            or 0
+        )
+
+    # Columnas que pinta lista_notificaciones.html
+    CAMPOS_LISTADO = (
+        "id",
+        "usuario_id",
+        "mensaje",
+        "tipo_alerta",
+        "fecha_emision",
+        "estado",
+    )
+
     @staticmethod
     def get_by_usuario(usuario):
         # Devuelve primero las más nuevas
-        return Notificacion.objects.filter(usuario=usuario).order_by("-fecha_emision")
+        return (
+            Notificacion.objects.filter(usuario=usuario)
+            .only(*NotificacionRepository.CAMPOS_LISTADO)
+            .order_by("-fecha_emision")
+        )
+
+    @staticmethod
+    def get_pagina_por_usuario(usuario, cursor=None, tamano=TAMANO_PAGINA):
+        return paginar_por_cursor(
+            NotificacionRepository.get_by_usuario(usuario),
+            "-fecha_emision",
+            cursor,
+            tamano,
+        )
 
     @staticmethod
     def get_pendientes_count(usuario):
@@ -333,7 +1222,190 @@ class NotificacionRepository:
             return None
 
     @staticmethod
-    def marcar_como_leida(notificacion):
-        notificacion.estado = "LEIDA"
-        notificacion.save()
-        return notificacion
+    def marcar_leidas(usuario_id, ids=None):
+        """
+        Marca como leídas las pendientes del usuario (todas, o solo `ids`) en
+        un único UPDATE; el filtro por usuario impide tocar alertas ajenas.
+        Devuelve cuántas cambiaron y las descuenta del contador.
+        """
+        pendientes = Notificacion.objects.filter(
+            usuario_id=usuario_id, estado="PENDIENTE"
+        )
+        if ids is not None:
+            pendientes = pendientes.filter(pk__in=ids)
+        with transaction.atomic():
+            marcadas = pendientes.update(estado="LEIDA")
+            NotificacionRepository.ajustar_no_leidas({usuario_id: -marcadas})
+        return marcadas
+
+    @staticmethod
+    def archivar_lote(fecha_limite, tamano_lote=TAMANO_LOTE):
+        """
+        Mueve a NotificacionArchivada hasta `tamano_lote` alertas LEIDA
+        emitidas antes de `fecha_limite` (un bloque comprimido por usuario)
+        y las borra de la tabla viva, todo en una transacción.
+        Devuelve cuántas movió; 0 cuando ya no queda nada por archivar.
+        """
+        with transaction.atomic():
+            filas = list(
+                Notificacion.objects.filter(
+                    estado="LEIDA", fecha_emision__lt=fecha_limite
+                )
+                .order_by("fecha_emision")
+                .values("usuario_id", *NotificacionArchivada.CAMPOS)[:tamano_lote]
+            )
+            if not filas:
+                return 0
+
+            por_usuario = defaultdict(list)
+            for fila in filas:
+                por_usuario[fila.pop("usuario_id")].append(fila)
+            NotificacionArchivada.objects.bulk_create(
+                NotificacionArchivada(
+                    usuario_id=usuario_id,
+                    fecha_desde=alertas[0]["fecha_emision"],
+                    fecha_hasta=alertas[-1]["fecha_emision"],
+                    cantidad=len(alertas),
+                    datos=NotificacionArchivada.comprimir(alertas),
+                )
+                for usuario_id, alertas in por_usuario.items()
+            )
+            Notificacion.objects.filter(id__in=[f["id"] for f in filas]).delete()
+        return len(filas)
+
+
+class TareaRepository:
+    """Repositorio de la cola de tareas (tabla Tarea)"""
+
+    @staticmethod
+    def crear(tipo, argumentos, max_intentos=None, usuario=None):
+        datos = {"tipo": tipo, "argumentos": argumentos, "usuario": usuario}
+        if max_intentos is not None:
+            datos["max_intentos"] = max_intentos
+        return Tarea.objects.create(**datos)
+
+    @staticmethod
+    def get_by_id(tarea_id):
+        return Tarea.objects.filter(id=tarea_id).first()
+
+    @staticmethod
+    def reclamar(trabajador, ahora, limite):
+        """
+        Marca como EN_PROCESO hasta `limite` tareas listas y las devuelve.
+        Cada fila se toma con un UPDATE condicionado al estado PENDIENTE, así
+        dos trabajadores (hilos o procesos) nunca ejecutan la misma tarea.
+        """
+        candidatas = list(
+            Tarea.objects.filter(estado=Tarea.PENDIENTE, ejecutar_despues__lte=ahora)
+            .order_by("ejecutar_despues")
+            .values_list("id", flat=True)[:limite]
+        )
+        tomadas = [
+            tarea_id
+            for tarea_id in candidatas
+            if Tarea.objects.filter(id=tarea_id, estado=Tarea.PENDIENTE).update(
+                estado=Tarea.EN_PROCESO,
+                trabajador=trabajador,
+                fecha_inicio=ahora,
+                latido=ahora,
+                intentos=F("intentos") + 1,
+            )
+        ]
+        return list(Tarea.objects.filter(id__in=tomadas).order_by("ejecutar_despues"))
+
+    @staticmethod
+    def completar(tarea, resultado, ahora):
+        Tarea.objects.filter(id=tarea.id).update(
+            estado=Tarea.COMPLETADA, resultado=resultado, fecha_fin=ahora
+        )
+
+    @staticmethod
+    def reprogramar(tarea, error, ejecutar_despues):
+        Tarea.objects.filter(id=tarea.id).update(
+            estado=Tarea.PENDIENTE,
+            ultimo_error=error,
+            ejecutar_despues=ejecutar_despues,
+            trabajador=None,
+        )
+
+    @staticmethod
+    def marcar_fallida(tarea, error, ahora):
+        Tarea.objects.filter(id=tarea.id).update(
+            estado=Tarea.FALLIDA, ultimo_error=error, fecha_fin=ahora
+        )
+
+    @staticmethod
+    def renovar_latido(trabajador, ahora):
+        """Renueva el latido de todas las tareas en curso del trabajador"""
+        return Tarea.objects.filter(
+            estado=Tarea.EN_PROCESO, trabajador=trabajador
+        ).update(latido=ahora)
+
+    @staticmethod
+    def liberar_abandonadas(limite_latido, ahora, retraso):
+        """
+        Recupera las tareas cuyo trabajador dejó de latir (murió a medias).
+        Las que ya agotaron sus intentos quedan FALLIDA; el resto vuelve a la
+        cola con el mismo backoff que un reintento normal (`retraso` recibe
+        el número de intentos). Una tarea larga con el trabajador vivo sigue
+        renovando su latido y no se libera.
+        """
+        abandonadas = Tarea.objects.filter(
+            estado=Tarea.EN_PROCESO, latido__lt=limite_latido
+        )
+        fallidas = abandonadas.filter(intentos__gte=F("max_intentos")).update(
+            estado=Tarea.FALLIDA,
+            ultimo_error="Trabajador abandonado: sin latido y sin intentos restantes",
+            fecha_fin=ahora,
+            trabajador=None,
+        )
+        # Un UPDATE por número de intentos (a lo sumo max_intentos valores)
+        liberadas = 0
+        intentos = abandonadas.values_list("intentos", flat=True).distinct()
+        for n in list(intentos):
+            liberadas += abandonadas.filter(intentos=n).update(
+                estado=Tarea.PENDIENTE,
+                ultimo_error="Trabajador abandonado: sin latido",
+                ejecutar_despues=ahora + retraso(n),
+                trabajador=None,
+            )
+        return fallidas + liberadas
+
+
+class CarteraSinteticaRepository:
+    """Inserción masiva de la cartera generada por apppolizas.semillas"""
+
+    @staticmethod
+    def siguientes_ids(modelos):
+        """{modelo: primer id libre}"""
+        return {
+            modelo: (modelo.objects.aggregate(maximo=Max("id"))["maximo"] or 0) + 1
+            for modelo in modelos
+        }
+
+    @staticmethod
+    def admite_escritura_paralela():
+        # SQLite bloquea el archivo entero en cada escritura
+        return connection.vendor != "sqlite"
+
+    @staticmethod
+    def insertar(filas, tamano_lote=1000):
+        """
+        Guarda {modelo: [instancias]} en orden y en una sola transacción.
+        Sin señales: los contadores y estadísticas se reconstruyen después.
+        """
+        with transaction.atomic():
+            for modelo, instancias in filas.items():
+                if modelo is Factura:
+                    FacturaRepository.crear_lote(instancias, tamano_lote)
+                else:
+                    modelo.objects.bulk_create(instancias, batch_size=tamano_lote)
+        return {modelo: len(instancias) for modelo, instancias in filas.items()}
+
+    @staticmethod
+    def insertar_en_hilo(filas, tamano_lote=1000):
+        """insertar() desde un hilo de trabajo: cierra su conexión al terminar"""
+        try:
+            return CarteraSinteticaRepository.insertar(filas, tamano_lote)
+        finally:
+            connections.close_all()
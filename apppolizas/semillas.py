@@ -0,0 +1,273 @@
+"""
+Cartera sintética para benchmarks y pruebas de carga.
+
+Arma instancias de los modelos (sin guardarlas) a partir de un generador
+aleatorio con semilla: la misma semilla y los mismos ids de partida producen
+siempre los mismos datos. Los ids se asignan aquí y no los pone la base de
+datos, así las claves foráneas se resuelven sin volver a consultar lo
+insertado (MySQL no devuelve los ids de un bulk_create).
+"""
+
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from .models import (
+    Aseguradora,
+    Bien,
+    Broker,
+    Factura,
+    Finiquito,
+    Notificacion,
+    Poliza,
+    ResponsableCustodio,
+    Siniestro,
+)
+
+ASEGURADORAS = 8
+BROKERS = 4
+# Pólizas por cada custodio generado
+POLIZAS_POR_CUSTODIO = 2
+MAX_SINIESTROS_POR_POLIZA = 3
+
+RAMOS = ("Ramos Generales", "Equipo Electrónico", "Vehículos", "Incendio")
+OBJETOS = ("Equipos de cómputo", "Laboratorios", "Flota institucional", "Edificios")
+DETALLES = ("Laptop", "Proyector", "Impresora", "Servidor", "Microscopio", "Router")
+MARCAS = ("Dell", "HP", "Lenovo", "Epson", "Cisco", "Olympus")
+TIPOS_SINIESTRO = ("Robo", "Daño eléctrico", "Caída", "Incendio", "Hurto")
+CIUDADES = ("Loja - CPL", "Quito", "Guayaquil", "Cuenca")
+ESTADOS_TRAMITE = [estado for estado, _ in Siniestro.ESTADO_CHOICES]
+
+FECHA_BASE = date(2024, 1, 1)
+
+
+def _centavos(azar, minimo, maximo):
+    return Decimal(azar.randrange(minimo * 100, maximo * 100)) / 100
+
+
+def catalogos(azar, ids):
+    """
+    Aseguradoras y brokers. `ids` es {modelo: siguiente id} y se actualiza
+    con lo que se va asignando.
+    """
+    aseguradoras = []
+    for _ in range(ASEGURADORAS):
+        pk = ids[Aseguradora]
+        ids[Aseguradora] += 1
+        aseguradoras.append(
+            Aseguradora(
+                id=pk,
+                nombre=f"Aseguradora Sintética {pk}",
+                ruc=f"{pk:013d}",
+                contacto=f"Contacto {pk}",
+                email_contacto=f"contacto{pk}@aseguradora.ec",
+                telefono=f"07{azar.randrange(10**7):07d}",
+            )
+        )
+    brokers = []
+    for _ in range(BROKERS):
+        pk = ids[Broker]
+        ids[Broker] += 1
+        brokers.append(
+            Broker(
+                id=pk,
+                nombre=f"Broker Sintético {pk}",
+                correo=f"broker{pk}@broker.ec",
+                id_broker=f"BRK-{pk}",
+            )
+        )
+    return {Aseguradora: aseguradoras, Broker: brokers}
+
+
+def capacidad_bloque(polizas):
+    """
+    Máximo de ids que puede consumir un bloque de `polizas` pólizas. Cada
+    bloque recibe un rango propio de ese tamaño, así varios bloques se
+    generan e insertan en paralelo sin pisarse (los huecos no importan).
+    """
+    custodios = max(1, -(-polizas // POLIZAS_POR_CUSTODIO))
+    siniestros = polizas * MAX_SINIESTROS_POR_POLIZA
+    return {
+        ResponsableCustodio: custodios,
+        Bien: custodios * Bien.MAX_POR_CUSTODIO,
+        Poliza: polizas,
+        Siniestro: siniestros,
+        Finiquito: siniestros,
+        Factura: polizas,
+        Notificacion: polizas + siniestros,
+    }
+
+
+def bloque(polizas, azar, ids, aseguradora_ids, broker_ids, usuario_ids=()):
+    """
+    `polizas` pólizas con sus custodios, bienes (1 a 5 por custodio),
+    siniestros (0 a 3 por póliza, repartidos en todos los estados), el
+    finiquito de los liquidados, una factura por póliza y las alertas de los
+    usuarios gestores. Devuelve {modelo: [instancias]} en orden de inserción.
+    """
+    filas = {
+        ResponsableCustodio: [],
+        Bien: [],
+        Poliza: [],
+        Siniestro: [],
+        Finiquito: [],
+        Factura: [],
+        Notificacion: [],
+    }
+
+    def siguiente(modelo):
+        pk = ids[modelo]
+        ids[modelo] += 1
+        return pk
+
+    def gestor():
+        return azar.choice(usuario_ids) if usuario_ids else None
+
+    def alerta(usuario_id, tipo, mensaje, referencia):
+        if usuario_id is None:
+            return
+        filas[Notificacion].append(
+            Notificacion(
+                id=siguiente(Notificacion),
+                usuario_id=usuario_id,
+                tipo_alerta=tipo,
+                mensaje=mensaje,
+                estado="PENDIENTE" if azar.random() < 0.4 else "LEIDA",
+                id_referencia=str(referencia),
+            )
+        )
+
+    bienes = []  # (id, custodio_id) para los siniestros
+    for _ in range(capacidad_bloque(polizas)[ResponsableCustodio]):
+        custodio_id = siguiente(ResponsableCustodio)
+        filas[ResponsableCustodio].append(
+            ResponsableCustodio(
+                id=custodio_id,
+                nombre_completo=f"Custodio Sintético {custodio_id}",
+                identificacion=f"S{custodio_id:09d}",
+                correo=f"custodio{custodio_id}@utpl.edu.ec",
+                departamento=f"Departamento {custodio_id % 40}",
+                ciudad=azar.choice(CIUDADES),
+            )
+        )
+        for _ in range(azar.randint(1, Bien.MAX_POR_CUSTODIO)):
+            bien_id = siguiente(Bien)
+            filas[Bien].append(
+                Bien(
+                    id=bien_id,
+                    custodio_id=custodio_id,
+                    codigo=f"BS-{bien_id:08d}",
+                    detalle=f"{azar.choice(DETALLES)} {bien_id}",
+                    marca=azar.choice(MARCAS),
+                    serie=f"SN{azar.randrange(10**8):08d}",
+                    estado_fisico=azar.choice("BRM"),
+                    estado_operativo="ACTIVO" if azar.random() < 0.9 else "INACTIVO",
+                )
+            )
+            bienes.append((bien_id, custodio_id))
+
+    for _ in range(polizas):
+        poliza_id = siguiente(Poliza)
+        usuario_id = gestor()
+        inicio = FECHA_BASE + timedelta(days=azar.randrange(730))
+        prima = _centavos(azar, 100, 6000)
+        numero_poliza = f"PS-{poliza_id:08d}"
+        filas[Poliza].append(
+            Poliza(
+                id=poliza_id,
+                numero_poliza=numero_poliza,
+                aseguradora_id=azar.choice(aseguradora_ids),
+                broker_id=azar.choice(broker_ids),
+                vigencia_inicio=inicio,
+                vigencia_fin=inicio + timedelta(days=365),
+                monto_asegurado=prima * azar.randint(20, 80),
+                ramo=azar.choice(RAMOS),
+                objeto_asegurado=azar.choice(OBJETOS),
+                prima_base=prima,
+                prima_total=(prima * Decimal("1.15")).quantize(Decimal("0.01")),
+                estado=azar.random() < 0.8,
+                renovable=azar.random() < 0.5,
+                fecha_emision=inicio,
+                usuario_gestor_id=usuario_id,
+            )
+        )
+        if azar.random() < 0.3:
+            alerta(
+                usuario_id,
+                "VENCIMIENTO_POLIZA",
+                f"La póliza {numero_poliza} vence el {inicio + timedelta(days=365)}",
+                poliza_id,
+            )
+
+        for _ in range(azar.randint(0, MAX_SINIESTROS_POR_POLIZA)):
+            siniestro_id = siguiente(Siniestro)
+            bien_id, custodio_id = azar.choice(bienes)
+            # Por id y no al azar: cualquier cartera con 6+ siniestros tiene
+            # todos los estados del trámite
+            estado = ESTADOS_TRAMITE[siniestro_id % len(ESTADOS_TRAMITE)]
+            fecha = inicio + timedelta(days=azar.randrange(365))
+            reclamo = _centavos(azar, 50, 5000)
+            filas[Siniestro].append(
+                Siniestro(
+                    id=siniestro_id,
+                    numero_reclamo=f"RS-{siniestro_id:08d}",
+                    poliza_id=poliza_id,
+                    custodio_id=custodio_id,
+                    bien_id=bien_id,
+                    usuario_gestor_id=usuario_id,
+                    fecha_siniestro=fecha,
+                    tipo_siniestro=azar.choice(TIPOS_SINIESTRO),
+                    ubicacion_bien=azar.choice(CIUDADES),
+                    causa_siniestro="Generado para pruebas de carga",
+                    estado_tramite=estado,
+                    valor_reclamo_estimado=reclamo,
+                )
+            )
+            alerta(
+                usuario_id,
+                "OTRO",
+                f"Nuevo Siniestro registrado en la póliza {numero_poliza}",
+                siniestro_id,
+            )
+            if estado == "LIQUIDADO":
+                deducible = (reclamo * Decimal("0.10")).quantize(Decimal("0.01"))
+                depreciacion = _centavos(azar, 0, 100)
+                pagado = azar.random() < 0.6
+                filas[Finiquito].append(
+                    Finiquito(
+                        id=siguiente(Finiquito),
+                        siniestro_id=siniestro_id,
+                        fecha_finiquito=fecha + timedelta(days=azar.randint(15, 90)),
+                        id_finiquito=f"FQ-{siniestro_id:08d}",
+                        valor_total_reclamo=reclamo,
+                        valor_deducible=deducible,
+                        valor_depreciacion=depreciacion,
+                        valor_final_pago=max(
+                            reclamo - deducible - depreciacion, Decimal("0.00")
+                        ),
+                        pagado_a_usuario=pagado,
+                        fecha_pago_realizado=(
+                            fecha + timedelta(days=100) if pagado else None
+                        ),
+                    )
+                )
+
+        pago = inicio + timedelta(days=azar.randrange(60))
+        filas[Factura].append(
+            Factura(
+                id=siguiente(Factura),
+                poliza_id=poliza_id,
+                numero_factura=f"FS-{poliza_id:08d}",
+                fecha_emision=inicio,
+                fecha_pago=pago if azar.random() < 0.7 else None,
+                prima=prima,
+                retenciones=_centavos(azar, 0, 50),
+                pagado=azar.random() < 0.3,
+            )
+        )
+    return filas
+
+
+def nuevo_azar(semilla, *partes):
+    """Generador independiente por semilla y etapa (tamaño, bloque, ...)"""
+    return random.Random("-".join(str(p) for p in (semilla, *partes)))
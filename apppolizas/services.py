@@ -1,21 +1,73 @@
 import datetime
+import hashlib
+import io
 import os
-from datetime import date
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from datetime import date, timedelta
 from decimal import Decimal
+from itertools import islice
 
 import jwt
 from django.conf import settings
 from django.contrib.auth import authenticate
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.validators import validate_email
 from django.db import transaction
-
-from .models import (Factura, Finiquito, Notificacion, Poliza, Siniestro,
-                     Usuario)
-from .repositories import (BienRepository, CustodioRepository,
-                           DocumentoRepository, FacturaRepository,
-                           FiniquitoRepository, NotificacionRepository,
-                           PolizaRepository, SiniestroRepository,
-                           UsuarioRepository)
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.template.loader import get_template
+from django.utils import timezone
+from xhtml2pdf import pisa
+
+from . import semillas
+from .busqueda import indice_custodios, normalizar
+from .exportacion import TAMANO_CURSOR, comprimir_gzip, lineas_csv
+from .importacion import (
+    ResultadoImportacion,
+    a_booleano,
+    a_decimal,
+    a_fecha,
+    leer_filas,
+    procesar_por_lotes,
+)
+from .metricas import contar_operacion, pdf_duracion
+from .models import (
+    Aseguradora,
+    Bien,
+    Broker,
+    DocumentoPoliza,
+    DocumentoSiniestro,
+    Factura,
+    Finiquito,
+    Notificacion,
+    Poliza,
+    PolizaEstadistica,
+    ResponsableCustodio,
+    Siniestro,
+    Usuario,
+)
+from .repositories import (
+    AseguradoraRepository,
+    BienRepository,
+    BrokerRepository,
+    CarteraSinteticaRepository,
+    CustodioRepository,
+    DocumentoRepository,
+    FacturaRepository,
+    FiniquitoRepository,
+    NotificacionRepository,
+    PolizaEstadisticaRepository,
+    PolizaRepository,
+    SiniestroRepository,
+    TareaRepository,
+    UsuarioRepository,
+)
+from .tareas import encolar, tarea
 
 
 class AuthService:
@@ -76,6 +128,10 @@ class PolizaService:
     def listar_polizas():
         return PolizaRepository.get_all()
 
+    @staticmethod
+    def listar_polizas_paginado(cursor=None):
+        return PolizaRepository.get_pagina(cursor)
+
     @staticmethod
     def crear_poliza(data):
         # 1. Validaciones
@@ -90,15 +146,12 @@ class PolizaService:
         usuario = data.get("usuario_gestor")
 
         if usuario:
-            # Usamos NotificacionRepository directamente para evitar errores de orden de lectura
-            NotificacionRepository.crear(
-                {
-                    "usuario": usuario,
-                    "tipo_alerta": "VENCIMIENTO_POLIZA",  # Usamos este tipo o 'OTRO' para indicar nueva creación
-                    "mensaje": f"Se ha registrado exitosamente la nueva póliza {poliza.numero_poliza}.",
-                    "estado": "PENDIENTE",
-                    "id_referencia": str(poliza.id),
-                }
+            # Se crea en segundo plano (run_workers); la tarea viaja en esta transacción
+            NotificacionService.encolar_notificacion(
+                usuario,
+                "VENCIMIENTO_POLIZA",  # Usamos este tipo o 'OTRO' para indicar nueva creación
+                f"Se ha registrado exitosamente la nueva póliza {poliza.numero_poliza}.",
+                str(poliza.id),
             )
         # -------------------------------------------------
 
@@ -146,6 +199,15 @@ class SiniestroService:
         return SiniestroRepository.get_by_poliza(poliza_id)
 
     @staticmethod
+    def listar_paginado(cursor=None, busqueda=None):
+        return SiniestroRepository.get_pagina(cursor, busqueda)
+
+    @staticmethod
+    def listar_por_poliza_paginado(poliza_id, cursor=None):
+        return SiniestroRepository.get_pagina_por_poliza(poliza_id, cursor)
+
+    @staticmethod
+    @contar_operacion("crear_siniestro")
     def crear_siniestro(poliza, data, usuario):
         """
         Crea un siniestro y notifica al usuario (solo texto).
@@ -162,15 +224,12 @@ class SiniestroService:
 
         # 3. --- NUEVO: NOTIFICACIÓN DE SINIESTRO ---
         if usuario:
-            NotificacionRepository.crear(
-                {
-                    "usuario": usuario,
-                    "tipo_alerta": "OTRO",
-                    # AQUÍ USAMOS EL BIEN PARA OBTENER EL NOMBRE:
-                    "mensaje": f"Nuevo Siniestro registrado en la póliza {poliza.numero_poliza}. Bien afectado: {siniestro.bien.detalle}",
-                    "estado": "PENDIENTE",
-                    "id_referencia": str(siniestro.id),
-                }
+            NotificacionService.encolar_notificacion(
+                usuario,
+                "OTRO",
+                # AQUÍ USAMOS EL BIEN PARA OBTENER EL NOMBRE:
+                f"Nuevo Siniestro registrado en la póliza {poliza.numero_poliza}. Bien afectado: {siniestro.bien.detalle}",
+                str(siniestro.id),
             )
         # -------------------------------------------
 
@@ -188,6 +247,10 @@ class FacturaService:
     def listar_facturas():
         return FacturaRepository.get_all()
 
+    @staticmethod
+    def listar_facturas_paginado(cursor=None):
+        return FacturaRepository.get_pagina(cursor)
+
     @staticmethod
     def crear_factura(data):
         # 1. Primero creamos la factura normalmente
@@ -198,19 +261,29 @@ class FacturaService:
         usuario_destino = factura.poliza.usuario_gestor
 
         if usuario_destino:
-            NotificacionRepository.crear(
-                {
-                    "usuario": usuario_destino,
-                    "tipo_alerta": "PAGO_PENDIENTE",  # <--- Esto pone el ícono de Cobranza/Dinero
-                    "mensaje": f"Nueva Factura {factura.numero_factura} generada. Valor a pagar: ${factura.valor_a_pagar}",
-                    "estado": "PENDIENTE",
-                    "id_referencia": str(factura.id),
-                }
+            NotificacionService.encolar_notificacion(
+                usuario_destino,
+                "PAGO_PENDIENTE",  # <--- Esto pone el ícono de Cobranza/Dinero
+                f"Nueva Factura {factura.numero_factura} generada. Valor a pagar: ${factura.valor_a_pagar}",
+                str(factura.id),
             )
         # ------------------------------------------------
 
+        # 3. El PDF se deja renderizado en el storage para la primera descarga
+        encolar("factura.regenerar_pdf", factura_id=factura.id)
+
         return factura
 
+    @staticmethod
+    def crear_facturas_lote(facturas):
+        """
+        Alta masiva (importaciones): una sola pasada de cálculo y
+        bulk_create. No dispara señales, así que el dashboard se invalida aquí.
+        """
+        creadas = FacturaRepository.crear_lote(facturas)
+        DashboardStatsService.invalidar()
+        return creadas
+
     @staticmethod
     def obtener_factura(factura_id):
         factura = FacturaRepository.get_by_id(factura_id)
@@ -219,6 +292,83 @@ class FacturaService:
         return factura
 
 
+class FacturaPDFService:
+    """
+    PDF de factura cacheado en el storage (MinIO/S3). La ruta incluye un hash
+    de los valores que muestra la plantilla y de su versión, así que un PDF
+    guardado nunca queda desactualizado: si la factura cambia, cambia la ruta.
+    """
+
+    PLANTILLA = "factura_pdf.html"
+    # Subir este número al modificar factura_pdf.html
+    VERSION_PLANTILLA = 1
+
+    CAMPOS_PDF = (
+        "numero_factura",
+        "documento_contable",
+        "fecha_emision",
+        "fecha_pago",
+        "mensaje_resultado",
+        "prima",
+        "contribucion_super",
+        "seguro_campesino",
+        "derechos_emision",
+        "base_imponible",
+        "iva",
+        "total_facturado",
+        "descuento_pronto_pago",
+        "retenciones",
+        "valor_a_pagar",
+    )
+
+    @staticmethod
+    def directorio(factura_id):
+        return f"facturas/pdf/{factura_id}"
+
+    @staticmethod
+    def ruta(factura):
+        valores = [getattr(factura, campo) for campo in FacturaPDFService.CAMPOS_PDF]
+        valores += [factura.poliza.numero_poliza, FacturaPDFService.VERSION_PLANTILLA]
+        huella = hashlib.sha256(repr(valores).encode()).hexdigest()[:32]
+        return f"{FacturaPDFService.directorio(factura.pk)}/{huella}.pdf"
+
+    @staticmethod
+    def obtener_pdf(factura):
+        """Bytes del PDF; solo se renderiza si no está en el storage"""
+        ruta = FacturaPDFService.ruta(factura)
+        try:
+            with default_storage.open(ruta, "rb") as archivo:
+                return archivo.read()
+        except (FileNotFoundError, OSError):
+            pass
+
+        pdf = FacturaPDFService.renderizar(factura)
+        if pdf is not None:
+            default_storage.save(ruta, ContentFile(pdf))
+        return pdf
+
+    @staticmethod
+    def renderizar(factura):
+        html = get_template(FacturaPDFService.PLANTILLA).render({"factura": factura})
+        destino = io.BytesIO()
+        with pdf_duracion.medir(documento="factura"):
+            estado = pisa.CreatePDF(html, dest=destino)
+        if estado.err:
+            return None
+        return destino.getvalue()
+
+    @staticmethod
+    def invalidar(factura_id):
+        """Borra los PDFs guardados de la factura (versiones anteriores)"""
+        directorio = FacturaPDFService.directorio(factura_id)
+        try:
+            _, archivos = default_storage.listdir(directorio)
+        except (FileNotFoundError, OSError):
+            return
+        for nombre in archivos:
+            default_storage.delete(f"{directorio}/{nombre}")
+
+
 # Servicio para gestión de Documentos de Siniestros
 
 
@@ -230,6 +380,7 @@ class DocumentoService:
     MAX_TAMANO_MB = 5 * 1024 * 1024
 
     @staticmethod
+    @contar_operacion("subir_evidencia")
     def subir_evidencia(siniestro_id, data_form, archivo, usuario):
         """
         Lógica de negocio para validar y subir un archivo.
@@ -278,6 +429,11 @@ class CustodioService:
     def listar_custodios():
         return CustodioRepository.get_all()
 
+    @staticmethod
+    def buscar_custodios(termino, limite=10):
+        # Se responde desde el índice en memoria, sin consultar MySQL
+        return indice_custodios.buscar(termino, limite)
+
     @staticmethod
     def crear_custodio(data):
         # Validar duplicados de cédula si es necesario (aunque el modelo ya tiene unique=True)
@@ -297,6 +453,11 @@ class CustodioService:
             raise ValidationError("El custodio no existe")
         return CustodioRepository.update(custodio, data)
 
+    @staticmethod
+    def recalcular_bienes_activos():
+        """Repara los contadores bienes_activos (ej. tras cargas con SQL directo)"""
+        return CustodioRepository.recalcular_bienes_activos()
+
     @staticmethod
     def eliminar_custodio(custodio_id):
         # Aquí podrías validar si tiene siniestros asociados antes de borrar
@@ -322,6 +483,10 @@ class BienService:
 
         return BienRepository.get_by_custodio(custodio_id).select_related("custodio")
 
+    @staticmethod
+    def buscar_bienes(termino, custodio_id=None):
+        return BienRepository.buscar(termino, custodio_id)
+
     @staticmethod
     def obtener_detalle_bien(bien_id):
         bien = BienRepository.get_by_id(bien_id)
@@ -330,10 +495,425 @@ class BienService:
         return bien
 
 
+class ImportacionInventarioService:
+    """
+    Carga masiva de custodios y bienes desde la hoja del Acta de Entrega.
+
+    Cada fila trae la cédula del custodio y, opcionalmente, sus datos y los
+    de un bien. El archivo se lee en streaming y se procesa por lotes: por
+    cada lote hay un upsert de custodios, una lectura (con bloqueo) de sus
+    contadores bienes_activos para validar el tope de 5 en memoria, un
+    upsert de bienes y el ajuste de los contadores.
+    Las filas inválidas se reportan sin detener la carga.
+    """
+
+    TAMANO_LOTE = 1000
+
+    # Encabezado normalizado -> campo del modelo
+    COLUMNAS_CUSTODIO = {
+        "cedula": "identificacion",
+        "identificacion": "identificacion",
+        "custodio": "nombre_completo",
+        "nombre": "nombre_completo",
+        "nombre_completo": "nombre_completo",
+        "correo": "correo",
+        "email": "correo",
+        "departamento": "departamento",
+        "carrera": "departamento",
+        "ciudad": "ciudad",
+        "edificio": "edificio",
+        "puesto": "puesto",
+    }
+    COLUMNAS_BIEN = {
+        "codigo": "codigo",
+        "baan_v": "baan_v",
+        "detalle": "detalle",
+        "descripcion": "detalle",
+        "serie": "serie",
+        "modelo": "modelo",
+        "marca": "marca",
+        "ubicacion": "ubicacion",
+        "estado": "estado_fisico",
+        "estado_fisico": "estado_fisico",
+        "estado_operativo": "estado_operativo",
+    }
+
+    @staticmethod
+    def importar(archivo, nombre, tamano_lote=None):
+        servicio = ImportacionInventarioService
+        resultado = procesar_por_lotes(
+            leer_filas(archivo, nombre),
+            tamano_lote or servicio.TAMANO_LOTE,
+            servicio._procesar_lote,
+            ResultadoImportacion(),
+        )
+        if resultado.guardados["custodios"]:
+            # bulk_create no dispara las señales que mantienen el índice
+            def refrescar_indice():
+                indice_custodios.registrar_cambio()
+                indice_custodios.invalidar()
+
+            transaction.on_commit(refrescar_indice)
+        return resultado
+
+    @staticmethod
+    def _procesar_lote(lote, resultado):
+        servicio = ImportacionInventarioService
+        custodios = {}  # cédula -> ResponsableCustodio (gana la última fila)
+        bienes = []  # (fila, cédula, Bien)
+        for fila, datos in lote:
+            try:
+                cedula, custodio, bien = servicio._leer_fila(datos)
+            except ValidationError as e:
+                resultado.error(fila, "; ".join(e.messages))
+                continue
+            if custodio:
+                custodios[cedula] = custodio
+            if bien:
+                bienes.append((fila, cedula, bien))
+
+        if custodios:
+            CustodioRepository.upsert_lote(list(custodios.values()))
+            resultado.guardados["custodios"] += len(custodios)
+        if not bienes:
+            return
+
+        # Contadores bienes_activos de los custodios del lote, bloqueados:
+        # el tope se valida en memoria sin contar filas de Bien
+        cupos = CustodioRepository.get_cupos({cedula for _, cedula, _ in bienes})
+        conteo = Counter({pk: activos for pk, activos in cupos.values()})
+        asignados = BienRepository.get_custodios_activos(
+            {bien.codigo for _, _, bien in bienes}
+        )
+
+        deltas = Counter()
+        validos = {}
+        for fila, cedula, bien in bienes:
+            if cedula not in cupos:
+                resultado.error(fila, f"No existe un custodio con cédula {cedula}")
+                continue
+            custodio_id = cupos[cedula][0]
+            # Custodio que ocupa cupo con este bien antes y después de la fila
+            antes = asignados.get(bien.codigo)
+            despues = custodio_id if bien.estado_operativo == "ACTIVO" else None
+            if antes != despues:
+                if despues is not None:
+                    if conteo[despues] >= Bien.MAX_POR_CUSTODIO:
+                        resultado.error(
+                            fila,
+                            f"El custodio {cedula} ya tiene el máximo permitido de "
+                            f"{Bien.MAX_POR_CUSTODIO} bienes asignados",
+                        )
+                        continue
+                    conteo[despues] += 1
+                    deltas[despues] += 1
+                    asignados[bien.codigo] = despues
+                else:
+                    asignados.pop(bien.codigo)
+                if antes is not None:
+                    conteo[antes] -= 1
+                    deltas[antes] -= 1
+            bien.custodio_id = custodio_id
+            validos[bien.codigo] = bien
+
+        if validos:
+            BienRepository.upsert_lote(list(validos.values()))
+            CustodioRepository.ajustar_bienes_activos(deltas)
+            resultado.guardados["bienes"] += len(validos)
+
+    @staticmethod
+    def _leer_fila(datos):
+        servicio = ImportacionInventarioService
+        campos_custodio = servicio._mapear(
+            datos, servicio.COLUMNAS_CUSTODIO, ResponsableCustodio
+        )
+        campos_bien = servicio._mapear(datos, servicio.COLUMNAS_BIEN, Bien)
+
+        cedula = campos_custodio.get("identificacion")
+        if not cedula:
+            raise ValidationError("Falta la cédula del custodio")
+
+        custodio = None
+        if len(campos_custodio) > 1:
+            if not campos_custodio.get("nombre_completo"):
+                raise ValidationError("Falta el nombre del custodio")
+            validate_email(campos_custodio.get("correo"))
+            custodio = ResponsableCustodio(**campos_custodio)
+
+        bien = None
+        if campos_bien:
+            if not campos_bien.get("codigo"):
+                raise ValidationError("Falta el código del bien")
+            if not campos_bien.get("detalle"):
+                raise ValidationError("Falta el detalle del bien")
+            # "Bueno" -> "B", como se marca en el acta
+            estado = campos_bien.get("estado_fisico", "B")[:1].upper()
+            if estado not in dict(Bien.ESTADO_BIEN_CHOICES):
+                raise ValidationError(f"Estado físico inválido: {estado}")
+            campos_bien["estado_fisico"] = estado
+            operativo = campos_bien.get("estado_operativo", "ACTIVO").upper()
+            if operativo not in dict(Bien.ESTADO_OPERATIVO_CHOICES):
+                raise ValidationError(f"Estado operativo inválido: {operativo}")
+            campos_bien["estado_operativo"] = operativo
+            bien = Bien(**campos_bien)
+        return cedula, custodio, bien
+
+    @staticmethod
+    def _mapear(datos, columnas, modelo):
+        campos = {}
+        for columna, valor in datos.items():
+            campo = columnas.get(columna)
+            if campo is None:
+                continue
+            campo_modelo = modelo._meta.get_field(campo)
+            largo = campo_modelo.max_length
+            # Los campos con opciones se normalizan después ("Bueno" -> "B")
+            if largo and not campo_modelo.choices and len(valor) > largo:
+                raise ValidationError(
+                    f"'{columna}' supera los {largo} caracteres permitidos"
+                )
+            campos[campo] = valor
+        return campos
+
+
+class ImportacionPolizasService:
+    """
+    Carga masiva de pólizas o facturas desde los cronogramas que envían las
+    aseguradoras. Aseguradoras y brokers se resuelven contra un mapa en
+    memoria (se leen una sola vez), las facturas se calculan por lote con
+    facturacion.py y cada lote se inserta con bulk_create en su propia
+    transacción. Con `simular=True` todo corre dentro de una transacción
+    que se revierte al final: se validan las filas sin guardar nada.
+    """
+
+    TAMANO_LOTE = 500
+    TIPOS = ("polizas", "facturas")
+
+    COLUMNAS_POLIZA = {
+        "numero_poliza": "numero_poliza",
+        "poliza": "numero_poliza",
+        "aseguradora": "aseguradora",
+        "ruc_aseguradora": "aseguradora",
+        "broker": "broker",
+        "vigencia_inicio": "vigencia_inicio",
+        "vigencia_fin": "vigencia_fin",
+        "monto_asegurado": "monto_asegurado",
+        "ramo": "ramo",
+        "objeto_asegurado": "objeto_asegurado",
+        "prima_base": "prima_base",
+        "prima_total": "prima_total",
+        "fecha_emision": "fecha_emision",
+        "renovable": "renovable",
+    }
+    COLUMNAS_FACTURA = {
+        "numero_factura": "numero_factura",
+        "factura": "numero_factura",
+        "numero_poliza": "poliza",
+        "poliza": "poliza",
+        "documento_contable": "documento_contable",
+        "fecha_emision": "fecha_emision",
+        "fecha_pago": "fecha_pago",
+        "prima": "prima",
+        "retenciones": "retenciones",
+        "pagado": "pagado",
+    }
+    OBLIGATORIOS_POLIZA = (
+        "numero_poliza",
+        "aseguradora",
+        "broker",
+        "vigencia_inicio",
+        "vigencia_fin",
+        "monto_asegurado",
+        "ramo",
+        "objeto_asegurado",
+        "prima_base",
+        "prima_total",
+        "fecha_emision",
+    )
+    OBLIGATORIOS_FACTURA = ("numero_factura", "poliza", "fecha_emision", "prima")
+
+    @staticmethod
+    def importar(archivo, nombre, tipo, usuario=None, simular=False, tamano_lote=None):
+        servicio = ImportacionPolizasService
+        if tipo not in servicio.TIPOS:
+            raise ValidationError(f"Tipo de importación inválido: {tipo}")
+
+        if tipo == "polizas":
+            procesar = servicio._procesador_polizas(usuario)
+        else:
+            procesar = servicio._procesar_facturas
+
+        with transaction.atomic() if simular else nullcontext():
+            resultado = procesar_por_lotes(
+                leer_filas(archivo, nombre),
+                tamano_lote or servicio.TAMANO_LOTE,
+                procesar,
+                ResultadoImportacion(),
+            )
+            if simular:
+                transaction.set_rollback(True)
+
+        if not simular and sum(resultado.guardados.values()):
+            # bulk_create no dispara las señales que invalidan el dashboard
+            transaction.on_commit(DashboardStatsService.invalidar)
+        return resultado
+
+    # ---------------- Pólizas ----------------
+
+    @staticmethod
+    def _procesador_polizas(usuario):
+        servicio = ImportacionPolizasService
+        aseguradoras, brokers = servicio._mapas_catalogo()
+        vistos = set()  # números ya leídos en este archivo
+
+        def procesar(lote, resultado):
+            polizas = {}
+            for fila, datos in lote:
+                try:
+                    campos = servicio._leer_poliza(datos, aseguradoras, brokers)
+                except ValidationError as e:
+                    resultado.error(fila, "; ".join(e.messages))
+                    continue
+                numero = campos["numero_poliza"]
+                if numero in vistos:
+                    resultado.error(fila, f"Póliza {numero} repetida en el archivo")
+                    continue
+                vistos.add(numero)
+                polizas[numero] = (fila, Poliza(usuario_gestor=usuario, **campos))
+
+            existentes = PolizaRepository.get_ids_por_numero(polizas.keys())
+            for numero in existentes:
+                fila, _ = polizas.pop(numero)
+                resultado.error(fila, f"La póliza {numero} ya existe")
+
+            if polizas:
+                PolizaRepository.crear_lote([p for _, p in polizas.values()])
+                resultado.guardados["polizas"] += len(polizas)
+
+        return procesar
+
+    @staticmethod
+    def _mapas_catalogo():
+        """Aseguradora por RUC o nombre y broker por código o nombre"""
+        aseguradoras, brokers = {}, {}
+        for pk, ruc, nombre in AseguradoraRepository.get_claves():
+            aseguradoras[normalizar(nombre)] = pk
+            aseguradoras[ruc] = pk
+        for pk, codigo, nombre in BrokerRepository.get_claves():
+            brokers[normalizar(nombre)] = pk
+            if codigo:
+                brokers[codigo] = pk
+        return aseguradoras, brokers
+
+    @staticmethod
+    def _leer_poliza(datos, aseguradoras, brokers):
+        servicio = ImportacionPolizasService
+        campos = servicio._mapear(
+            datos, servicio.COLUMNAS_POLIZA, servicio.OBLIGATORIOS_POLIZA, Poliza
+        )
+
+        aseguradora = campos.pop("aseguradora")
+        campos["aseguradora_id"] = aseguradoras.get(aseguradora) or aseguradoras.get(
+            normalizar(aseguradora)
+        )
+        if campos["aseguradora_id"] is None:
+            raise ValidationError(f"Aseguradora desconocida: {aseguradora}")
+        broker = campos.pop("broker")
+        campos["broker_id"] = brokers.get(broker) or brokers.get(normalizar(broker))
+        if campos["broker_id"] is None:
+            raise ValidationError(f"Broker desconocido: {broker}")
+
+        for campo in ("vigencia_inicio", "vigencia_fin", "fecha_emision"):
+            campos[campo] = a_fecha(campos[campo], campo)
+        for campo in ("monto_asegurado", "prima_base", "prima_total"):
+            campos[campo] = a_decimal(campos[campo], campo)
+        campos["renovable"] = a_booleano(campos.get("renovable"))
+
+        # Mismas reglas que el alta individual
+        if campos["vigencia_fin"] <= campos["vigencia_inicio"]:
+            raise ValidationError("La vigencia final debe ser posterior a la inicial")
+        if campos["prima_total"] < campos["prima_base"]:
+            raise ValidationError("La prima total no puede ser menor a la prima base")
+        return campos
+
+    # ---------------- Facturas ----------------
+
+    @staticmethod
+    def _procesar_facturas(lote, resultado):
+        servicio = ImportacionPolizasService
+        facturas = {}
+        for fila, datos in lote:
+            try:
+                campos = servicio._leer_factura(datos)
+            except ValidationError as e:
+                resultado.error(fila, "; ".join(e.messages))
+                continue
+            numero = campos["numero_factura"]
+            if numero in facturas:
+                resultado.error(fila, f"Factura {numero} repetida en el archivo")
+                continue
+            facturas[numero] = (fila, campos)
+
+        polizas = PolizaRepository.get_ids_por_numero(
+            {campos["poliza"] for _, campos in facturas.values()}
+        )
+        existentes = FacturaRepository.get_numeros_existentes(facturas.keys())
+
+        nuevas = []
+        for numero, (fila, campos) in facturas.items():
+            if numero in existentes:
+                resultado.error(fila, f"La factura {numero} ya existe")
+                continue
+            poliza = campos.pop("poliza")
+            if poliza not in polizas:
+                resultado.error(fila, f"No existe la póliza {poliza}")
+                continue
+            nuevas.append(Factura(poliza_id=polizas[poliza], **campos))
+
+        if nuevas:
+            # Totales, IVA y descuentos se calculan de una pasada para el lote
+            FacturaRepository.crear_lote(nuevas)
+            resultado.guardados["facturas"] += len(nuevas)
+
+    @staticmethod
+    def _leer_factura(datos):
+        servicio = ImportacionPolizasService
+        campos = servicio._mapear(
+            datos, servicio.COLUMNAS_FACTURA, servicio.OBLIGATORIOS_FACTURA, Factura
+        )
+        campos["fecha_emision"] = a_fecha(campos["fecha_emision"], "fecha_emision")
+        campos["fecha_pago"] = a_fecha(campos.get("fecha_pago"), "fecha_pago")
+        campos["prima"] = a_decimal(campos["prima"], "prima")
+        campos["retenciones"] = a_decimal(
+            campos.get("retenciones"), "retenciones"
+        ) or Decimal("0")
+        campos["pagado"] = a_booleano(campos.get("pagado"))
+        return campos
+
+    @staticmethod
+    def _mapear(datos, columnas, obligatorios, modelo):
+        campos = {}
+        for columna, valor in datos.items():
+            campo = columnas.get(columna)
+            if campo is None:
+                continue
+            largo = getattr(modelo._meta.get_field(campo), "max_length", None)
+            if largo and len(valor) > largo:
+                raise ValidationError(
+                    f"'{columna}' supera los {largo} caracteres permitidos"
+                )
+            campos[campo] = valor
+        faltan = [campo for campo in obligatorios if campo not in campos]
+        if faltan:
+            raise ValidationError(f"Faltan columnas: {', '.join(faltan)}")
+        return campos
+
+
 class FiniquitoService:
     """Lógica de negocio para Liquidación de Siniestros"""
 
     @staticmethod
+    @contar_operacion("liquidar_siniestro")
     def liquidar_siniestro(siniestro_id, data, archivo_firmado, usuario):
         """
         Procesa la liquidación: Cálculos, creación de registro y cambio de estado.
@@ -400,18 +980,780 @@ class NotificacionService:
         }
         return NotificacionRepository.crear(data)
 
+    @staticmethod
+    def encolar_notificacion(usuario, tipo, mensaje, id_ref=None):
+        """Igual que crear_notificacion, pero la escribe un trabajador en segundo plano"""
+        return encolar(
+            "notificacion.crear",
+            usuario_id=usuario.pk,
+            tipo=tipo,
+            mensaje=mensaje,
+            id_ref=id_ref,
+        )
+
+    @staticmethod
+    def crear_notificaciones_masivas(alertas, tamano_lote=None):
+        """
+        Crea muchas alertas de una vez. `alertas` es un iterable de tuplas
+        (usuario o id de usuario, tipo, mensaje, id_referencia) con una
+        clave de deduplicación opcional como quinto elemento.
+        """
+        tipos_validos = {tipo for tipo, _ in Notificacion.TIPO_ALERTA_CHOICES}
+        destinatarios = set()
+
+        def construir():
+            for usuario, tipo, mensaje, id_ref, *clave in alertas:
+                if tipo not in tipos_validos:
+                    raise ValidationError(f"Tipo de alerta inválido: {tipo}")
+                usuario_id = getattr(usuario, "pk", usuario)
+                destinatarios.add(usuario_id)
+                yield Notificacion(
+                    usuario_id=usuario_id,
+                    tipo_alerta=tipo,
+                    mensaje=mensaje,
+                    id_referencia=id_ref,
+                    estado="PENDIENTE",
+                    clave_deduplicacion=clave[0] if clave else None,
+                )
+
+        total = NotificacionRepository.crear_lote(
+            construir(), tamano_lote or NotificacionRepository.TAMANO_LOTE
+        )
+        NotificacionService.invalidar_contadores(destinatarios)
+        return total
+
+    @staticmethod
+    def notificar_rol(rol, tipo, mensaje, id_ref=None, tamano_lote=None):
+        """Envía la misma alerta a todos los usuarios activos de un rol"""
+        return NotificacionService.crear_notificaciones_masivas(
+            (
+                (usuario_id, tipo, mensaje, id_ref)
+                for usuario_id in UsuarioRepository.get_ids_por_rol(rol)
+            ),
+            tamano_lote,
+        )
+
+    @staticmethod
+    def encolar_notificacion_rol(rol, tipo, mensaje, id_ref=None):
+        """notificar_rol en segundo plano, para difusiones grandes"""
+        return encolar(
+            "notificacion.notificar_rol",
+            rol=rol,
+            tipo=tipo,
+            mensaje=mensaje,
+            id_ref=id_ref,
+        )
+
+    @staticmethod
+    def archivar_antiguas(dias=None, tamano_lote=None, fecha_referencia=None):
+        """
+        Política de retención: las alertas leídas con más de `dias` días
+        (NOTIFICACIONES_RETENCION_DIAS por defecto) pasan al archivo
+        comprimido, lote por lote, para no bloquear la tabla viva.
+        """
+        if dias is None:
+            dias = getattr(settings, "NOTIFICACIONES_RETENCION_DIAS", 180)
+        fecha_limite = (fecha_referencia or timezone.now()) - timedelta(days=dias)
+        total = 0
+        while archivadas := NotificacionRepository.archivar_lote(
+            fecha_limite, tamano_lote or NotificacionRepository.TAMANO_LOTE
+        ):
+            total += archivadas
+        return total
+
     @staticmethod
     def listar_mis_notificaciones(usuario):
         return NotificacionRepository.get_by_usuario(usuario)
 
+    @staticmethod
+    def listar_mis_notificaciones_paginado(usuario, cursor=None):
+        return NotificacionRepository.get_pagina_por_usuario(usuario, cursor)
+
+    CLAVE_CONTADOR = "notificaciones:no_leidas:{}"
+
     @staticmethod
     def contar_no_leidas(usuario):
-        return NotificacionRepository.get_pendientes_count(usuario)
+        """Badge de no leídas: caché y, si no está, el contador del usuario"""
+        clave = NotificacionService.CLAVE_CONTADOR.format(usuario.pk)
+        total = cache.get(clave)
+        if total is None:
+            total = NotificacionRepository.get_no_leidas(usuario.pk)
+            cache.set(clave, total, getattr(settings, "NOTIFICACIONES_BADGE_TTL", 300))
+        return total
+
+    @staticmethod
+    def invalidar_contadores(usuario_ids):
+        claves = [NotificacionService.CLAVE_CONTADOR.format(pk) for pk in usuario_ids]
+        if claves:
+            # Tras el commit, para que nadie vuelva a cachear el valor viejo
+            transaction.on_commit(lambda: cache.delete_many(claves))
 
     @staticmethod
     def leer_notificacion(notificacion_id, usuario):
-        # Verificamos que la notificación exista y pertenezca al usuario
-        noti = NotificacionRepository.get_by_id(notificacion_id)
-        if noti and noti.usuario.id == usuario.id:
-            return NotificacionRepository.marcar_como_leida(noti)
-        return None
+        """True si la alerta era del usuario y estaba pendiente"""
+        return NotificacionService.marcar_leidas(usuario, [notificacion_id]) == 1
+
+    @staticmethod
+    def marcar_leidas(usuario, ids=None):
+        """Marca como leídas las seleccionadas (`ids`) o todas si ids es None"""
+        marcadas = NotificacionRepository.marcar_leidas(usuario.pk, ids)
+        if marcadas:
+            NotificacionService.invalidar_contadores([usuario.pk])
+        return marcadas
+
+
+class VencimientoPolizaService:
+    """
+    Escáner de pólizas por vencer. Se puede correr las veces que haga falta
+    (cron diario, reintentos): cada alerta lleva una clave de deduplicación
+    por póliza, fecha de fin y umbral, así que nunca se crea dos veces.
+    """
+
+    # De mayor a menor: una póliza cae en el umbral más pequeño que la cubre
+    UMBRALES = (30, 15, 7)
+
+    @staticmethod
+    def umbral_para(dias_restantes):
+        umbral = None
+        for dias in VencimientoPolizaService.UMBRALES:
+            if dias_restantes <= dias:
+                umbral = dias
+        return umbral
+
+    @staticmethod
+    def escanear(hoy=None, tamano_lote=1000):
+        """Devuelve cuántas alertas nuevas se crearon"""
+        hoy = hoy or date.today()
+        hasta = hoy + timedelta(days=max(VencimientoPolizaService.UMBRALES))
+        polizas = PolizaRepository.get_por_vencer(hoy, hasta)
+
+        creadas = 0
+        while lote := list(islice(polizas, tamano_lote)):
+            candidatas = {}
+            for poliza_id, numero, vigencia_fin, gestor_id in lote:
+                if gestor_id is None:
+                    continue  # Sin gestor no hay a quién avisar
+                dias = (vigencia_fin - hoy).days
+                umbral = VencimientoPolizaService.umbral_para(dias)
+                clave = f"venc:{poliza_id}:{vigencia_fin.isoformat()}:{umbral}"
+                candidatas[clave] = (
+                    gestor_id,
+                    "VENCIMIENTO_POLIZA",
+                    f"La póliza {numero} vence el {vigencia_fin:%d/%m/%Y} "
+                    f"(en {dias} días).",
+                    str(poliza_id),
+                    clave,
+                )
+            # Una consulta por lote descarta lo que ya se avisó antes
+            for clave in NotificacionRepository.get_claves_existentes(candidatas):
+                del candidatas[clave]
+            creadas += NotificacionService.crear_notificaciones_masivas(
+                candidatas.values(), tamano_lote
+            )
+        return creadas
+
+
+class TareaService:
+    """Consulta del estado de las tareas en segundo plano"""
+
+    @staticmethod
+    def consultar_estado(tarea_id, usuario):
+        """Estado de la tarea si `usuario` la pidió o es administrador"""
+        tarea_obj = TareaRepository.get_by_id(tarea_id)
+        # Una tarea ajena responde igual que una inexistente
+        if not tarea_obj or not (
+            usuario.rol == Usuario.ADMINISTRADOR or tarea_obj.usuario_id == usuario.pk
+        ):
+            raise ValidationError("La tarea no existe")
+        return {
+            "id": tarea_obj.id,
+            "tipo": tarea_obj.tipo,
+            "estado": tarea_obj.estado,
+            "intentos": tarea_obj.intentos,
+            "resultado": tarea_obj.resultado,
+            "error": (tarea_obj.ultimo_error or "").strip().splitlines()[-1:],
+        }
+
+
+# ---------------------------------------------
+# TAREAS EN SEGUNDO PLANO (ver tareas.py)
+# ---------------------------------------------
+
+
+@tarea("notificacion.crear")
+def crear_notificacion_en_segundo_plano(usuario_id, tipo, mensaje, id_ref=None):
+    notificacion = NotificacionRepository.crear(
+        {
+            "usuario_id": usuario_id,
+            "tipo_alerta": tipo,
+            "mensaje": mensaje,
+            "id_referencia": id_ref,
+            "estado": "PENDIENTE",
+        }
+    )
+    return {"notificacion_id": notificacion.id}
+
+
+@tarea("notificacion.notificar_rol")
+def notificar_rol_en_segundo_plano(rol, tipo, mensaje, id_ref=None):
+    return {"creadas": NotificacionService.notificar_rol(rol, tipo, mensaje, id_ref)}
+
+
+@tarea("factura.regenerar_pdf")
+def regenerar_pdf_factura(factura_id):
+    FacturaPDFService.invalidar(factura_id)
+    factura = FacturaRepository.get_by_id(factura_id)
+    if factura is None:
+        return None  # Se eliminó mientras la tarea esperaba
+    if FacturaPDFService.obtener_pdf(factura) is None:
+        raise RuntimeError(f"xhtml2pdf no pudo generar la factura {factura_id}")
+    return {"ruta": FacturaPDFService.ruta(factura)}
+
+
+@tarea("factura.borrar_pdf")
+def borrar_pdf_factura_en_segundo_plano(factura_id):
+    FacturaPDFService.invalidar(factura_id)
+
+
+@tarea("storage.borrar")
+def borrar_archivo_storage(nombre):
+    default_storage.delete(nombre)
+
+
+class DashboardStatsService:
+    """
+    Indicadores de los dashboards (admin y analista).
+    Se calculan en una sola consulta y se guardan en caché por un TTL corto;
+    cualquier alta, cambio o baja de los modelos contados invalida la caché.
+    """
+
+    CLAVE_CACHE = "dashboard:indicadores"
+
+    @staticmethod
+    def obtener():
+        stats = cache.get(DashboardStatsService.CLAVE_CACHE)
+        if stats is None:
+            stats = DashboardStatsService.calcular()
+            cache.set(
+                DashboardStatsService.CLAVE_CACHE,
+                stats,
+                getattr(settings, "DASHBOARD_STATS_TTL", 60),
+            )
+        return stats
+
+    @staticmethod
+    def calcular():
+        stats = PolizaRepository.get_indicadores(date.today())
+        stats["ultimos_siniestros"] = list(SiniestroRepository.get_all()[:5])
+        return stats
+
+    @staticmethod
+    def invalidar():
+        cache.delete(DashboardStatsService.CLAVE_CACHE)
+
+
+@receiver(post_save, sender=Poliza)
+@receiver(post_delete, sender=Poliza)
+@receiver(post_save, sender=Siniestro)
+@receiver(post_delete, sender=Siniestro)
+@receiver(post_save, sender=Factura)
+@receiver(post_delete, sender=Factura)
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def invalidar_indicadores_dashboard(sender, update_fields=None, **kwargs):
+    # El login solo actualiza last_login: no cambia ningún indicador
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+    # Tras el commit: si se borra antes, otra petición puede volver a
+    # cachear los datos viejos mientras la transacción sigue abierta
+    transaction.on_commit(DashboardStatsService.invalidar)
+
+
+class ExportacionService:
+    """
+    Exportaciones CSV (opcionalmente gzip) que se envían en streaming.
+    Cada tipo define sus columnas como (campo de values_list, encabezado).
+    """
+
+    COLUMNAS = {
+        "polizas": (
+            ("numero_poliza", "Número de póliza"),
+            ("aseguradora__nombre", "Aseguradora"),
+            ("broker__nombre", "Broker"),
+            ("ramo", "Ramo"),
+            ("objeto_asegurado", "Objeto asegurado"),
+            ("vigencia_inicio", "Vigencia inicio"),
+            ("vigencia_fin", "Vigencia fin"),
+            ("monto_asegurado", "Monto asegurado"),
+            ("prima_base", "Prima base"),
+            ("prima_total", "Prima total"),
+            ("estado", "Activa"),
+            ("renovable", "Renovable"),
+            ("fecha_emision", "Fecha de emisión"),
+            ("usuario_gestor__username", "Gestor"),
+        ),
+        "siniestros": (
+            ("numero_reclamo", "Número de reclamo"),
+            ("poliza__numero_poliza", "Póliza"),
+            ("fecha_siniestro", "Fecha del siniestro"),
+            ("fecha_notificacion", "Fecha de notificación"),
+            ("tipo_siniestro", "Tipo"),
+            ("estado_tramite", "Estado"),
+            ("valor_reclamo_estimado", "Valor estimado"),
+            ("custodio__identificacion", "Cédula custodio"),
+            ("custodio__nombre_completo", "Custodio"),
+            ("bien__codigo", "Código del bien"),
+            ("bien__detalle", "Bien"),
+            ("finiquito__fecha_finiquito", "Fecha de finiquito"),
+            ("finiquito__valor_total_reclamo", "Valor total reclamo"),
+            ("finiquito__valor_deducible", "Deducible"),
+            ("finiquito__valor_depreciacion", "Depreciación"),
+            ("finiquito__valor_final_pago", "Valor pagado"),
+            ("finiquito__pagado_a_usuario", "Pagado al usuario"),
+        ),
+        "facturas": (
+            ("numero_factura", "Número de factura"),
+            ("poliza__numero_poliza", "Póliza"),
+            ("documento_contable", "Documento contable"),
+            ("fecha_emision", "Fecha de emisión"),
+            ("fecha_pago", "Fecha de pago"),
+            ("prima", "Prima"),
+            ("contribucion_super", "Contribución Superintendencia"),
+            ("seguro_campesino", "Seguro Campesino"),
+            ("derechos_emision", "Derechos de emisión"),
+            ("base_imponible", "Base imponible"),
+            ("iva", "IVA"),
+            ("total_facturado", "Total facturado"),
+            ("retenciones", "Retenciones"),
+            ("descuento_pronto_pago", "Descuento pronto pago"),
+            ("valor_a_pagar", "Valor a pagar"),
+            ("mensaje_resultado", "Estado"),
+        ),
+    }
+    CONSULTAS = {
+        "polizas": PolizaRepository.get_para_exportar,
+        "siniestros": SiniestroRepository.get_para_exportar,
+        "facturas": FacturaRepository.get_para_exportar,
+    }
+
+    @staticmethod
+    def exportar(tipo, comprimir=False):
+        """Devuelve (nombre de archivo, generador de bytes)"""
+        columnas = ExportacionService.COLUMNAS.get(tipo)
+        if columnas is None:
+            raise ValidationError(f"Exportación no disponible: {tipo}")
+
+        campos = [campo for campo, _ in columnas]
+        filas = ExportacionService.CONSULTAS[tipo](campos, TAMANO_CURSOR)
+        contenido = lineas_csv([encabezado for _, encabezado in columnas], filas)
+        nombre = f"{tipo}_{date.today():%Y%m%d}.csv"
+        if comprimir:
+            return f"{nombre}.gz", comprimir_gzip(contenido)
+        return nombre, contenido
+
+
+class CarteraSinteticaService:
+    """
+    Genera una cartera de prueba (apppolizas.semillas) por bloques de
+    pólizas y deja al día lo que las señales no ven con bulk_create:
+    estadísticas por póliza, contadores de bienes y de alertas, índice de
+    custodios y caché del dashboard.
+    """
+
+    TAMANO_BLOQUE = 1000
+    MODELOS = (
+        Aseguradora,
+        Broker,
+        ResponsableCustodio,
+        Bien,
+        Poliza,
+        Siniestro,
+        Finiquito,
+        Factura,
+        Notificacion,
+    )
+
+    @staticmethod
+    def generar(polizas, semilla=42, usuarios=(), tamano_bloque=None, hilos=1):
+        """
+        Crea `polizas` pólizas (con todo lo que cuelga de ellas) y devuelve
+        Counter {modelo: filas creadas}. Las alertas y la gestión se reparten
+        entre `usuarios`. Con hilos > 1 los bloques se insertan en paralelo,
+        cada uno en su conexión y su transacción; el resultado es el mismo
+        que en serie porque cada bloque tiene su propio rango de ids y su
+        propio generador aleatorio.
+        """
+        tamano_bloque = tamano_bloque or CarteraSinteticaService.TAMANO_BLOQUE
+        if not CarteraSinteticaRepository.admite_escritura_paralela():
+            hilos = 1
+        ids = CarteraSinteticaRepository.siguientes_ids(CarteraSinteticaService.MODELOS)
+        usuario_ids = [u.pk for u in usuarios]
+        # La semilla se combina con el punto de partida: dos cargas seguidas
+        # no repiten los mismos valores, y la misma carga sí es reproducible
+        inicio = ids[Poliza]
+
+        creadas = Counter()
+        catalogos = semillas.catalogos(semillas.nuevo_azar(semilla, inicio), ids)
+        creadas.update(CarteraSinteticaRepository.insertar(catalogos))
+        aseguradora_ids = [a.id for a in catalogos[Aseguradora]]
+        broker_ids = [b.id for b in catalogos[Broker]]
+
+        capacidad = semillas.capacidad_bloque(tamano_bloque)
+
+        def armar(numero):
+            cantidad = min(tamano_bloque, polizas - numero * tamano_bloque)
+            ids_bloque = {
+                modelo: ids[modelo] + numero * capacidad.get(modelo, 0)
+                for modelo in ids
+            }
+            return semillas.bloque(
+                cantidad,
+                semillas.nuevo_azar(semilla, inicio, numero),
+                ids_bloque,
+                aseguradora_ids,
+                broker_ids,
+                usuario_ids,
+            )
+
+        bloques = (armar(n) for n in range(-(-polizas // tamano_bloque)))
+        if hilos == 1:
+            for filas in bloques:
+                creadas.update(CarteraSinteticaRepository.insertar(filas))
+        else:
+            with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+                # Como mucho 2 bloques en espera por hilo: la memoria no
+                # crece con el tamaño de la cartera
+                en_curso = set()
+                for filas in bloques:
+                    if len(en_curso) >= 2 * hilos:
+                        listos, en_curso = wait(en_curso, return_when=FIRST_COMPLETED)
+                        for futuro in listos:
+                            creadas.update(futuro.result())
+                    en_curso.add(
+                        ejecutor.submit(
+                            CarteraSinteticaRepository.insertar_en_hilo, filas
+                        )
+                    )
+                for futuro in en_curso:
+                    creadas.update(futuro.result())
+
+        CarteraSinteticaService.actualizar_derivados(usuario_ids)
+        return creadas
+
+    @staticmethod
+    def actualizar_derivados(usuario_ids=()):
+        EstadisticaPolizaService.reconstruir()
+        CustodioService.recalcular_bienes_activos()
+        NotificacionRepository.recalcular_no_leidas(usuario_ids)
+        NotificacionService.invalidar_contadores(usuario_ids)
+        indice_custodios.invalidar()
+        DashboardStatsService.invalidar()
+
+
+class ReporteService:
+    """
+    Datos del reporte general PDF. Los totales por póliza y el ranking salen
+    de PolizaEstadistica y el conteo por estado de un GROUP BY: el reporte
+    hace siempre las mismas 4 consultas sin importar el volumen.
+    """
+
+    # El listado de siniestros del PDF muestra solo los más recientes; los
+    # totales sí cubren todos
+    MAX_SINIESTROS_LISTADO = 500
+
+    @staticmethod
+    def datos_reporte_general():
+        polizas = list(PolizaRepository.get_para_reporte())
+        siniestros = list(
+            SiniestroRepository.get_all()[: ReporteService.MAX_SINIESTROS_LISTADO]
+        )
+        conteo = {
+            fila["estado_tramite"]: fila["total"]
+            for fila in SiniestroRepository.get_conteo_por_estado()
+        }
+        total_siniestros = sum(conteo.values())
+        poliza_top = EstadisticaPolizaService.poliza_mas_siniestrada()
+
+        return {
+            "polizas": polizas,
+            "siniestros": siniestros,
+            "siniestros_omitidos": total_siniestros - len(siniestros),
+            "total_polizas": len(polizas),
+            "total_siniestros": total_siniestros,
+            "total_reclamado": sum(
+                (p.valor_reclamado or 0 for p in polizas), Decimal("0")
+            ),
+            "siniestros_por_estado": [
+                (etiqueta, conteo.get(estado, 0))
+                for estado, etiqueta in Siniestro.ESTADO_CHOICES
+            ],
+            "poliza_mas_siniestrada": (
+                poliza_top.poliza.numero_poliza if poliza_top else "Ninguna"
+            ),
+            "total_reclamos_top": poliza_top.total_siniestros if poliza_top else 0,
+        }
+
+
+class EstadisticaPolizaService:
+    """
+    Mantiene PolizaEstadistica al día con deltas atómicos: cada alta, cambio
+    o baja de un siniestro (o de su finiquito) resta su aporte anterior y
+    suma el nuevo, sin recontar los siniestros de la póliza.
+    """
+
+    CAMPOS_SINIESTRO = (
+        "poliza_id",
+        "estado_tramite",
+        "valor_reclamo_estimado",
+        "fecha_siniestro",
+    )
+    CAMPOS_FINIQUITO = ("siniestro_id", "valor_final_pago")
+
+    @staticmethod
+    def poliza_mas_siniestrada():
+        return PolizaEstadisticaRepository.get_mas_siniestrada()
+
+    @staticmethod
+    def reconstruir():
+        return PolizaEstadisticaRepository.reconstruir()
+
+    @staticmethod
+    def _aporte(valores, signo):
+        """Lo que un siniestro suma (signo=1) o resta (signo=-1) a su póliza"""
+        campo_estado = PolizaEstadistica.CAMPO_POR_ESTADO.get(valores["estado_tramite"])
+        aporte = {
+            "total_siniestros": signo,
+            "valor_reclamado": signo * Decimal(valores["valor_reclamo_estimado"] or 0),
+        }
+        if campo_estado:
+            aporte[campo_estado] = signo
+        return aporte
+
+    @staticmethod
+    def siniestro_guardado(siniestro, creado):
+        campos = EstadisticaPolizaService.CAMPOS_SINIESTRO
+        actual = {campo: getattr(siniestro, campo) for campo in campos}
+        anterior = None if creado else siniestro.valores_originales()
+
+        cambios = {actual["poliza_id"]: EstadisticaPolizaService._aporte(actual, 1)}
+        if anterior:
+            for campo, delta in EstadisticaPolizaService._aporte(anterior, -1).items():
+                por_poliza = cambios.setdefault(anterior["poliza_id"], {})
+                por_poliza[campo] = por_poliza.get(campo, 0) + delta
+            if anterior["poliza_id"] != actual["poliza_id"]:
+                # El pago del finiquito acompaña al siniestro a su nueva póliza
+                pago = PolizaEstadisticaRepository.get_pago_de_siniestro(siniestro.pk)
+                cambios[actual["poliza_id"]]["valor_pagado"] = pago
+                cambios[anterior["poliza_id"]]["valor_pagado"] = -pago
+
+        for poliza_id, delta in cambios.items():
+            PolizaEstadisticaRepository.aplicar_cambios(
+                poliza_id, delta, crear=poliza_id == actual["poliza_id"]
+            )
+
+        if anterior and (
+            anterior["poliza_id"] != actual["poliza_id"]
+            or anterior["fecha_siniestro"] != actual["fecha_siniestro"]
+        ):
+            # La fecha pudo retroceder: solo entonces hace falta el Max()
+            PolizaEstadisticaRepository.recalcular_fecha(actual["poliza_id"])
+            if anterior["poliza_id"] != actual["poliza_id"]:
+                PolizaEstadisticaRepository.recalcular_fecha(anterior["poliza_id"])
+        else:
+            PolizaEstadisticaRepository.registrar_fecha(
+                actual["poliza_id"], actual["fecha_siniestro"]
+            )
+        siniestro.recordar_valores_actuales(campos)
+
+    @staticmethod
+    def siniestro_eliminado(siniestro):
+        valores = siniestro.valores_originales() or {
+            campo: getattr(siniestro, campo)
+            for campo in EstadisticaPolizaService.CAMPOS_SINIESTRO
+        }
+        PolizaEstadisticaRepository.aplicar_cambios(
+            valores["poliza_id"], EstadisticaPolizaService._aporte(valores, -1)
+        )
+        PolizaEstadisticaRepository.recalcular_fecha(valores["poliza_id"])
+
+    @staticmethod
+    def finiquito_guardado(finiquito, creado):
+        anterior = None if creado else finiquito.valores_originales()
+        if anterior and anterior["siniestro_id"] != finiquito.siniestro_id:
+            PolizaEstadisticaRepository.aplicar_pago(
+                anterior["siniestro_id"], -anterior["valor_final_pago"]
+            )
+            anterior = None
+        delta = Decimal(finiquito.valor_final_pago or 0)
+        if anterior:
+            delta -= anterior["valor_final_pago"] or 0
+        PolizaEstadisticaRepository.aplicar_pago(finiquito.siniestro_id, delta)
+        finiquito.recordar_valores_actuales(EstadisticaPolizaService.CAMPOS_FINIQUITO)
+
+    @staticmethod
+    def finiquito_eliminado(finiquito):
+        valores = finiquito.valores_originales() or {
+            "siniestro_id": finiquito.siniestro_id,
+            "valor_final_pago": finiquito.valor_final_pago,
+        }
+        PolizaEstadisticaRepository.aplicar_pago(
+            valores["siniestro_id"], -(valores["valor_final_pago"] or 0)
+        )
+
+
+def _completar_valores_originales(instancia, campos):
+    """
+    Si la instancia no se leyó con todos los campos que necesitamos (ej. se
+    armó a mano con pk o se cargó con only()), los leemos antes de guardar.
+    """
+    if instancia._state.adding or instancia.pk is None:
+        return
+    originales = instancia.valores_originales() or {}
+    if all(campo in originales for campo in campos):
+        return
+    fila = (
+        type(instancia)._default_manager.filter(pk=instancia.pk).values(*campos).first()
+    )
+    if fila is not None:
+        instancia._valores_originales = {**originales, **fila}
+
+
+@receiver(pre_save, sender=Siniestro)
+def preparar_estadistica_siniestro(sender, instance, **kwargs):
+    _completar_valores_originales(instance, EstadisticaPolizaService.CAMPOS_SINIESTRO)
+
+
+@receiver(post_save, sender=Siniestro)
+def actualizar_estadistica_siniestro(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        EstadisticaPolizaService.siniestro_guardado(instance, created)
+
+
+@receiver(post_delete, sender=Siniestro)
+def descontar_estadistica_siniestro(sender, instance, **kwargs):
+    EstadisticaPolizaService.siniestro_eliminado(instance)
+
+
+@receiver(pre_save, sender=Finiquito)
+def preparar_estadistica_finiquito(sender, instance, **kwargs):
+    _completar_valores_originales(instance, EstadisticaPolizaService.CAMPOS_FINIQUITO)
+
+
+@receiver(post_save, sender=Finiquito)
+def actualizar_estadistica_finiquito(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        EstadisticaPolizaService.finiquito_guardado(instance, created)
+
+
+@receiver(post_delete, sender=Finiquito)
+def descontar_estadistica_finiquito(sender, instance, **kwargs):
+    EstadisticaPolizaService.finiquito_eliminado(instance)
+
+
+@receiver(post_save, sender=Factura)
+def invalidar_pdf_factura(sender, instance, created, raw=False, **kwargs):
+    campos = FacturaPDFService.CAMPOS_PDF + ("poliza_id",)
+    anterior = instance.valores_originales()
+    instance.recordar_valores_actuales(campos)
+    if created or raw:
+        return
+    # Sin valores originales (instancia armada a mano) asumimos que cambió
+    if anterior is None or any(
+        anterior.get(campo) != getattr(instance, campo) for campo in campos
+    ):
+        encolar("factura.regenerar_pdf", factura_id=instance.pk)
+
+
+@receiver(post_delete, sender=Factura)
+def borrar_pdf_factura(sender, instance, **kwargs):
+    encolar("factura.borrar_pdf", factura_id=instance.pk)
+
+
+@receiver(post_delete, sender=DocumentoSiniestro)
+@receiver(post_delete, sender=DocumentoPoliza)
+def eliminar_archivo_de_minio(sender, instance, **kwargs):
+    # El borrado en MinIO es una llamada de red: lo hace un trabajador
+    if instance.archivo:
+        encolar("storage.borrar", nombre=instance.archivo.name)
+
+
+@receiver(pre_save, sender=Notificacion)
+def preparar_contador_notificacion(sender, instance, **kwargs):
+    _completar_valores_originales(instance, ("usuario_id", "estado"))
+
+
+@receiver(post_save, sender=Notificacion)
+def actualizar_contador_notificacion(sender, instance, created, raw=False, **kwargs):
+    anterior = None if created else instance.valores_originales()
+    instance.recordar_valores_actuales(("usuario_id", "estado"))
+    if raw:
+        return
+    deltas = Counter()
+    if instance.estado == "PENDIENTE":
+        deltas[instance.usuario_id] += 1
+    if anterior and anterior.get("estado") == "PENDIENTE":
+        deltas[anterior["usuario_id"]] -= 1
+    NotificacionRepository.ajustar_no_leidas(deltas)
+    NotificacionService.invalidar_contadores([k for k, v in deltas.items() if v])
+
+
+@receiver(post_delete, sender=Notificacion)
+def descontar_contador_notificacion(sender, instance, **kwargs):
+    valores = instance.valores_originales() or {
+        "usuario_id": instance.usuario_id,
+        "estado": instance.estado,
+    }
+    if valores.get("estado") == "PENDIENTE":
+        NotificacionRepository.ajustar_no_leidas({valores["usuario_id"]: -1})
+        NotificacionService.invalidar_contadores([valores["usuario_id"]])
+
+
+# Bienes activos por custodio: el cupo se reserva con un UPDATE condicional
+CAMPOS_CUPO_BIEN = ("custodio_id", "estado_operativo")
+
+
+def _custodio_con_cupo(valores):
+    """Custodio cuyo cupo ocupa el bien, o None si no está ACTIVO"""
+    if valores and valores.get("estado_operativo") == "ACTIVO":
+        return valores.get("custodio_id")
+    return None
+
+
+@receiver(pre_save, sender=Bien)
+def reservar_cupo_custodio(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _completar_valores_originales(instance, CAMPOS_CUPO_BIEN)
+    antes = (
+        None
+        if instance._state.adding
+        else _custodio_con_cupo(instance.valores_originales())
+    )
+    despues = _custodio_con_cupo(
+        {campo: getattr(instance, campo) for campo in CAMPOS_CUPO_BIEN}
+    )
+    if antes == despues:
+        return
+    if despues is not None and not CustodioRepository.reservar_bien(despues):
+        raise ValidationError(
+            f"El custodio {instance.custodio.nombre_completo} ya tiene el máximo "
+            f"permitido de {Bien.MAX_POR_CUSTODIO} bienes asignados."
+        )
+    if antes is not None:
+        CustodioRepository.liberar_bien(antes)
+
+
+@receiver(post_save, sender=Bien)
+def recordar_cupo_bien(sender, instance, **kwargs):
+    # Un segundo save() de la misma instancia no vuelve a reservar
+    instance.recordar_valores_actuales(CAMPOS_CUPO_BIEN)
+
+
+@receiver(post_delete, sender=Bien)
+def liberar_cupo_custodio(sender, instance, **kwargs):
+    valores = instance.valores_originales() or {
+        campo: getattr(instance, campo) for campo in CAMPOS_CUPO_BIEN
+    }
+    custodio_id = _custodio_con_cupo(valores)
+    if custodio_id is not None:
+        CustodioRepository.liberar_bien(custodio_id)
@@ -0,0 +1,144 @@
+"""
+Cola de tareas en segundo plano respaldada por la base de datos.
+
+Los servicios encolan trabajo lento (notificaciones, PDFs, borrado de
+archivos en MinIO) con `encolar()` y responden de inmediato; el comando
+`manage.py run_workers` las ejecuta con un pool de hilos. No hace falta
+ningún broker externo: la tabla Tarea es la cola.
+
+Las tareas se registran con el decorador `@tarea("nombre")` y reciben sus
+argumentos como kwargs (deben ser serializables a JSON).
+
+Mientras un trabajador ejecuta, un hilo de latido renueva `Tarea.latido` de
+sus tareas cada INTERVALO_LATIDO. Solo las que dejan de latir por más de
+TIEMPO_ABANDONO (el trabajador murió) vuelven a la cola: una tarea larga no
+se ejecuta dos veces.
+"""
+
+import logging
+import random
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connections
+from django.utils import timezone
+
+from .repositories import TareaRepository
+
+logger = logging.getLogger(__name__)
+
+REGISTRO = {}
+
+# Reintento n-ésimo: RETRASO_BASE * 2^(n-1) segundos, con tope RETRASO_MAXIMO
+RETRASO_BASE = 5
+RETRASO_MAXIMO = 3600
+# Cada cuánto renueva el trabajador el latido de sus tareas en curso
+INTERVALO_LATIDO = timedelta(seconds=30)
+# Una tarea EN_PROCESO sin latido desde hace esto se considera abandonada
+TIEMPO_ABANDONO = timedelta(minutes=3)
+
+
+def tarea(nombre):
+    """Registra la función como tarea ejecutable por los trabajadores"""
+
+    def registrar(funcion):
+        REGISTRO[nombre] = funcion
+        return funcion
+
+    return registrar
+
+
+def encolar(nombre, max_intentos=None, usuario=None, **argumentos):
+    """
+    Guarda la tarea en la transacción actual: si el cambio que la origina
+    se revierte, la tarea tampoco existe. `usuario` es quien podrá consultar
+    su estado (sin usuario, solo los administradores).
+    """
+    if nombre not in REGISTRO:
+        raise ValueError(f"Tarea no registrada: {nombre}")
+    return TareaRepository.crear(nombre, argumentos, max_intentos, usuario)
+
+
+def calcular_retraso(intentos):
+    segundos = min(RETRASO_BASE * 2 ** (intentos - 1), RETRASO_MAXIMO)
+    # Un poco de azar evita que los reintentos lleguen todos a la vez
+    return timedelta(seconds=segundos * random.uniform(0.9, 1.1))
+
+
+def ejecutar(tarea_obj):
+    """Ejecuta una tarea ya reclamada y registra el resultado o el error"""
+    try:
+        funcion = REGISTRO[tarea_obj.tipo]
+        resultado = funcion(**tarea_obj.argumentos)
+    except Exception:
+        error = traceback.format_exc()
+        ahora = timezone.now()
+        if tarea_obj.intentos >= tarea_obj.max_intentos:
+            logger.error(
+                "Tarea %s (%s) fallida: %s", tarea_obj.id, tarea_obj.tipo, error
+            )
+            TareaRepository.marcar_fallida(tarea_obj, error, ahora)
+        else:
+            logger.warning(
+                "Tarea %s (%s) reintento %s",
+                tarea_obj.id,
+                tarea_obj.tipo,
+                tarea_obj.intentos,
+            )
+            TareaRepository.reprogramar(
+                tarea_obj, error, ahora + calcular_retraso(tarea_obj.intentos)
+            )
+        return False
+
+    TareaRepository.completar(tarea_obj, resultado, timezone.now())
+    return True
+
+
+def reclamar(trabajador, limite):
+    ahora = timezone.now()
+    TareaRepository.liberar_abandonadas(
+        ahora - TIEMPO_ABANDONO, ahora, calcular_retraso
+    )
+    return TareaRepository.reclamar(trabajador, ahora, limite)
+
+
+def _latir(trabajador, detener):
+    try:
+        while not detener.wait(INTERVALO_LATIDO.total_seconds()):
+            try:
+                TareaRepository.renovar_latido(trabajador, timezone.now())
+            except Exception:
+                logger.exception("No se pudo renovar el latido de %s", trabajador)
+    finally:
+        connections.close_all()
+
+
+@contextmanager
+def latiendo(trabajador):
+    """Renueva en un hilo aparte el latido de las tareas del trabajador"""
+    detener = threading.Event()
+    hilo = threading.Thread(
+        target=_latir, args=(trabajador, detener), name="tareas-latido", daemon=True
+    )
+    hilo.start()
+    try:
+        yield
+    finally:
+        detener.set()
+        hilo.join()
+
+
+def ejecutar_en_hilo(tarea_obj):
+    """Envoltura para el pool: cada hilo abre y cierra su propia conexión"""
+    try:
+        return ejecutar(tarea_obj)
+    finally:
+        connections.close_all()
+
+
+def ejecutar_pendientes(trabajador="local", limite=100):
+    """Ejecuta en este hilo las tareas listas; útil en pruebas y scripts"""
+    with latiendo(trabajador):
+        return [ejecutar(t) for t in reclamar(trabajador, limite)]
@@ -1,3 +1,1971 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import logging
+import re
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed, ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F, Sum
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.template.base import Origin
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import facturacion, metricas, semillas, tareas
+from .bitacora import ManejadorCola
+from .busqueda import indice_custodios
+from .middleware import PerfilConsultasMiddleware
+from .models import (
+    Aseguradora,
+    Bien,
+    Broker,
+    Factura,
+    Finiquito,
+    Notificacion,
+    NotificacionArchivada,
+    Poliza,
+    PolizaEstadistica,
+    ResponsableCustodio,
+    Siniestro,
+    Tarea,
+    Usuario,
+)
+from .repositories import (
+    BienRepository,
+    FacturaRepository,
+    NotificacionRepository,
+    PolizaEstadisticaRepository,
+    PolizaRepository,
+    SiniestroRepository,
+    TareaRepository,
+)
+from .services import (
+    CarteraSinteticaService,
+    CustodioService,
+    DashboardStatsService,
+    EstadisticaPolizaService,
+    ExportacionService,
+    FacturaPDFService,
+    FacturaService,
+    ImportacionInventarioService,
+    ImportacionPolizasService,
+    NotificacionService,
+    PolizaService,
+    ReporteService,
+    SiniestroService,
+    VencimientoPolizaService,
+)
+
+# Evita que las pruebas hablen con MinIO
+STORAGE_EN_MEMORIA = {
+    "default": {"BACKEND": "django.core.files.storage.InMemoryStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+def crear_datos(usuario, cantidad, prefijo):
+    """Crea `cantidad` pólizas con un siniestro, una factura y una alerta cada una."""
+    aseguradora = Aseguradora.objects.create(
+        nombre=f"Aseguradora {prefijo}",
+        ruc=f"{prefijo}".rjust(13, "0"),
+        contacto="Contacto",
+        email_contacto="contacto@aseguradora.ec",
+        telefono="072000000",
+    )
+    broker = Broker.objects.create(nombre=f"Broker {prefijo}", correo="b@broker.ec")
+
+    for i in range(cantidad):
+        custodio = ResponsableCustodio.objects.create(
+            nombre_completo=f"Custodio {prefijo}-{i}",
+            identificacion=f"{prefijo}{i}",
+            correo="custodio@utpl.edu.ec",
+        )
+        bien = Bien.objects.create(
+            custodio=custodio, codigo=f"B-{prefijo}-{i}", detalle=f"Laptop {i}"
+        )
+        poliza = Poliza.objects.create(
+            numero_poliza=f"POL-{prefijo}-{i}",
+            aseguradora=aseguradora,
+            broker=broker,
+            vigencia_inicio=date.today() - timedelta(days=30),
+            vigencia_fin=date.today() + timedelta(days=335),
+            monto_asegurado=Decimal("10000.00"),
+            ramo="Ramos Generales",
+            objeto_asegurado="Equipos",
+            prima_base=Decimal("100.00"),
+            prima_total=Decimal("115.00"),
+            fecha_emision=date.today(),
+            usuario_gestor=usuario,
+        )
+        Siniestro.objects.create(
+            poliza=poliza,
+            custodio=custodio,
+            bien=bien,
+            usuario_gestor=usuario,
+            fecha_siniestro=date.today() - timedelta(days=i),
+            tipo_siniestro="Robo",
+            ubicacion_bien="Edificio D",
+            causa_siniestro="Sustracción",
+        )
+        Factura.objects.create(
+            poliza=poliza,
+            numero_factura=f"FAC-{prefijo}-{i}",
+            fecha_emision=date.today(),
+            prima=Decimal("300.00"),
+        )
+        Notificacion.objects.create(
+            usuario=usuario, mensaje=f"Alerta {i}", tipo_alerta="OTRO"
+        )
+
+
+class ConsultasListadosTest(TestCase):
+    """Cada listado debe costar las mismas consultas sin importar las filas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.analista = Usuario.objects.create_user(
+            username="analista", password="clave", rol=Usuario.ANALISTA
+        )
+        cls.admin = Usuario.objects.create_user(
+            username="admin", password="clave", rol=Usuario.ADMINISTRADOR
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def contar_consultas(self, usuario, url):
+        self.client.force_login(usuario)
+        cache.clear()  # Ambas mediciones parten con la caché vacía
+        with CaptureQueriesContext(connection) as contexto:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return len(contexto.captured_queries)
+
+    def assertConsultasConstantes(self, usuario, url):
+        crear_datos(self.analista, 2, "10")
+        pocas = self.contar_consultas(usuario, url)
+        crear_datos(self.analista, 8, "20")
+        muchas = self.contar_consultas(usuario, url)
+        self.assertEqual(pocas, muchas, f"{url} crece con el número de filas")
+
+    def test_listado_polizas(self):
+        self.assertConsultasConstantes(self.analista, reverse("polizas_list"))
+
+    def test_listado_siniestros(self):
+        self.assertConsultasConstantes(self.analista, reverse("siniestros"))
+
+    def test_listado_facturas(self):
+        self.assertConsultasConstantes(self.analista, reverse("lista_facturas"))
+
+    def test_listado_notificaciones(self):
+        self.assertConsultasConstantes(self.analista, reverse("lista_notificaciones"))
+
+    def test_dashboard_analista(self):
+        self.assertConsultasConstantes(self.analista, reverse("dashboard_analista"))
+
+    def test_reporte_general_pdf(self):
+        self.assertConsultasConstantes(self.admin, reverse("reporte_general_pdf"))
+
+
+class PaginacionCursorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.analista = Usuario.objects.create_user(
+            username="analista", password="clave", rol=Usuario.ANALISTA
+        )
+        # Todas comparten fecha_registro: el id tiene que desempatar
+        crear_datos(cls.analista, 12, "30")
+
+    def recorrer(self, obtener_pagina):
+        vistos, cursor, consultas = [], None, []
+        while True:
+            with CaptureQueriesContext(connection) as contexto:
+                pagina = obtener_pagina(cursor)
+            consultas.append(len(contexto.captured_queries))
+            vistos.extend(obj.id for obj in pagina)
+            if not pagina.tiene_siguiente:
+                return vistos, consultas
+            cursor = pagina.siguiente_cursor
+
+    def test_recorre_todas_las_polizas_sin_repetir(self):
+        vistos, consultas = self.recorrer(
+            lambda cursor: PolizaRepository.get_pagina(cursor, tamano=5)
+        )
+        esperados = list(
+            Poliza.objects.order_by("-fecha_registro", "-id").values_list(
+                "id", flat=True
+            )
+        )
+        self.assertEqual(vistos, esperados)
+        self.assertEqual(set(consultas), {1})
+
+    def test_recorre_notificaciones_con_fecha_y_hora(self):
+        vistos, _ = self.recorrer(
+            lambda cursor: NotificacionRepository.get_pagina_por_usuario(
+                self.analista, cursor, tamano=5
+            )
+        )
+        self.assertEqual(len(vistos), 12)
+        self.assertEqual(len(set(vistos)), 12)
+
+    def test_cursor_invalido_vuelve_a_la_primera_pagina(self):
+        pagina = FacturaRepository.get_pagina("no-es-un-cursor", tamano=5)
+        self.assertTrue(pagina.es_primera)
+        self.assertEqual(len(pagina), 5)
+
+
+def plan_de_ejecucion(sql):
+    with connection.cursor() as cursor:
+        if connection.vendor == "mysql":
+            cursor.execute("EXPLAIN FORMAT=JSON " + sql)
+            return cursor.fetchone()[0]
+        cursor.execute("EXPLAIN QUERY PLAN " + sql)
+        return "\n".join(str(fila[-1]) for fila in cursor.fetchall())
+
+
+def escaneos_completos(plan):
+    """
+    Tablas que el motor recorre completas sin apoyarse en un índice, o que
+    tiene que ordenar aparte porque ningún índice entrega el orden pedido.
+    """
+    if connection.vendor == "mysql":
+        return re.findall(
+            r'"table_name": "(\w+)",\s*"access_type": "ALL"', plan
+        ) + re.findall(r'"(using_filesort)": true', plan)
+    return re.findall(
+        r"^SCAN (\w+)$|^(USE TEMP B-TREE FOR ORDER BY)$", plan, re.MULTILINE
+    )
+
+
+class PlanesDeConsultaTest(TestCase):
+    """Ningún método de repositorio debe caer en un escaneo completo de tabla."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.analista = Usuario.objects.create_user(
+            username="analista", password="clave", rol=Usuario.ANALISTA
+        )
+        crear_datos(cls.analista, 30, "40")
+        cls.poliza = Poliza.objects.first()
+        cls.custodio = ResponsableCustodio.objects.first()
+
+    def assertSinEscaneoCompleto(self, llamada):
+        with CaptureQueriesContext(connection) as contexto:
+            llamada()
+        self.assertTrue(contexto.captured_queries)
+        for consulta in contexto.captured_queries:
+            plan = plan_de_ejecucion(consulta["sql"])
+            self.assertEqual(escaneos_completos(plan), [], f"{consulta['sql']}\n{plan}")
+
+    def test_paginas_de_listados(self):
+        self.assertSinEscaneoCompleto(PolizaRepository.get_pagina)
+        self.assertSinEscaneoCompleto(SiniestroRepository.get_pagina)
+        self.assertSinEscaneoCompleto(FacturaRepository.get_pagina)
+        self.assertSinEscaneoCompleto(
+            lambda: NotificacionRepository.get_pagina_por_usuario(self.analista)
+        )
+
+    def test_siniestros_por_poliza(self):
+        self.assertSinEscaneoCompleto(
+            lambda: SiniestroRepository.get_pagina_por_poliza(self.poliza.id)
+        )
+
+    def test_bienes_por_custodio(self):
+        self.assertSinEscaneoCompleto(
+            lambda: list(BienRepository.get_by_custodio(self.custodio.id))
+        )
+
+    def test_contadores(self):
+        self.assertSinEscaneoCompleto(
+            lambda: NotificacionRepository.get_pendientes_count(self.analista)
+        )
+        self.assertSinEscaneoCompleto(PolizaService.contar_polizas_activas)
+        self.assertSinEscaneoCompleto(PolizaService.contar_polizas_vencidas)
+
+
+class BuscadorBienesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.analista = Usuario.objects.create_user(
+            username="analista", password="clave", rol=Usuario.ANALISTA
+        )
+        cls.custodio = ResponsableCustodio.objects.create(
+            nombre_completo="Ana Torres",
+            identificacion="1100000001",
+            correo="ana@utpl.edu.ec",
+            edificio="Edificio D",
+            puesto="D4D06",
+        )
+        for codigo, detalle in [
+            ("LAP-10", "Laptop Dell"),
+            ("LAP-1", "Laptop HP"),
+            ("PRO-1", "Proyector con maletín LAP"),
+            ("MON-1", "Monitor"),
+        ]:
+            Bien.objects.create(custodio=cls.custodio, codigo=codigo, detalle=detalle)
+
+    def buscar(self, **params):
+        self.client.force_login(self.analista)
+        respuesta = self.client.get(reverse("buscar_bienes_ajax"), params)
+        return [r["id"] for r in respuesta.json()["results"]], respuesta.json()
+
+    def test_prefijo_de_codigo_antes_que_detalle(self):
+        _, datos = self.buscar(term="lap")
+        textos = [r["text"] for r in datos["results"]]
+        self.assertEqual(
+            textos,
+            [
+                "LAP-1 - Laptop HP",
+                "LAP-10 - Laptop Dell",
+                "PRO-1 - Proyector con maletín LAP",
+            ],
+        )
+        self.assertEqual(datos["results"][0]["ubicacion"], "Edificio D - D4D06")
+
+    def test_resultados_acotados_y_sin_consultas_por_fila(self):
+        with CaptureQueriesContext(connection) as contexto:
+            BienRepository.buscar("", limite=2)
+        self.assertEqual(len(contexto.captured_queries), 1)
+
+        with CaptureQueriesContext(connection) as contexto:
+            resultados = BienRepository.buscar("lap", limite=2)
+            [b.custodio.puesto for b in resultados]
+        self.assertEqual(len(resultados), 2)
+        self.assertEqual(len(contexto.captured_queries), 1)
+
+
+class IndiceCustodiosTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.analista = Usuario.objects.create_user(
+            username="analista", password="clave", rol=Usuario.ANALISTA
+        )
+        for nombre, cedula in [
+            ("Ramón Núñez", "1100000001"),
+            ("Ana Ramírez", "1100000002"),
+            ("Pedro Loja", "0700000003"),
+        ]:
+            ResponsableCustodio.objects.create(
+                nombre_completo=nombre, identificacion=cedula, correo="c@utpl.edu.ec"
+            )
+
+    def setUp(self):
+        indice_custodios.invalidar()
+
+    def nombres(self, termino):
+        return [nombre for _, nombre, _ in indice_custodios.buscar(termino)]
+
+    def test_ignora_tildes_y_mayusculas(self):
+        self.assertEqual(self.nombres("ramon"), ["Ramón Núñez"])
+        self.assertEqual(self.nombres("NUNEZ"), ["Ramón Núñez"])
+        # Los que empiezan por el término van primero
+        self.assertEqual(self.nombres("ram"), ["Ramón Núñez", "Ana Ramírez"])
+
+    def test_prefijos_cortos_y_cedula(self):
+        self.assertEqual(self.nombres("lo"), ["Pedro Loja"])
+        self.assertEqual(self.nombres("07000"), ["Pedro Loja"])
+
+    def test_responde_sin_consultar_la_base(self):
+        indice_custodios.buscar("")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.nombres("pedro"), ["Pedro Loja"])
+
+    def test_senales_mantienen_el_indice(self):
+        indice_custodios.buscar("")
+        with self.captureOnCommitCallbacks(execute=True):
+            nuevo = ResponsableCustodio.objects.create(
+                nombre_completo="José Peña",
+                identificacion="1100000009",
+                correo="j@utpl.edu.ec",
+            )
+        self.assertEqual(self.nombres("pena"), ["José Peña"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            nuevo.delete()
+        self.assertEqual(self.nombres("pena"), [])
+
+    def test_recarga_al_vencer_aunque_no_haya_aviso(self):
+        # Cambio hecho "en otro worker": no pasa por las señales de este
+        indice_custodios.buscar("")
+        ResponsableCustodio.objects.filter(identificacion="0700000003").update(
+            nombre_completo="Pedro Zamora"
+        )
+        self.assertEqual(self.nombres("zamora"), [])
+        with mock.patch(
+            "apppolizas.busqueda.time.monotonic", return_value=time.monotonic() + 61
+        ):
+            self.assertEqual(self.nombres("zamora"), ["Pedro Zamora"])
+
+    def test_vista_ajax(self):
+        self.client.force_login(self.analista)
+        respuesta = self.client.get(reverse("buscar_custodios_ajax"), {"term": "Ramon"})
+        self.assertEqual(
+            respuesta.json()["results"][0]["text"], "Ramón Núñez (1100000001)"
+        )
+
+
+class DashboardStatsServiceTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.analista = Usuario.objects.create_user(
+            username="analista", password="clave", rol=Usuario.ANALISTA
+        )
+        crear_datos(cls.analista, 3, "50")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_indicadores_en_una_consulta(self):
+        with CaptureQueriesContext(connection) as contexto:
+            indicadores = PolizaRepository.get_indicadores(date.today())
+        self.assertEqual(len(contexto.captured_queries), 1)
+        self.assertEqual(
+            indicadores,
+            {
+                "total_polizas": 3,
+                "total_activas": 3,
+                "total_vencidas": 0,
+                "total_siniestros": 3,
+                "total_facturas": 3,
+                "total_usuarios": 1,
+            },
+        )
+
+    def test_cache_y_vencimiento_por_cambios(self):
+        DashboardStatsService.obtener()
+        with self.assertNumQueries(0):
+            stats = DashboardStatsService.obtener()
+        self.assertEqual(len(stats["ultimos_siniestros"]), 3)
+
+        Poliza.objects.update(estado=False)  # update() no dispara señales
+        self.assertEqual(DashboardStatsService.obtener()["total_activas"], 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Poliza.objects.first().save()
+            # Hasta el commit se sigue sirviendo lo cacheado
+            self.assertEqual(DashboardStatsService.obtener()["total_activas"], 3)
+        self.assertEqual(DashboardStatsService.obtener()["total_activas"], 0)
+
+    def test_login_no_invalida(self):
+        DashboardStatsService.obtener()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.login(username="analista", password="clave")
+        with self.assertNumQueries(0):
+            DashboardStatsService.obtener()
+
+
+class EstadisticaPolizaTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.analista = Usuario.objects.create_user(
+            username="analista", password="clave", rol=Usuario.ANALISTA
+        )
+        crear_datos(cls.analista, 2, "60")
+        cls.poliza_a, cls.poliza_b = Poliza.objects.order_by("numero_poliza")
+
+    def estadistica(self, poliza):
+        return PolizaEstadistica.objects.get(poliza=poliza)
+
+    def nuevo_siniestro(self, poliza, **extra):
+        base = Siniestro.objects.filter(poliza=poliza).first()
+        datos = dict(
+            poliza=poliza,
+            custodio=base.custodio,
+            bien=base.bien,
+            fecha_siniestro=date.today(),
+            tipo_siniestro="Daño",
+            ubicacion_bien="Edificio D",
+            causa_siniestro="Caída",
+            valor_reclamo_estimado=Decimal("150.00"),
+        )
+        datos.update(extra)
+        return Siniestro.objects.create(**datos)
+
+    def assertIgualAReconstruccion(self):
+        esperado = {
+            fila["poliza_id"]: fila for fila in PolizaEstadistica.objects.values()
+        }
+        corregidas = EstadisticaPolizaService.reconstruir()
+        self.assertEqual(corregidas, 0)
+        self.assertEqual(
+            {f["poliza_id"]: f for f in PolizaEstadistica.objects.values()}, esperado
+        )
+
+    def test_alta_cambio_de_estado_y_baja(self):
+        siniestro = self.nuevo_siniestro(self.poliza_a)
+        stats = self.estadistica(self.poliza_a)
+        self.assertEqual(stats.total_siniestros, 2)
+        self.assertEqual(stats.reportados, 2)
+        self.assertEqual(stats.valor_reclamado, Decimal("150.00"))
+
+        siniestro = Siniestro.objects.get(pk=siniestro.pk)
+        siniestro.estado_tramite = "LIQUIDADO"
+        siniestro.valor_reclamo_estimado = Decimal("100.00")
+        siniestro.save()
+        stats.refresh_from_db()
+        self.assertEqual((stats.reportados, stats.liquidados), (1, 1))
+        self.assertEqual(stats.valor_reclamado, Decimal("100.00"))
+        self.assertIgualAReconstruccion()
+
+        Siniestro.objects.get(pk=siniestro.pk).delete()
+        stats.refresh_from_db()
+        self.assertEqual((stats.total_siniestros, stats.liquidados), (1, 0))
+        self.assertIgualAReconstruccion()
+
+    def test_mover_siniestro_entre_polizas_y_finiquito(self):
+        siniestro = self.nuevo_siniestro(
+            self.poliza_a, fecha_siniestro=date.today() + timedelta(days=1)
+        )
+        Finiquito.objects.create(
+            siniestro=siniestro,
+            fecha_finiquito=date.today(),
+            valor_total_reclamo=Decimal("150.00"),
+            valor_deducible=Decimal("50.00"),
+            valor_final_pago=Decimal("100.00"),
+        )
+        self.assertEqual(self.estadistica(self.poliza_a).valor_pagado, Decimal("100"))
+
+        # Instancia cargada con only(): los originales se completan en pre_save
+        siniestro = Siniestro.objects.only("id").get(pk=siniestro.pk)
+        siniestro.poliza = self.poliza_b
+        siniestro.save()
+        self.assertEqual(self.estadistica(self.poliza_a).total_siniestros, 1)
+        self.assertEqual(self.estadistica(self.poliza_b).total_siniestros, 2)
+        self.assertEqual(
+            self.estadistica(self.poliza_b).ultimo_siniestro,
+            date.today() + timedelta(days=1),
+        )
+        Finiquito.objects.get(siniestro=siniestro).delete()
+        self.assertIgualAReconstruccion()
+
+    def test_reconstruir_corrige_desfases(self):
+        PolizaEstadistica.objects.filter(poliza=self.poliza_a).update(
+            total_siniestros=9
+        )
+        self.assertEqual(EstadisticaPolizaService.reconstruir(), 1)
+        self.assertEqual(self.estadistica(self.poliza_a).total_siniestros, 1)
+
+    def test_reconstruir_por_bloques_borra_solo_huerfanas(self):
+        # poliza_a se queda sin siniestros con una fila desfasada
+        Siniestro.objects.filter(poliza=self.poliza_a).delete()
+        PolizaEstadistica.objects.filter(poliza=self.poliza_a).update(
+            total_siniestros=5
+        )
+        PolizaEstadistica.objects.filter(poliza=self.poliza_b).update(reportados=7)
+        self.assertEqual(PolizaEstadisticaRepository.reconstruir(tamano_lote=1), 2)
+        self.assertEqual(
+            list(PolizaEstadistica.objects.values_list("poliza_id", "reportados")),
+            [(self.poliza_b.pk, 1)],
+        )
+        self.assertEqual(PolizaEstadisticaRepository.reconstruir(tamano_lote=1), 0)
+
+    def test_poliza_mas_siniestrada_en_una_consulta(self):
+        self.nuevo_siniestro(self.poliza_b)
+        with self.assertNumQueries(1):
+            top = EstadisticaPolizaService.poliza_mas_siniestrada()
+            self.assertEqual(top.poliza.numero_poliza, self.poliza_b.numero_poliza)
+        self.assertEqual(top.total_siniestros, 2)
+
+
+class ReporteGeneralTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(
+            username="admin", password="clave", rol=Usuario.ADMINISTRADOR
+        )
+
+    def consultas_reporte(self):
+        with CaptureQueriesContext(connection) as contexto:
+            datos = ReporteService.datos_reporte_general()
+        return datos, len(contexto.captured_queries)
+
+    def test_consultas_constantes_y_agregados(self):
+        crear_datos(self.admin, 2, "70")
+        _, pocas = self.consultas_reporte()
+        crear_datos(self.admin, 6, "71")
+        poliza = Poliza.objects.get(numero_poliza="POL-71-3")
+        otro = Siniestro.objects.get(poliza=poliza)
+        otro.pk, otro.numero_reclamo = None, None
+        otro.valor_reclamo_estimado = Decimal("40.00")
+        otro.save()
+
+        datos, muchas = self.consultas_reporte()
+        self.assertEqual(pocas, muchas)
+        self.assertEqual(datos["total_polizas"], 8)
+        self.assertEqual(datos["total_siniestros"], 9)
+        self.assertEqual(datos["total_reclamado"], Decimal("40.00"))
+        self.assertEqual(datos["poliza_mas_siniestrada"], "POL-71-3")
+        self.assertEqual(datos["total_reclamos_top"], 2)
+        self.assertIn(("Reportado", 9), datos["siniestros_por_estado"])
+
+    def test_lee_estadisticas_y_limita_listado(self):
+        crear_datos(self.admin, 3, "73")
+        # Los números del reporte son los de PolizaEstadistica
+        PolizaEstadistica.objects.filter(poliza__numero_poliza="POL-73-1").update(
+            total_siniestros=7
+        )
+        with mock.patch.object(ReporteService, "MAX_SINIESTROS_LISTADO", 1):
+            datos, _ = self.consultas_reporte()
+        self.assertEqual(datos["poliza_mas_siniestrada"], "POL-73-1")
+        self.assertEqual(datos["total_reclamos_top"], 7)
+        self.assertEqual(len(datos["siniestros"]), 1)
+        self.assertEqual(datos["siniestros_omitidos"], 2)
+        self.assertEqual(datos["total_siniestros"], 3)
+
+    def test_sin_siniestros(self):
+        datos, _ = self.consultas_reporte()
+        self.assertEqual(datos["poliza_mas_siniestrada"], "Ninguna")
+        self.assertEqual(datos["total_reclamos_top"], 0)
+
+    def test_vista_genera_pdf(self):
+        crear_datos(self.admin, 2, "72")
+        self.client.force_login(self.admin)
+        respuesta = self.client.get(reverse("reporte_general_pdf"))
+        self.assertEqual(respuesta["Content-Type"], "application/pdf")
+
+
+@override_settings(STORAGES=STORAGE_EN_MEMORIA)
+class FacturaPDFCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.analista = Usuario.objects.create_user(
+            username="analista", password="clave", rol=Usuario.ANALISTA
+        )
+        crear_datos(cls.analista, 1, "80")
+
+    def setUp(self):
+        self.factura = Factura.objects.get()
+        FacturaPDFService.invalidar(self.factura.pk)
+        self.client.force_login(self.analista)
+
+    def pedir_pdf(self):
+        return self.client.get(reverse("generar_pdf_factura", args=[self.factura.pk]))
+
+    def test_segunda_peticion_no_renderiza(self):
+        with mock.patch.object(
+            FacturaPDFService, "renderizar", wraps=FacturaPDFService.renderizar
+        ) as renderizar:
+            primera = self.pedir_pdf()
+            segunda = self.pedir_pdf()
+        self.assertEqual(renderizar.call_count, 1)
+        self.assertEqual(primera["Content-Type"], "application/pdf")
+        self.assertEqual(primera.content, segunda.content)
+        self.assertTrue(default_storage.exists(FacturaPDFService.ruta(self.factura)))
+
+    def test_cambio_de_valores_invalida(self):
+        self.pedir_pdf()
+        ruta_anterior = FacturaPDFService.ruta(self.factura)
+
+        self.factura.prima = Decimal("900.00")
+        self.factura.save()
+        # La tarea encolada borra la versión vieja y deja la nueva renderizada
+        self.assertEqual(tareas.ejecutar_pendientes(), [True])
+        self.assertFalse(default_storage.exists(ruta_anterior))
+        self.assertTrue(default_storage.exists(FacturaPDFService.ruta(self.factura)))
+
+        with mock.patch.object(
+            FacturaPDFService, "renderizar", wraps=FacturaPDFService.renderizar
+        ) as renderizar:
+            self.pedir_pdf()
+        self.assertEqual(renderizar.call_count, 0)
+
+    def test_guardar_sin_cambios_conserva_pdf(self):
+        self.pedir_pdf()
+        Factura.objects.get(pk=self.factura.pk).save()
+        self.assertFalse(Tarea.objects.exists())
+        self.assertTrue(default_storage.exists(FacturaPDFService.ruta(self.factura)))
+
+
+@tareas.tarea("pruebas.fallar")
+def tarea_que_falla(mensaje):
+    raise RuntimeError(mensaje)
+
+
+@tareas.tarea("pruebas.sumar")
+def tarea_que_suma(a, b):
+    return a + b
+
+
+class ColaTareasTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.analista = Usuario.objects.create_user(
+            username="analista", password="clave", rol=Usuario.ANALISTA
+        )
+
+    def test_ejecuta_y_guarda_resultado(self):
+        tarea = tareas.encolar("pruebas.sumar", a=2, b=3)
+        self.assertEqual(tareas.ejecutar_pendientes(), [True])
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.resultado), (Tarea.COMPLETADA, 5))
+        # Ya no queda nada por reclamar
+        self.assertEqual(tareas.ejecutar_pendientes(), [])
+
+    def test_reintentos_con_backoff_y_fallo_final(self):
+        tarea = tareas.encolar("pruebas.fallar", max_intentos=2, mensaje="sin red")
+        with self.assertLogs("apppolizas.tareas", "WARNING"):
+            self.assertEqual(tareas.ejecutar_pendientes(), [False])
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), (Tarea.PENDIENTE, 1))
+        self.assertGreater(tarea.ejecutar_despues, timezone.now())
+        self.assertIn("sin red", tarea.ultimo_error)
+
+        # Hasta que pase el retraso no se vuelve a intentar
+        self.assertEqual(tareas.ejecutar_pendientes(), [])
+        Tarea.objects.update(ejecutar_despues=timezone.now())
+        with self.assertLogs("apppolizas.tareas", "ERROR"):
+            tareas.ejecutar_pendientes()
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), (Tarea.FALLIDA, 2))
+
+    def test_una_tarea_la_toma_un_solo_trabajador(self):
+        tareas.encolar("pruebas.sumar", a=1, b=1)
+        primero = tareas.reclamar("w1", limite=10)
+        segundo = tareas.reclamar("w2", limite=10)
+        self.assertEqual((len(primero), len(segundo)), (1, 0))
+
+    def test_abandonadas_vuelven_a_la_cola(self):
+        tareas.encolar("pruebas.sumar", a=1, b=1)
+        tareas.reclamar("muerto", limite=10)
+        Tarea.objects.update(latido=timezone.now() - timedelta(hours=1))
+        # Vuelve a la cola con backoff, como un reintento
+        self.assertEqual(tareas.ejecutar_pendientes(), [])
+        tarea = Tarea.objects.get()
+        self.assertEqual((tarea.estado, tarea.trabajador), (Tarea.PENDIENTE, None))
+        self.assertGreater(tarea.ejecutar_despues, timezone.now())
+        Tarea.objects.update(ejecutar_despues=timezone.now())
+        self.assertEqual(tareas.ejecutar_pendientes(), [True])
+
+    def test_abandonada_sin_intentos_restantes_falla(self):
+        tarea = tareas.encolar("pruebas.sumar", max_intentos=1, a=1, b=1)
+        tareas.reclamar("muerto", limite=10)
+        Tarea.objects.update(latido=timezone.now() - timedelta(hours=1))
+        self.assertEqual(tareas.reclamar("otro", limite=10), [])
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), (Tarea.FALLIDA, 1))
+        self.assertIn("abandonado", tarea.ultimo_error)
+        self.assertIsNotNone(tarea.fecha_fin)
+
+    def test_tarea_larga_con_latido_no_se_libera(self):
+        tareas.encolar("pruebas.sumar", a=1, b=1)
+        tareas.reclamar("vivo", limite=10)
+        # Empezó hace una hora pero el trabajador sigue latiendo
+        hace_una_hora = timezone.now() - timedelta(hours=1)
+        Tarea.objects.update(fecha_inicio=hace_una_hora, latido=hace_una_hora)
+        TareaRepository.renovar_latido("vivo", timezone.now())
+        self.assertEqual(tareas.reclamar("otro", limite=10), [])
+        self.assertEqual(Tarea.objects.get().trabajador, "vivo")
+
+    def test_hilo_de_latido(self):
+        tareas.encolar("pruebas.sumar", a=1, b=1)
+        tareas.reclamar("vivo", limite=10)
+        with mock.patch.object(
+            tareas, "INTERVALO_LATIDO", timedelta(seconds=0.01)
+        ), mock.patch.object(TareaRepository, "renovar_latido") as renovar:
+            with tareas.latiendo("vivo"):
+                for _ in range(100):
+                    if renovar.called:
+                        break
+                    time.sleep(0.01)
+        self.assertEqual(renovar.call_args.args[0], "vivo")
+
+    def test_consulta_de_estado(self):
+        tarea = tareas.encolar("pruebas.sumar", usuario=self.analista, a=1, b=2)
+        self.client.force_login(self.analista)
+        url = reverse("estado_tarea", args=[tarea.pk])
+        self.assertEqual(self.client.get(url).json()["estado"], Tarea.PENDIENTE)
+        tareas.ejecutar_pendientes()
+        datos = self.client.get(url).json()
+        self.assertEqual((datos["estado"], datos["resultado"]), (Tarea.COMPLETADA, 3))
+        self.assertEqual(
+            self.client.get(reverse("estado_tarea", args=[0])).status_code, 404
+        )
+
+    def test_estado_solo_para_quien_la_pidio_o_admin(self):
+        tarea = tareas.encolar("pruebas.sumar", usuario=self.analista, a=1, b=2)
+        url = reverse("estado_tarea", args=[tarea.pk])
+        otro = Usuario.objects.create_user(
+            username="otro", password="clave", rol=Usuario.ANALISTA
+        )
+        self.client.force_login(otro)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        admin = Usuario.objects.create_user(
+            username="admin", password="clave", rol=Usuario.ADMINISTRADOR
+        )
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get(url).json()["estado"], Tarea.PENDIENTE)
+
+
+@override_settings(STORAGES=STORAGE_EN_MEMORIA)
+class RunWorkersTest(TransactionTestCase):
+    """Los hilos del pool usan su propia conexión: no puede haber una transacción abierta"""
+
+    def setUp(self):
+        self.analista = Usuario.objects.create_user(
+            username="analista", password="clave", rol=Usuario.ANALISTA
+        )
+
+    def test_servicios_encolan_notificaciones(self):
+        crear_datos(self.analista, 1, "90")
+        poliza = Poliza.objects.get()
+        FacturaService.crear_factura(
+            {
+                "poliza": poliza,
+                "numero_factura": "FAC-90-X",
+                "fecha_emision": date.today(),
+                "prima": Decimal("300.00"),
+            }
+        )
+        antes = Notificacion.objects.count()
+        self.assertEqual(
+            sorted(Tarea.objects.values_list("tipo", flat=True)),
+            ["factura.regenerar_pdf", "notificacion.crear"],
+        )
+        call_command("run_workers", "--una-vez", "--hilos=2", stdout=io.StringIO())
+        self.assertEqual(Notificacion.objects.count(), antes + 1)
+        self.assertFalse(Tarea.objects.exclude(estado=Tarea.COMPLETADA).exists())
+
+
+class NotificacionesMasivasTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.analistas = [
+            Usuario.objects.create_user(
+                username=f"analista{i}", password="clave", rol=Usuario.ANALISTA
+            )
+            for i in range(5)
+        ]
+        Usuario.objects.create_user(
+            username="inactivo", password="clave", rol=Usuario.ANALISTA, is_active=False
+        )
+        Usuario.objects.create_user(
+            username="gerente", password="clave", rol=Usuario.GERENTE
+        )
+
+    def test_fan_out_por_rol_en_lotes(self):
+        # 1 SELECT de ids + 3 INSERT de 2 filas + SAVEPOINT/RELEASE
+        with CaptureQueriesContext(connection) as contexto:
+            creadas = NotificacionService.notificar_rol(
+                Usuario.ANALISTA,
+                "VENCIMIENTO_POLIZA",
+                "Pólizas por vencer",
+                tamano_lote=2,
+            )
+        self.assertEqual(creadas, 5)
+        inserts = [
+            q for q in contexto.captured_queries if q["sql"].startswith("INSERT")
+        ]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(
+            set(Notificacion.objects.values_list("usuario_id", flat=True)),
+            {u.pk for u in self.analistas},
+        )
+
+    def test_lista_de_tuplas_y_todo_o_nada(self):
+        alertas = [(u, "OTRO", f"Mensaje {u.pk}", "7") for u in self.analistas]
+        self.assertEqual(NotificacionService.crear_notificaciones_masivas(alertas), 5)
+
+        con_error = alertas[:3] + [(self.analistas[0].pk, "NO_EXISTE", "x", None)]
+        with self.assertRaises(ValidationError):
+            NotificacionService.crear_notificaciones_masivas(con_error, tamano_lote=2)
+        self.assertEqual(Notificacion.objects.count(), 5)
+
+    def test_difusion_en_segundo_plano(self):
+        NotificacionService.encolar_notificacion_rol(Usuario.GERENTE, "OTRO", "Aviso")
+        self.assertEqual(tareas.ejecutar_pendientes(), [True])
+        self.assertEqual(Tarea.objects.get().resultado, {"creadas": 1})
+
+
+class ContadorNoLeidasTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.analista = Usuario.objects.create_user(
+            username="analista", password="clave", rol=Usuario.ANALISTA
+        )
+        cls.otro = Usuario.objects.create_user(
+            username="otro", password="clave", rol=Usuario.ANALISTA
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def contador(self, usuario):
+        return Usuario.objects.get(pk=usuario.pk).notificaciones_no_leidas
+
+    def test_altas_lecturas_y_bajas(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            notis = [
+                NotificacionService.crear_notificacion(self.analista, "OTRO", f"M{i}")
+                for i in range(3)
+            ]
+            NotificacionService.crear_notificaciones_masivas(
+                [
+                    (self.analista, "OTRO", "Lote", None),
+                    (self.otro, "OTRO", "Lote", None),
+                ]
+            )
+        self.assertEqual(self.contador(self.analista), 4)
+        self.assertEqual(self.contador(self.otro), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificacionService.leer_notificacion(notis[0].pk, self.analista)
+            # Leerla dos veces no descuenta dos veces
+            NotificacionService.leer_notificacion(notis[0].pk, self.analista)
+            notis[1].delete()
+            # Reasignar una pendiente mueve el contador de usuario
+            noti = Notificacion.objects.get(pk=notis[2].pk)
+            noti.usuario = self.otro
+            noti.save()
+        self.assertEqual(self.contador(self.analista), 1)
+        self.assertEqual(self.contador(self.otro), 2)
+        self.assertEqual(
+            self.contador(self.analista),
+            NotificacionRepository.get_pendientes_count(self.analista),
+        )
+
+    def test_badge_no_cuenta_la_tabla(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificacionService.crear_notificacion(self.analista, "OTRO", "Hola")
+        self.client.force_login(self.analista)
+        with CaptureQueriesContext(connection) as contexto:
+            respuesta = self.client.get(reverse("dashboard_analista"))
+        self.assertEqual(respuesta.context["notificaciones_no_leidas"], 1)
+        self.assertFalse(
+            any(
+                "apppolizas_notificacion" in q["sql"] for q in contexto.captured_queries
+            )
+        )
+
+        # Segunda lectura: sale de la caché, sin tocar la base de datos
+        with self.assertNumQueries(0):
+            self.assertEqual(NotificacionService.contar_no_leidas(self.analista), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificacionService.crear_notificacion(self.analista, "OTRO", "Otra")
+        self.assertEqual(NotificacionService.contar_no_leidas(self.analista), 2)
+
+
+class MarcarLeidasTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.analista = Usuario.objects.create_user(
+            username="analista", password="clave", rol=Usuario.ANALISTA
+        )
+        cls.otro = Usuario.objects.create_user(
+            username="otro", password="clave", rol=Usuario.ANALISTA
+        )
+        NotificacionService.crear_notificaciones_masivas(
+            [(cls.analista, "OTRO", f"M{i}", None) for i in range(4)]
+            + [(cls.otro, "OTRO", "Ajena", None)]
+        )
+
+    def pendientes(self, usuario):
+        return Notificacion.objects.filter(usuario=usuario, estado="PENDIENTE")
+
+    def test_leer_una_es_un_solo_update(self):
+        noti = self.pendientes(self.analista).first()
+        with CaptureQueriesContext(connection) as contexto:
+            self.assertTrue(
+                NotificacionService.leer_notificacion(noti.pk, self.analista)
+            )
+        updates = [
+            q for q in contexto.captured_queries if q["sql"].startswith("UPDATE")
+        ]
+        # El de la notificación y el del contador; ningún SELECT
+        self.assertEqual(len(updates), 2)
+        self.assertFalse(
+            any(q["sql"].startswith("SELECT") for q in contexto.captured_queries)
+        )
+        self.assertFalse(NotificacionService.leer_notificacion(noti.pk, self.analista))
+
+    def test_no_marca_alertas_ajenas(self):
+        ajena = self.pendientes(self.otro).get()
+        self.assertFalse(NotificacionService.leer_notificacion(ajena.pk, self.analista))
+        self.assertEqual(self.pendientes(self.otro).count(), 1)
+
+    def test_endpoint_seleccionadas_y_todas(self):
+        self.client.force_login(self.analista)
+        url = reverse("marcar_notificaciones_leidas")
+        ids = list(self.pendientes(self.analista).values_list("id", flat=True)[:2])
+        ajena = self.pendientes(self.otro).get()
+
+        self.client.post(url, {"ids": ids + [ajena.pk]})
+        self.assertEqual(self.pendientes(self.analista).count(), 2)
+        self.assertEqual(self.pendientes(self.otro).count(), 1)
+
+        self.client.post(url, {"todas": "1"})
+        self.assertFalse(self.pendientes(self.analista).exists())
+        self.assertEqual(
+            Usuario.objects.get(pk=self.analista.pk).notificaciones_no_leidas, 0
+        )
+        self.assertEqual(
+            Usuario.objects.get(pk=self.otro.pk).notificaciones_no_leidas, 1
+        )
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+        # Sin sesión no llega al servicio: redirige al login
+        self.client.logout()
+        self.assertEqual(self.client.post(url, {"todas": "1"}).status_code, 302)
+
+
+class RetencionNotificacionesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.analista = Usuario.objects.create_user(
+            username="analista", password="clave", rol=Usuario.ANALISTA
+        )
+        cls.otro = Usuario.objects.create_user(
+            username="otro", password="clave", rol=Usuario.ANALISTA
+        )
+        NotificacionService.crear_notificaciones_masivas(
+            [
+                (u, "OTRO", f"Alerta {i} ñ", str(i))
+                for u in (cls.analista, cls.otro)
+                for i in range(5)
+            ]
+        )
+        vieja = timezone.now() - timedelta(days=400)
+        # 3 leídas y 1 pendiente antiguas por usuario; la quinta es reciente
+        for usuario in (cls.analista, cls.otro):
+            ids = list(
+                Notificacion.objects.filter(usuario=usuario)
+                .order_by("id")
+                .values_list("id", flat=True)
+            )
+            Notificacion.objects.filter(id__in=ids[:4]).update(fecha_emision=vieja)
+            NotificacionService.marcar_leidas(usuario, ids[:3])
+
+    def test_archiva_solo_leidas_antiguas_por_lotes(self):
+        salida = io.StringIO()
+        call_command("archivar_notificaciones", "--dias=180", "--lote=4", stdout=salida)
+        self.assertIn("archivadas: 6", salida.getvalue())
+
+        self.assertEqual(Notificacion.objects.count(), 4)
+        self.assertFalse(
+            Notificacion.objects.filter(
+                estado="LEIDA", fecha_emision__lt=timezone.now() - timedelta(days=180)
+            ).exists()
+        )
+        # 6 alertas en lotes de 4: cada lote deja un bloque por usuario
+        archivos = NotificacionArchivada.objects.filter(usuario=self.analista)
+        self.assertEqual(sum(a.cantidad for a in archivos), 3)
+        mensajes = [n["mensaje"] for a in archivos for n in a.notificaciones()]
+        self.assertEqual(sorted(mensajes), ["Alerta 0 ñ", "Alerta 1 ñ", "Alerta 2 ñ"])
+
+        # Repetirlo no mueve nada más y el contador de no leídas no cambia
+        self.assertEqual(NotificacionService.archivar_antiguas(dias=180), 0)
+        self.assertEqual(
+            Usuario.objects.get(pk=self.analista.pk).notificaciones_no_leidas, 2
+        )
+
+
+class EscanerVencimientosTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.analista = Usuario.objects.create_user(
+            username="analista", password="clave", rol=Usuario.ANALISTA
+        )
+        crear_datos(cls.analista, 6, "95")
+        cls.hoy = date.today()
+        polizas = list(Poliza.objects.order_by("numero_poliza"))
+        # Vencen en 5, 10, 20 y 40 días; una inactiva y una sin gestor
+        for poliza, dias in zip(polizas, (5, 10, 20, 40, 3, 3)):
+            poliza.vigencia_fin = cls.hoy + timedelta(days=dias)
+        polizas[4].estado = False
+        polizas[5].usuario_gestor = None
+        Poliza.objects.bulk_update(
+            polizas, ["vigencia_fin", "estado", "usuario_gestor"]
+        )
+        cls.polizas = polizas
+
+    def alertas(self):
+        return Notificacion.objects.filter(tipo_alerta="VENCIMIENTO_POLIZA")
+
+    def test_umbrales_e_idempotencia(self):
+        salida = io.StringIO()
+        call_command("escanear_vencimientos", stdout=salida)
+        self.assertIn("creadas: 3", salida.getvalue())
+        self.assertEqual(
+            sorted(self.alertas().values_list("clave_deduplicacion", flat=True)),
+            sorted(
+                f"venc:{p.pk}:{p.vigencia_fin.isoformat()}:{umbral}"
+                for p, umbral in zip(self.polizas, (7, 15, 30))
+            ),
+        )
+
+        # Repetir el escaneo el mismo día no crea nada
+        self.assertEqual(VencimientoPolizaService.escanear(self.hoy), 0)
+        self.assertEqual(self.alertas().count(), 3)
+
+        # Seis días después: la de 10 días pasa al umbral de 7 y la de 20 al de 15
+        self.assertEqual(
+            VencimientoPolizaService.escanear(self.hoy + timedelta(days=6)), 2
+        )
+        self.assertEqual(
+            set(
+                self.alertas()
+                .filter(id_referencia__in=[self.polizas[1].pk, self.polizas[2].pk])
+                .values_list("clave_deduplicacion", flat=True)
+            ),
+            {
+                f"venc:{self.polizas[1].pk}:{self.polizas[1].vigencia_fin}:15",
+                f"venc:{self.polizas[1].pk}:{self.polizas[1].vigencia_fin}:7",
+                f"venc:{self.polizas[2].pk}:{self.polizas[2].vigencia_fin}:30",
+                f"venc:{self.polizas[2].pk}:{self.polizas[2].vigencia_fin}:15",
+            },
+        )
+
+    def test_corrida_concurrente_con_clave_ya_insertada(self):
+        # Otra corrida insertó la alerta de la primera póliza después de que
+        # esta consultara las claves existentes
+        poliza = self.polizas[0]
+        clave = f"venc:{poliza.pk}:{poliza.vigencia_fin.isoformat()}:7"
+        NotificacionService.crear_notificaciones_masivas(
+            [(self.analista, "VENCIMIENTO_POLIZA", "Ya avisada", poliza.pk, clave)]
+        )
+        with mock.patch.object(
+            NotificacionRepository, "get_claves_existentes", return_value=set()
+        ):
+            self.assertEqual(VencimientoPolizaService.escanear(self.hoy), 2)
+        self.assertEqual(VencimientoPolizaService.escanear(self.hoy), 0)
+
+        self.assertEqual(self.alertas().count(), 3)
+        self.assertEqual(self.alertas().filter(clave_deduplicacion=clave).count(), 1)
+        # El contador solo cuenta las filas que entraron de verdad
+        self.assertEqual(
+            Usuario.objects.get(pk=self.analista.pk).notificaciones_no_leidas,
+            Notificacion.objects.filter(
+                usuario=self.analista, estado="PENDIENTE"
+            ).count(),
+        )
+
+    def test_consultas_por_lote_no_por_poliza(self):
+        with CaptureQueriesContext(connection) as contexto:
+            VencimientoPolizaService.escanear(self.hoy, tamano_lote=2)
+        # 1 lectura de pólizas + (claves existentes + inserción) por lote
+        selects = [
+            q for q in contexto.captured_queries if "apppolizas_poliza" in q["sql"]
+        ]
+        self.assertEqual(len(selects), 1)
+
+
+class CalculoFacturasTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.analista = Usuario.objects.create_user(
+            username="analista", password="clave", rol=Usuario.ANALISTA
+        )
+        crear_datos(cls.analista, 1, "95")
+        cls.poliza = Poliza.objects.get()
+
+    def nuevas(self, prefijo):
+        emision = date(2025, 3, 1)
+        casos = [
+            ("250.00", None, "0", False),
+            ("250.01", 5, "0", False),
+            ("999.99", 20, "12.34", False),
+            ("4000.00", 21, "0", True),
+            ("10.10", 3, "500.00", False),
+            ("7777.77", None, "100.00", False),
+        ]
+        return [
+            Factura(
+                poliza=self.poliza,
+                numero_factura=f"{prefijo}-{i}",
+                fecha_emision=emision,
+                fecha_pago=emision + timedelta(days=dias) if dias is not None else None,
+                prima=Decimal(prima),
+                retenciones=Decimal(retenciones),
+                pagado=pagado,
+            )
+            for i, (prima, dias, retenciones, pagado) in enumerate(casos)
+        ]
+
+    def test_valores_de_una_factura(self):
+        valores = facturacion.calcular(Decimal("300.00"))
+        self.assertEqual(valores.contribucion_super, Decimal("10.50"))
+        self.assertEqual(valores.seguro_campesino, Decimal("1.50"))
+        self.assertEqual(valores.derechos_emision, Decimal("1.00"))
+        self.assertEqual(valores.base_imponible, Decimal("313.00"))
+        self.assertEqual(valores.iva, Decimal("46.95"))
+        self.assertEqual(valores.total_facturado, Decimal("359.95"))
+        self.assertEqual(valores.mensaje_resultado, "Pendiente")
+
+    def test_lote_igual_a_save(self):
+        for factura in self.nuevas("UNO"):
+            factura.save()
+        FacturaRepository.crear_lote(self.nuevas("LOTE"))
+
+        campos = ("numero_factura",) + facturacion.CAMPOS_CALCULADOS
+        una_a_una = Factura.objects.filter(numero_factura__startswith="UNO-")
+        en_lote = Factura.objects.filter(numero_factura__startswith="LOTE-")
+        self.assertEqual(
+            [
+                fila[1:]
+                for fila in una_a_una.order_by("numero_factura").values_list(*campos)
+            ],
+            [
+                fila[1:]
+                for fila in en_lote.order_by("numero_factura").values_list(*campos)
+            ],
+        )
+        self.assertEqual(
+            set(en_lote.values_list("mensaje_resultado", flat=True)),
+            {"Pendiente", "Pagado", "Saldado"},
+        )
+
+    def test_crear_lote_una_sola_insercion(self):
+        with CaptureQueriesContext(connection) as contexto:
+            FacturaRepository.crear_lote(self.nuevas("BULK"))
+        inserts = [
+            q for q in contexto.captured_queries if q["sql"].startswith("INSERT")
+        ]
+        self.assertEqual(len(inserts), 1)
+
+    def test_benchmark(self):
+        salida = io.StringIO()
+        antes = Factura.objects.count()
+        with mock.patch.object(
+            Factura, "save", autospec=True, side_effect=Factura.save
+        ) as guardar:
+            call_command(
+                "benchmark_facturacion", filas=50, repeticiones=1, stdout=salida
+            )
+        # El brazo fila a fila pasa por el save() real
+        self.assertEqual(guardar.call_count, 50)
+        self.assertIn("Factura.save()", salida.getvalue())
+        self.assertIn("Aceleración", salida.getvalue())
+        # Todo se revierte
+        self.assertEqual(Factura.objects.count(), antes)
+        self.assertFalse(
+            Factura.objects.filter(numero_factura__startswith="BENCH").exists()
+        )
+
+
+class ImportacionInventarioTest(TestCase):
+    ENCABEZADO = "Cédula;Custodio;Correo;Edificio;Código;Detalle;Estado\n"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.custodio = ResponsableCustodio.objects.create(
+            nombre_completo="Ana Existente",
+            identificacion="1100000001",
+            correo="ana@utpl.edu.ec",
+        )
+        for i in range(4):
+            Bien.objects.create(
+                custodio=cls.custodio, codigo=f"PREV-{i}", detalle="Monitor"
+            )
+
+    def importar(self, contenido, **kwargs):
+        archivo = io.BytesIO(contenido.encode("utf-8-sig"))
+        return ImportacionInventarioService.importar(archivo, "acta.csv", **kwargs)
+
+    def test_crea_y_actualiza(self):
+        resultado = self.importar(
+            self.ENCABEZADO
+            + "1100000002;Luis Nuevo;luis@utpl.edu.ec;Edificio D;NB-1;Laptop;Bueno\n"
+            + "1100000002;Luis Nuevo;luis@utpl.edu.ec;Edificio D;NB-2;Mouse;R\n"
+            + "1100000001;Ana Actualizada;ana@utpl.edu.ec;Edificio A;PREV-0;Monitor 24;M\n"
+        )
+        self.assertEqual(resultado.errores, [])
+        self.assertEqual(resultado.guardados["bienes"], 3)
+        luis = ResponsableCustodio.objects.get(identificacion="1100000002")
+        self.assertEqual(luis.edificio, "Edificio D")
+        self.assertEqual(luis.bienes.count(), 2)
+        self.custodio.refresh_from_db()
+        self.assertEqual(self.custodio.nombre_completo, "Ana Actualizada")
+        monitor = Bien.objects.get(codigo="PREV-0")
+        self.assertEqual((monitor.detalle, monitor.estado_fisico), ("Monitor 24", "M"))
+        self.assertEqual(Bien.objects.count(), 6)
+
+    def test_tope_y_errores_por_fila(self):
+        resultado = self.importar(
+            self.ENCABEZADO
+            + "1100000001;;;;NB-5;Proyector;B\n"
+            + "1100000001;;;;NB-6;Parlantes;B\n"
+            + "9999999999;;;;NB-7;Tablet;B\n"
+            + "1100000003;Sin Correo;no-es-correo;;NB-8;Teclado;B\n"
+            + ";;;;NB-9;Cámara;B\n"
+        )
+        self.assertEqual(resultado.guardados["bienes"], 1)
+        self.assertEqual([fila for fila, _ in resultado.errores], [3, 4, 5, 6])
+        self.assertIn("máximo permitido", resultado.errores[0][1])
+        self.assertEqual(self.custodio.bienes.count(), Bien.MAX_POR_CUSTODIO)
+
+    def test_tope_sin_contar_bienes(self):
+        filas = "".join(
+            f"12000000{i:02d};Custodio {i};c{i}@utpl.edu.ec;;IMP-{i};Silla;B\n"
+            for i in range(40)
+        )
+        with CaptureQueriesContext(connection) as contexto:
+            resultado = self.importar(self.ENCABEZADO + filas, tamano_lote=20)
+        self.assertEqual(resultado.guardados["bienes"], 40)
+        conteos = [q for q in contexto.captured_queries if "COUNT" in q["sql"].upper()]
+        self.assertEqual(conteos, [])
+        # Por lote: upsert custodios, cupos, códigos activos, upsert bienes, contador
+        self.assertLessEqual(len(contexto.captured_queries), 2 * 5 + 4)
+        self.assertEqual(
+            ResponsableCustodio.objects.get(identificacion="1200000007").bienes_activos,
+            1,
+        )
+
+    def test_formato_no_soportado(self):
+        with self.assertRaises(ValidationError):
+            ImportacionInventarioService.importar(io.BytesIO(b""), "acta.pdf")
+
+    def test_comando(self):
+        ruta = self.enterContext(tempfile.TemporaryDirectory()) + "/acta.csv"
+        with open(ruta, "w", encoding="utf-8") as archivo:
+            archivo.write(
+                "cedula,custodio,correo,codigo,detalle\n"
+                "1100000004,Rosa,rosa@utpl.edu.ec,CMD-1,Impresora\n"
+            )
+        salida = io.StringIO()
+        call_command("importar_inventario", ruta, stdout=salida)
+        self.assertIn("Bienes: 1", salida.getvalue())
+        self.assertTrue(Bien.objects.filter(codigo="CMD-1").exists())
+
+
+class ImportacionPolizasTest(TestCase):
+    POLIZAS = (
+        "Número Póliza,Aseguradora,Broker,Vigencia Inicio,Vigencia Fin,"
+        "Monto Asegurado,Ramo,Objeto Asegurado,Prima Base,Prima Total,"
+        "Fecha Emisión\n"
+    )
+    FACTURAS = "Número Factura,Póliza,Fecha Emisión,Fecha Pago,Prima,Pagado\n"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.analista = Usuario.objects.create_user(
+            username="analista", password="clave", rol=Usuario.ANALISTA
+        )
+        crear_datos(cls.analista, 1, "97")
+        Broker.objects.create(nombre="Tecniseguros", correo="t@broker.ec")
+
+    def poliza(self, numero, aseguradora="0000000000097", broker="tecniseguros"):
+        return (
+            f"{numero},{aseguradora},{broker},2025-01-01,31/12/2025,"
+            "50000,Vehículos,Flota,1000.00,1150.00,2025-01-01\n"
+        )
+
+    def importar(self, contenido, tipo, **kwargs):
+        archivo = io.BytesIO(contenido.encode("utf-8"))
+        return ImportacionPolizasService.importar(
+            archivo, "cronograma.csv", tipo, usuario=self.analista, **kwargs
+        )
+
+    def test_importa_polizas_y_reporta_errores(self):
+        resultado = self.importar(
+            self.POLIZAS
+            + self.poliza("IMP-1")
+            + self.poliza("IMP-2", aseguradora="Aseguradora 97")
+            + self.poliza("IMP-3", aseguradora="0999999999001")
+            + self.poliza("POL-97-0")
+            + self.poliza("IMP-1"),
+            "polizas",
+            tamano_lote=2,
+        )
+        self.assertEqual(resultado.guardados["polizas"], 2)
+        self.assertEqual([fila for fila, _ in resultado.errores], [4, 5, 6])
+        poliza = Poliza.objects.get(numero_poliza="IMP-2")
+        self.assertEqual(poliza.usuario_gestor, self.analista)
+        self.assertEqual(poliza.vigencia_fin, date(2025, 12, 31))
+        self.assertEqual(poliza.broker.nombre, "Tecniseguros")
+
+    def test_facturas_calculadas_por_lote(self):
+        resultado = self.importar(
+            self.FACTURAS
+            + "IMPF-1,POL-97-0,2025-03-01,2025-03-10,300.00,no\n"
+            + "IMPF-2,POL-97-0,2025-03-01,,1200.50,si\n"
+            + "IMPF-3,NO-EXISTE,2025-03-01,,10,no\n"
+            + "IMPF-4,POL-97-0,01-03-2025,,10,no\n",
+            "facturas",
+        )
+        self.assertEqual(resultado.guardados["facturas"], 2)
+        self.assertEqual([fila for fila, _ in resultado.errores], [4, 5])
+
+        importada = Factura.objects.get(numero_factura="IMPF-1")
+        esperada = facturacion.calcular(
+            Decimal("300.00"), date(2025, 3, 1), date(2025, 3, 10)
+        )
+        self.assertEqual(importada.valor_a_pagar, esperada.valor_a_pagar)
+        self.assertEqual(
+            Factura.objects.get(numero_factura="IMPF-2").mensaje_resultado, "Pagado"
+        )
+
+    def test_simulacion_no_guarda(self):
+        antes = Poliza.objects.count()
+        resultado = self.importar(
+            self.POLIZAS + self.poliza("SIM-1") + self.poliza("SIM-2"),
+            "polizas",
+            simular=True,
+        )
+        self.assertEqual(resultado.guardados["polizas"], 2)
+        self.assertEqual(Poliza.objects.count(), antes)
+
+    def test_sin_guardados_fila_a_fila(self):
+        filas = "".join(self.poliza(f"MAS-{i}") for i in range(30))
+        with CaptureQueriesContext(connection) as contexto:
+            resultado = self.importar(self.POLIZAS + filas, "polizas")
+        self.assertEqual(resultado.guardados["polizas"], 30)
+        inserts = [
+            q for q in contexto.captured_queries if q["sql"].startswith("INSERT")
+        ]
+        self.assertEqual(len(inserts), 1)
+
+    def test_endpoint(self):
+        self.client.force_login(self.analista)
+        archivo = SimpleUploadedFile(
+            "cronograma.csv", (self.POLIZAS + self.poliza("WEB-1")).encode("utf-8")
+        )
+        respuesta = self.client.post(
+            reverse("importar_polizas"), {"archivo": archivo, "tipo": "polizas"}
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()["guardados"], {"polizas": 1})
+        self.assertTrue(Poliza.objects.filter(numero_poliza="WEB-1").exists())
+
+        respuesta = self.client.post(reverse("importar_polizas"), {"tipo": "otro"})
+        self.assertEqual(respuesta.status_code, 400)
+
+
+class ExportacionCSVTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.analista = Usuario.objects.create_user(
+            username="analista", password="clave", rol=Usuario.ANALISTA
+        )
+        crear_datos(cls.analista, 3, "98")
+        siniestro = Siniestro.objects.order_by("id").first()
+        siniestro.numero_reclamo = "=HYPERLINK(1)"
+        siniestro.save()
+        Finiquito.objects.create(
+            siniestro=siniestro,
+            fecha_finiquito=date.today(),
+            valor_total_reclamo=Decimal("500.00"),
+            valor_deducible=Decimal("50.00"),
+            valor_depreciacion=Decimal("25.00"),
+            valor_final_pago=Decimal("425.00"),
+        )
+
+    def setUp(self):
+        self.client.force_login(self.analista)
+
+    def descargar(self, tipo, **parametros):
+        respuesta = self.client.get(reverse("exportar_csv", args=[tipo]), parametros)
+        self.assertTrue(respuesta.streaming)
+        return respuesta, b"".join(respuesta.streaming_content)
+
+    def leer(self, contenido):
+        return list(csv.reader(io.StringIO(contenido.decode("utf-8-sig"))))
+
+    def test_siniestros_con_finiquito(self):
+        respuesta, contenido = self.descargar("siniestros")
+        self.assertEqual(respuesta["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn("attachment", respuesta["Content-Disposition"])
+        filas = self.leer(contenido)
+        self.assertEqual(len(filas), 4)
+        encabezado, primera = filas[0], filas[1]
+        self.assertEqual(primera[encabezado.index("Valor pagado")], "425.00")
+        self.assertEqual(primera[encabezado.index("Pagado al usuario")], "No")
+        self.assertEqual(primera[encabezado.index("Custodio")], "Custodio 98-0")
+        # Una celda que empieza con "=" no se interpreta como fórmula
+        self.assertEqual(primera[0], "'=HYPERLINK(1)")
+        self.assertEqual(filas[2][encabezado.index("Valor pagado")], "")
+
+    def test_gzip(self):
+        respuesta, contenido = self.descargar("facturas", formato="gz")
+        self.assertEqual(respuesta["Content-Type"], "application/gzip")
+        self.assertTrue(respuesta["Content-Disposition"].endswith('.csv.gz"'))
+        filas = self.leer(gzip.decompress(contenido))
+        self.assertEqual(len(filas), 4)
+        self.assertEqual(filas[1][filas[0].index("Total facturado")], "359.95")
+
+    def test_una_consulta_en_streaming(self):
+        nombre, contenido = ExportacionService.exportar("polizas")
+        self.assertTrue(nombre.startswith("polizas_"))
+        with CaptureQueriesContext(connection) as contexto:
+            self.assertTrue(next(contenido).startswith("\ufeff".encode("utf-8")))
+            resto = list(contenido)
+        self.assertEqual(len(contexto.captured_queries), 1)
+        self.assertEqual(len(self.leer(b"".join(resto))), 3)
+
+    def test_bloques_paginados_por_id(self):
+        with mock.patch("apppolizas.services.TAMANO_CURSOR", 2):
+            _, contenido = ExportacionService.exportar("facturas")
+            with CaptureQueriesContext(connection) as contexto:
+                filas = self.leer(b"".join(contenido))
+        self.assertEqual(len(contexto.captured_queries), 2)
+        self.assertIn(
+            '"apppolizas_factura"."id" >', contexto.captured_queries[1]["sql"]
+        )
+        numeros = Factura.objects.order_by("id").values_list(
+            "numero_factura", flat=True
+        )
+        self.assertEqual([fila[0] for fila in filas[1:]], list(numeros))
+
+    def test_tipo_desconocido_y_permisos(self):
+        respuesta = self.client.get(reverse("exportar_csv", args=["usuarios"]))
+        self.assertEqual(respuesta.status_code, 404)
+        solicitante = Usuario.objects.create_user(
+            username="solicitante", password="clave", rol=Usuario.SOLICITANTE
+        )
+        self.client.force_login(solicitante)
+        respuesta = self.client.get(reverse("exportar_csv", args=["polizas"]))
+        self.assertEqual(respuesta.status_code, 403)
+
+
+class CupoBienesCustodioTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana, cls.luis = [
+            ResponsableCustodio.objects.create(
+                nombre_completo=nombre, identificacion=cedula, correo="c@utpl.edu.ec"
+            )
+            for nombre, cedula in (("Ana", "1300000001"), ("Luis", "1300000002"))
+        ]
+
+    def activos(self, custodio):
+        custodio.refresh_from_db(fields=["bienes_activos"])
+        return custodio.bienes_activos
+
+    def crear_bienes(self, custodio, cantidad, prefijo="B"):
+        return [
+            Bien.objects.create(
+                custodio=custodio, codigo=f"{prefijo}-{i}", detalle="PC"
+            )
+            for i in range(cantidad)
+        ]
+
+    def test_alta_sin_count(self):
+        self.crear_bienes(self.ana, 4)
+        with CaptureQueriesContext(connection) as contexto:
+            Bien.objects.create(custodio=self.ana, codigo="QUINTO", detalle="PC")
+        self.assertFalse(
+            [q for q in contexto.captured_queries if "COUNT" in q["sql"].upper()]
+        )
+        self.assertEqual(self.activos(self.ana), Bien.MAX_POR_CUSTODIO)
+
+    def test_altas_simultaneas_no_pasan_el_tope(self):
+        self.crear_bienes(self.ana, 4)
+        # Dos peticiones leyeron el custodio con 4 bienes: ambas pasan clean()
+        primera = Bien(custodio=ResponsableCustodio.objects.get(pk=self.ana.pk))
+        segunda = Bien(custodio=ResponsableCustodio.objects.get(pk=self.ana.pk))
+        primera.codigo, primera.detalle = "P-1", "PC"
+        segunda.codigo, segunda.detalle = "P-2", "PC"
+        primera.full_clean()
+        segunda.full_clean()
+
+        primera.save()
+        with self.assertRaises(ValidationError):
+            segunda.save()
+        self.assertFalse(Bien.objects.filter(codigo="P-2").exists())
+        self.assertEqual(self.activos(self.ana), Bien.MAX_POR_CUSTODIO)
+
+    def test_traspaso_baja_y_borrado(self):
+        bien, otro = self.crear_bienes(self.ana, 2)
+        bien.custodio = self.luis
+        bien.save()
+        bien.save()
+        self.assertEqual((self.activos(self.ana), self.activos(self.luis)), (1, 1))
+
+        bien.estado_operativo = "INACTIVO"
+        bien.save()
+        self.assertEqual(self.activos(self.luis), 0)
+
+        # Un bien inactivo no ocupa cupo: no se descuenta al borrarlo
+        bien.delete()
+        Bien.objects.get(pk=otro.pk).delete()
+        self.assertEqual((self.activos(self.ana), self.activos(self.luis)), (0, 0))
+
+    def test_traspaso_a_custodio_lleno(self):
+        self.crear_bienes(self.luis, 5, "L")
+        (bien,) = self.crear_bienes(self.ana, 1)
+        bien.custodio = self.luis
+        with self.assertRaises(ValidationError):
+            bien.save()
+        self.assertEqual((self.activos(self.ana), self.activos(self.luis)), (1, 5))
+
+    def test_recalcular(self):
+        self.crear_bienes(self.ana, 3)
+        ResponsableCustodio.objects.filter(pk=self.ana.pk).update(bienes_activos=0)
+        ResponsableCustodio.objects.filter(pk=self.luis.pk).update(bienes_activos=2)
+        self.assertEqual(CustodioService.recalcular_bienes_activos(), 2)
+        self.assertEqual((self.activos(self.ana), self.activos(self.luis)), (3, 0))
+
+    def test_listado_muestra_contador(self):
+        self.crear_bienes(self.ana, 2)
+        analista = Usuario.objects.create_user(
+            username="analista", password="clave", rol=Usuario.ANALISTA
+        )
+        self.client.force_login(analista)
+        with mock.patch.object(Bien, "MAX_POR_CUSTODIO", 2):
+            respuesta = self.client.get(reverse("custodios_list"))
+        self.assertContains(respuesta, "2 / 2")
+        self.assertContains(respuesta, "bg-danger")
+
+    def test_clean_lee_solo_el_contador(self):
+        self.crear_bienes(self.ana, 5)
+        bien = Bien(custodio_id=self.ana.pk, codigo="SEXTO", detalle="PC")
+        with CaptureQueriesContext(connection) as contexto:
+            with self.assertRaisesMessage(ValidationError, "Ana ya tiene el máximo"):
+                bien.clean()
+        (consulta,) = contexto.captured_queries
+        self.assertIn("bienes_activos", consulta["sql"])
+
+
+@override_settings(PERFIL_CONSULTAS=True, PERFIL_CONSULTAS_UMBRAL_N1=3)
+class PerfilConsultasTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.analista = Usuario.objects.create_user(
+            username="analista", password="clave", rol=Usuario.ANALISTA
+        )
+        crear_datos(cls.analista, 4, "99")
+
+    def procesar(self, vista):
+        middleware = PerfilConsultasMiddleware(vista)
+        with self.assertLogs("apppolizas.middleware", "INFO") as logs:
+            response = middleware(RequestFactory().get("/prueba/"))
+        return response, logs.output
+
+    def test_detecta_n1_en_codigo(self):
+        def vista(request):
+            nombres = [p.aseguradora.nombre for p in Poliza.objects.all()]
+            return HttpResponse(",".join(nombres))
+
+        response, logs = self.procesar(vista)
+        self.assertEqual(response["X-Consultas-BD"], "5")
+        self.assertEqual(response["X-Consultas-N1"], "1")
+        self.assertIn("apppolizas/tests.py", response["X-Consultas-N1-Origen"])
+        self.assertTrue(any("Posible N+1" in linea for linea in logs))
+
+    def test_detecta_n1_en_plantilla(self):
+        plantilla = Template(
+            "{% for p in polizas %}\n{{ p.broker.nombre }}\n{% endfor %}",
+            origin=Origin(name="prueba.html", template_name="prueba.html"),
+        )
+
+        def vista(request):
+            polizas = Poliza.objects.all()
+            return HttpResponse(plantilla.render(Context({"polizas": polizas})))
+
+        response, _ = self.procesar(vista)
+        self.assertTrue(response["X-Consultas-N1-Origen"].startswith("prueba.html:2"))
+
+    def test_sin_repeticiones(self):
+        def vista(request):
+            list(Poliza.objects.select_related("aseguradora"))
+            return HttpResponse("ok")
+
+        response, _ = self.procesar(vista)
+        self.assertEqual(response["X-Consultas-BD"], "1")
+        self.assertEqual(response["X-Consultas-N1"], "0")
+        self.assertNotIn("X-Consultas-N1-Origen", response)
+
+    def test_cabeceras_en_pagina_real(self):
+        self.client.force_login(self.analista)
+        with self.assertLogs("apppolizas.middleware", "INFO"):
+            response = self.client.get(reverse("custodios_list"))
+        self.assertGreater(int(response["X-Consultas-BD"]), 0)
+        self.assertIn("X-Tiempo-BD-ms", response)
+
+    @override_settings(PERFIL_CONSULTAS=False)
+    def test_desactivado(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            PerfilConsultasMiddleware(lambda request: HttpResponse())
+
+
+class MetricasTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.analista = Usuario.objects.create_user(
+            username="analista", password="clave", rol=Usuario.ANALISTA
+        )
+        crear_datos(cls.analista, 1, "98")
+
+    def test_formato_exposicion(self):
+        histograma = metricas.Histograma(
+            "prueba_segundos", "Ayuda", ("vista",), cubetas=(0.1, 1)
+        )
+        histograma.observar(0.05, vista='a"b')
+        histograma.observar(2, vista='a"b')
+        contador = metricas.Contador("prueba_total", "Ayuda", ("estado",))
+        contador.inc(estado=200)
+        registro = metricas.Registro()
+        registro.registrar(histograma)
+        registro.registrar(contador)
+
+        texto = registro.exposicion()
+        self.assertIn("# TYPE prueba_segundos histogram", texto)
+        self.assertIn('prueba_segundos_bucket{vista="a\\"b",le="0.1"} 1', texto)
+        self.assertIn('prueba_segundos_bucket{vista="a\\"b",le="1.0"} 1', texto)
+        self.assertIn('prueba_segundos_bucket{vista="a\\"b",le="+Inf"} 2', texto)
+        self.assertIn('prueba_segundos_count{vista="a\\"b"} 2', texto)
+        self.assertIn('prueba_total{estado="200"} 1', texto)
+
+    def test_cuenta_operaciones_de_negocio(self):
+        contador = metricas.operaciones_total
+        clave_ok = ("crear_siniestro", "ok")
+        clave_error = ("crear_siniestro", "error")
+        antes_ok = contador.valores.get(clave_ok, 0)
+        antes_error = contador.valores.get(clave_error, 0)
+
+        poliza = Poliza.objects.get()
+        bien = Bien.objects.get()
+        SiniestroService.crear_siniestro(
+            poliza,
+            {
+                "custodio": bien.custodio,
+                "bien": bien,
+                "tipo_siniestro": "DAÑO",
+                "fecha_siniestro": date.today(),
+                "ubicacion_bien": "Loja",
+                "causa_siniestro": "Caída",
+            },
+            self.analista,
+        )
+        poliza.estado = False
+        with self.assertRaises(ValidationError):
+            SiniestroService.crear_siniestro(poliza, {}, self.analista)
+
+        self.assertEqual(contador.valores[clave_ok], antes_ok + 1)
+        self.assertEqual(contador.valores[clave_error], antes_error + 1)
+
+    @override_settings(METRICAS_TOKEN="secreto")
+    def test_endpoint_con_latencia_por_vista(self):
+        self.client.force_login(self.analista)
+        self.client.get(reverse("custodios_list"))
+
+        response = self.client.get(
+            reverse("metricas"), HTTP_AUTHORIZATION="Bearer secreto"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        texto = response.content.decode()
+        self.assertIn(
+            'apppolizas_http_peticion_duracion_segundos_count{vista="custodios_list",'
+            'metodo="GET"}',
+            texto,
+        )
+
+    @override_settings(METRICAS_TOKEN="secreto")
+    def test_endpoint_exige_token_o_administrador(self):
+        url = reverse("metricas")
+        # Detrás de un proxy local todo llega desde 127.0.0.1: no basta
+        self.assertEqual(self.client.get(url).status_code, 403)
+        respuesta = self.client.get(url, HTTP_AUTHORIZATION="Bearer otro")
+        self.assertEqual(respuesta.status_code, 403)
+        self.client.force_login(self.analista)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        admin = Usuario.objects.create_user(
+            username="admin", password="clave", rol=Usuario.ADMINISTRADOR
+        )
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_volcado_fuera_del_hilo_de_la_peticion(self):
+        registro = metricas.Registro()
+        hilos = []
+        with tempfile.TemporaryDirectory() as directorio, override_settings(
+            METRICAS_DIRECTORIO=directorio
+        ), mock.patch.object(
+            registro,
+            "volcar_a_disco",
+            side_effect=lambda: hilos.append(threading.current_thread().name),
+        ):
+            registro.programar_volcado()
+            for _ in range(100):
+                if hilos:
+                    break
+                time.sleep(0.01)
+        self.assertEqual(hilos, ["metricas-volcado"])
+
+    def test_suma_volcados_de_varios_procesos(self):
+        contador = metricas.Contador("prueba_total", "Ayuda", ("estado",))
+        registro = metricas.Registro()
+        registro.registrar(contador)
+        contador.valores[("200",)] = 3
+        with tempfile.TemporaryDirectory() as directorio:
+            with open(f"{directorio}/metricas_1.json", "w") as archivo:
+                json.dump({"prueba_total": [[["200"], 4], [["500"], 1]]}, archivo)
+            with override_settings(METRICAS_DIRECTORIO=directorio):
+                texto = registro.exposicion()
+                registro.volcar_a_disco()
+        self.assertIn('prueba_total{estado="200"} 7', texto)
+        self.assertIn('prueba_total{estado="500"} 1', texto)
+
+
+class LogsEnColaTest(TestCase):
+    def test_escribe_en_el_destino_desde_otro_hilo(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = f"{directorio}/app.log"
+            manejador = ManejadorCola("logging.FileHandler", filename=ruta)
+            manejador.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+            logger = logging.getLogger("prueba_cola")
+            logger.addHandler(manejador)
+            try:
+                logger.warning("Siniestro %s rechazado", 7)
+            finally:
+                logger.removeHandler(manejador)
+                manejador.close()
+            with open(ruta) as archivo:
+                self.assertEqual(archivo.read(), "WARNING Siniestro 7 rechazado\n")
+
+    def test_formulario_invalido_no_imprime(self):
+        analista = Usuario.objects.create_user(
+            username="analista", password="clave", rol=Usuario.ANALISTA
+        )
+        crear_datos(analista, 2, "97")
+        primero, segundo = Bien.objects.order_by("codigo")
+        datos = {
+            "poliza": Poliza.objects.first().pk,
+            "custodio": primero.custodio_id,
+            "bien": segundo.pk,
+            "fecha_siniestro": date.today().isoformat(),
+            "tipo_siniestro": "Robo",
+            "ubicacion_bien": "Loja",
+            "causa_siniestro": "Hurto",
+        }
+        self.client.force_login(analista)
+        with mock.patch("sys.stdout", new_callable=io.StringIO) as salida:
+            with self.assertLogs("apppolizas", "DEBUG") as logs:
+                self.client.post(reverse("siniestros"), datos)
+        self.assertEqual(salida.getvalue(), "")
+        self.assertIn("no pertenece al custodio", logs.output[0])
+        self.assertIn("Formulario de siniestro inválido", logs.output[-1])
+
+
+class CarteraSinteticaTest(TestCase):
+    def test_misma_semilla_mismos_datos(self):
+        def generar():
+            ids = {modelo: 1 for modelo in CarteraSinteticaService.MODELOS}
+            filas = semillas.bloque(20, semillas.nuevo_azar(7, 1), ids, [1], [1])
+            return [
+                (p.numero_poliza, p.prima_base, p.vigencia_inicio)
+                for p in filas[Poliza]
+            ] + [(s.bien_id, s.estado_tramite) for s in filas[Siniestro]]
+
+        self.assertEqual(generar(), generar())
+
+    def test_genera_cartera_consistente(self):
+        creadas = CarteraSinteticaService.generar(30, semilla=3, tamano_bloque=7)
+
+        self.assertEqual(creadas[Poliza], 30)
+        self.assertEqual(Factura.objects.count(), 30)
+        self.assertEqual(Siniestro.objects.count(), creadas[Siniestro])
+        # Los siniestros usan bienes de su propio custodio
+        self.assertFalse(
+            Siniestro.objects.exclude(custodio_id=F("bien__custodio_id")).exists()
+        )
+        # Lo que mantienen las señales quedó reconstruido
+        for custodio in ResponsableCustodio.objects.all():
+            activos = custodio.bienes.filter(estado_operativo="ACTIVO").count()
+            self.assertEqual(custodio.bienes_activos, activos)
+            self.assertLessEqual(custodio.bienes.count(), Bien.MAX_POR_CUSTODIO)
+        self.assertEqual(
+            PolizaEstadistica.objects.aggregate(total=Sum("total_siniestros"))["total"],
+            creadas[Siniestro],
+        )
+        factura = Factura.objects.first()
+        self.assertEqual(
+            factura.valor_a_pagar,
+            facturacion.calcular(
+                factura.prima,
+                factura.fecha_emision,
+                factura.fecha_pago,
+                factura.retenciones,
+                factura.pagado,
+            ).valor_a_pagar,
+        )
+
+
+class BenchmarkTest(TestCase):
+    def test_guarda_y_compara_linea_base(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            base = f"{directorio}/base.json"
+            opciones = {"tamanos": "3", "repeticiones": 1, "bd_actual": True}
+
+            call_command(
+                "benchmark", base=base, guardar=True, stdout=io.StringIO(), **opciones
+            )
+            with open(base) as archivo:
+                medidas = json.load(archivo)["resultados"]["3"]
+            self.assertIn("vista.siniestros", medidas)
+            self.assertGreater(medidas["vista.siniestros"]["consultas"], 0)
+
+            salida = io.StringIO()
+            call_command("benchmark", base=base, stdout=salida, **opciones)
+        self.assertIn("pdf.reporte_general", salida.getvalue())
+        self.assertNotIn("(nuevo)", salida.getvalue())
+
+
+class SeedPortfolioTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.analista = Usuario.objects.create_user(
+            username="analista_semilla", password="x", rol=Usuario.ANALISTA
+        )
+
+    def test_cartera_con_todos_los_estados_y_contadores(self):
+        salida = io.StringIO()
+        call_command("seed_portfolio", "12", bloque=5, hilos=1, stdout=salida)
+
+        self.assertIn("Finiquito", salida.getvalue())
+        self.assertEqual(
+            Poliza.objects.filter(usuario_gestor=self.analista).count(), 12
+        )
+        self.assertEqual(
+            set(Siniestro.objects.values_list("estado_tramite", flat=True)),
+            set(semillas.ESTADOS_TRAMITE),
+        )
+        self.assertEqual(
+            Finiquito.objects.count(),
+            Siniestro.objects.filter(estado_tramite="LIQUIDADO").count(),
+        )
+        self.analista.refresh_from_db()
+        self.assertEqual(
+            self.analista.notificaciones_no_leidas,
+            Notificacion.objects.filter(
+                usuario=self.analista, estado="PENDIENTE"
+            ).count(),
+        )
+
+    def test_misma_semilla_mismos_datos_por_bloque(self):
+        ids = {modelo: 1 for modelo in CarteraSinteticaService.MODELOS}
+        capacidad = semillas.capacidad_bloque(10)
+        filas = semillas.bloque(10, semillas.nuevo_azar(5, 0), dict(ids), [1], [1])
+        for modelo, instancias in filas.items():
+            # Cada bloque se queda dentro de su rango de ids
+            self.assertLessEqual(
+                max((i.pk for i in instancias), default=0), capacidad[modelo]
+            )
+        repetidas = semillas.bloque(10, semillas.nuevo_azar(5, 0), dict(ids), [1], [1])
+        self.assertEqual(
+            [s.numero_reclamo for s in filas[Siniestro]],
+            [s.numero_reclamo for s in repetidas[Siniestro]],
+        )
+
+    def test_valida_argumentos(self):
+        with self.assertRaises(CommandError):
+            call_command("seed_portfolio", "0", stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command("seed_portfolio", "3", usuario=["nadie"], stdout=io.StringIO())
@@ -1,18 +1,43 @@
 from django.urls import path
 
-from .views import (AdminUsuariosView, BienDetailApiView,
-                    BienesPorCustodioView, CustodioDetailApiView,
-                    CustodioListView, DashboardAdminView,
-                    DashboardAnalistaView, EnviarAseguradoraView,
-                    FiniquitoCreateView, LoginView, PolizaDeleteView,
-                    PolizaDetailView, PolizaListView, PolizaUpdateView,
-                    RepararSiniestroView, SiniestroDeleteEvidenciaView,
-                    SiniestroDeleteView, SiniestroDetailView,
-                    SiniestroEditView, SiniestroListView, SubirEvidenciaView,
-                    UsuarioCRUDView, buscar_bienes_ajax, buscar_custodios_ajax,
-                    crear_factura, generar_pdf_factura, lista_facturas,
-                    lista_notificaciones, logout_view,
-                    marcar_notificacion_leida, ReporteGeneralPDFView) 
+from .views import (
+    AdminUsuariosView,
+    BienDetailApiView,
+    BienesPorCustodioView,
+    CustodioDetailApiView,
+    CustodioListView,
+    DashboardAdminView,
+    DashboardAnalistaView,
+    EnviarAseguradoraView,
+    FiniquitoCreateView,
+    ImportarPolizasView,
+    LoginView,
+    PolizaDeleteView,
+    PolizaDetailView,
+    PolizaListView,
+    PolizaUpdateView,
+    RepararSiniestroView,
+    ReporteGeneralPDFView,
+    SiniestroDeleteEvidenciaView,
+    SiniestroDeleteView,
+    SiniestroDetailView,
+    SiniestroEditView,
+    SiniestroListView,
+    SubirEvidenciaView,
+    UsuarioCRUDView,
+    buscar_bienes_ajax,
+    buscar_custodios_ajax,
+    crear_factura,
+    estado_tarea,
+    exportar_csv,
+    generar_pdf_factura,
+    lista_facturas,
+    lista_notificaciones,
+    logout_view,
+    marcar_notificacion_leida,
+    marcar_notificaciones_leidas,
+    metricas,
+)
 
 urlpatterns = [
     path("", LoginView.as_view(), name="login"),
@@ -42,6 +67,7 @@ urlpatterns = [
     # Pólizas
     path("polizas/", PolizaListView.as_view(), name="polizas_list"),
     path("polizas/<int:pk>/", PolizaDetailView.as_view(), name="poliza_detail"),
+    path("polizas/importar/", ImportarPolizasView.as_view(), name="importar_polizas"),
     path("polizas/editar/<int:pk>/", PolizaUpdateView.as_view(), name="poliza_update"),
     path(
         "polizas/eliminar/<int:pk>/", PolizaDeleteView.as_view(), name="poliza_delete"
@@ -111,6 +137,11 @@ urlpatterns = [
         marcar_notificacion_leida,
         name="marcar_notificacion_leida",
     ),
+    path(
+        "notificaciones/marcar-leidas/",
+        marcar_notificaciones_leidas,
+        name="marcar_notificaciones_leidas",
+    ),
     # Buscador custodio y bienes
     path("ajax/buscar-custodios/", buscar_custodios_ajax, name="buscar_custodios_ajax"),
     path("ajax/buscar-bienes/", buscar_bienes_ajax, name="buscar_bienes_ajax"),
@@ -122,4 +153,10 @@ urlpatterns = [
         generar_pdf_factura,
         name="generar_pdf_factura",
     ),
+    # Tareas en segundo plano
+    path("tareas/<int:tarea_id>/estado/", estado_tarea, name="estado_tarea"),
+    # Exportaciones CSV (polizas, siniestros, facturas)
+    path("exportar/<str:tipo>/", exportar_csv, name="exportar_csv"),
+    # Métricas en formato Prometheus (token Bearer o sesión de administrador)
+    path("metricas/", metricas, name="metricas"),
 ]
\ No newline at end of file
@@ -1,32 +1,65 @@
+import hmac
 import json
+import logging
 from datetime import date
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import login, logout
-from collections import Counter
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import ValidationError
 from django.db import transaction
-from django.db.models import Q
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template.loader import get_template
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
 from django.views.generic import DetailView, TemplateView, View
 from xhtml2pdf import pisa
 
-from apppolizas.models import (Bien, DocumentoSiniestro, Factura, Poliza,
-                               ResponsableCustodio, Siniestro)
-
-from .forms import (CustodioForm, DocumentoSiniestroForm, FacturaForm,
-                    FiniquitoForm, PolizaForm, SiniestroEditForm,
-                    SiniestroForm, SiniestroPorPolizaForm)
-from .repositories import (FiniquitoRepository, SiniestroRepository,
-                           UsuarioRepository)
-from .services import (AuthService, BienService, CustodioService,
-                       DocumentoService, FacturaService, FiniquitoService,
-                       NotificacionService, PolizaService, SiniestroService)
+from apppolizas.models import (
+    Bien,
+    DocumentoSiniestro,
+    Factura,
+    Poliza,
+    ResponsableCustodio,
+    Siniestro,
+    Usuario,
+)
+
+from .forms import (
+    CustodioForm,
+    DocumentoSiniestroForm,
+    FacturaForm,
+    FiniquitoForm,
+    PolizaForm,
+    SiniestroEditForm,
+    SiniestroForm,
+    SiniestroPorPolizaForm,
+)
+from .metricas import pdf_duracion, registro
+from .repositories import FiniquitoRepository, SiniestroRepository, UsuarioRepository
+from .services import (
+    AuthService,
+    BienService,
+    CustodioService,
+    DashboardStatsService,
+    DocumentoService,
+    ExportacionService,
+    FacturaPDFService,
+    FacturaService,
+    FiniquitoService,
+    ImportacionPolizasService,
+    NotificacionService,
+    PolizaService,
+    ReporteService,
+    SiniestroService,
+    TareaService,
+)
+
+logger = logging.getLogger(__name__)
 
 
 # =====================================================
@@ -72,8 +105,8 @@ class LoginView(View):
         except ValidationError as e:
             return JsonResponse({"success": False, "error": str(e)}, status=401)
 
-        except Exception as e:
-            print("ERROR LOGIN:", e)
+        except Exception:
+            logger.exception("Error interno en el login")
             return JsonResponse(
                 {"success": False, "error": "Error interno del servidor"}, status=500
             )
@@ -92,8 +125,9 @@ class DashboardAdminView(LoginRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["total_usuarios"] = UsuarioRepository.get_all_usuarios().count()
-        context["total_polizas"] = PolizaService.listar_polizas().count()
+        stats = DashboardStatsService.obtener()
+        context["total_usuarios"] = stats["total_usuarios"]
+        context["total_polizas"] = stats["total_polizas"]
         return context
 
 
@@ -119,13 +153,12 @@ class DashboardAnalistaView(LoginRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["total_activas"] = PolizaService.contar_polizas_activas()
-        context["total_vencidas"] = PolizaService.contar_polizas_vencidas()
-        context["total_siniestros"] = SiniestroService.listar_todos().count()
-        context["total_facturas"] = FacturaService.listar_facturas().count()
-        context["ultimos_siniestros"] = SiniestroService.listar_todos().order_by(
-            "-fecha_siniestro"
-        )[:5]
+        stats = DashboardStatsService.obtener()
+        context["total_activas"] = stats["total_activas"]
+        context["total_vencidas"] = stats["total_vencidas"]
+        context["total_siniestros"] = stats["total_siniestros"]
+        context["total_facturas"] = stats["total_facturas"]
+        context["ultimos_siniestros"] = stats["ultimos_siniestros"]
         return context
 
 
@@ -205,7 +238,7 @@ class PolizaListView(LoginRequiredMixin, View):
         return super().dispatch(request, *args, **kwargs)
 
     def get(self, request):
-        polizas = PolizaService.listar_polizas()
+        polizas = PolizaService.listar_polizas_paginado(request.GET.get("cursor"))
         form = PolizaForm()
         return render(request, self.template_name, {"polizas": polizas, "form": form})
 
@@ -227,7 +260,7 @@ class PolizaListView(LoginRequiredMixin, View):
             except Exception as e:
                 messages.error(request, str(e))
 
-        polizas = PolizaService.listar_polizas()
+        polizas = PolizaService.listar_polizas_paginado(request.GET.get("cursor"))
         return render(request, self.template_name, {"polizas": polizas, "form": form})
 
 
@@ -286,6 +319,46 @@ class PolizaDetailView(LoginRequiredMixin, DetailView):
         return context
 
 
+class ImportarPolizasView(LoginRequiredMixin, View):
+    """Carga masiva de pólizas o facturas (CSV/XLSX); responde JSON"""
+
+    # Errores que viajan en la respuesta; el total siempre se informa
+    MAX_ERRORES = 200
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.user.rol != "analista":
+            return JsonResponse({"error": "No autorizado"}, status=403)
+        return super().dispatch(request, *args, **kwargs)
+
+    def post(self, request):
+        archivo = request.FILES.get("archivo")
+        if archivo is None:
+            return JsonResponse({"error": "Adjunte un archivo CSV o XLSX"}, status=400)
+        simular = request.POST.get("simular") in ("1", "true", "on")
+        try:
+            resultado = ImportacionPolizasService.importar(
+                archivo,
+                archivo.name,
+                request.POST.get("tipo", "polizas"),
+                usuario=request.user,
+                simular=simular,
+            )
+        except ValidationError as e:
+            return JsonResponse({"error": "; ".join(e.messages)}, status=400)
+
+        return JsonResponse(
+            {
+                "simulacion": simular,
+                "guardados": dict(resultado.guardados),
+                "total_errores": len(resultado.errores),
+                "errores": [
+                    {"fila": fila, "mensaje": mensaje}
+                    for fila, mensaje in resultado.errores[: self.MAX_ERRORES]
+                ],
+            }
+        )
+
+
 # ------------------------------------------------------
 # SINESTRO
 # ------------------------------------------------------
@@ -298,43 +371,24 @@ class SiniestroListView(LoginRequiredMixin, View):
         return super().dispatch(request, *args, **kwargs)
 
     def get(self, request):
-        siniestros = SiniestroService.listar_todos()
         query = request.GET.get("q")
-        if query:
-            siniestros = siniestros.filter(
-                Q(custodio__nombre_completo__icontains=query)
-                | Q(custodio__identificacion__icontains=query)
-            )
-
         return render(
             request,
             self.template_name,
             {
-                "siniestros": siniestros,
-                "total_siniestros": siniestros.count(),
-                "total_polizas": siniestros.values("poliza").distinct().count(),
+                "siniestros": SiniestroService.listar_paginado(
+                    request.GET.get("cursor"), query
+                ),
                 "form": SiniestroForm(),
             },
         )
 
     # views.py (SiniestroListView)
     def post(self, request, *args, **kwargs):
-        print("=== INICIANDO CREACIÓN DE SINIESTRO ===")
-        print(f"POST data recibido: {request.POST}")
-
         form = SiniestroForm(request.POST)
-        print(f"Formulario creado: {form}")
-        print(f"Formulario es válido?: {form.is_valid()}")
-
-        if not form.is_valid():
-            print(f"ERRORES DEL FORMULARIO: {form.errors}")
-            print(f"ERRORES NO CAMPO: {form.non_field_errors()}")
 
         if form.is_valid():
             try:
-                print("✅ Formulario válido - Intentando crear siniestro...")
-                print(f"Datos limpios: {form.cleaned_data}")
-
                 # Filtrar solo los campos que el modelo Siniestro espera
                 datos_siniestro = {
                     "poliza": form.cleaned_data["poliza"],
@@ -346,41 +400,40 @@ class SiniestroListView(LoginRequiredMixin, View):
                     "causa_siniestro": form.cleaned_data["causa_siniestro"],
                 }
 
-                print(f"Datos filtrados para Siniestro: {datos_siniestro}")
-
                 # CORRECCIÓN: El nombre del parámetro debe ser poliza_id
                 siniestro_creado = SiniestroService.crear_siniestro(
                     poliza=form.cleaned_data["poliza"],  # <--- Aquí estaba el error
                     data=datos_siniestro,  # <-- Pasar datos filtrados
                     usuario=request.user,
                 )
-                print(f"✅ Siniestro creado exitosamente: {siniestro_creado}")
+                logger.info(
+                    "Siniestro creado id=%s poliza=%s usuario=%s",
+                    siniestro_creado.pk,
+                    siniestro_creado.poliza_id,
+                    request.user.pk,
+                )
                 messages.success(request, "Siniestro creado")
                 return redirect("siniestros")
             except ValidationError as e:
-                print(f"❌ Error de validación al crear siniestro: {e}")
+                logger.info("Siniestro rechazado: %s", e)
                 messages.error(request, str(e))
             except Exception as e:
-                print(f"❌ Error inesperado al crear siniestro: {e}")
+                logger.exception("Error inesperado al crear siniestro")
                 messages.error(request, f"Error inesperado: {str(e)}")
         else:
             # Si el formulario no es válido, enviamos un mensaje de alerta
-            print("❌ Formulario inválido - Mostrando error al usuario")
+            logger.debug("Formulario de siniestro inválido: %s", form.errors.as_data())
             messages.error(
                 request,
                 "Error en el formulario. Verifique que el activo pertenezca al custodio.",
             )
 
         # IMPORTANTE: Volver a renderizar la página con el formulario que tiene los errores
-        print("🔄 Renderizando página con formulario y errores...")
-        siniestros = SiniestroService.listar_todos()
         return render(
             request,
             self.template_name,
             {
-                "siniestros": siniestros,
-                "total_siniestros": siniestros.count(),
-                "total_polizas": siniestros.values("poliza").distinct().count(),
+                "siniestros": SiniestroService.listar_paginado(),
                 "form": form,  # Este 'form' ahora contiene los mensajes de error
             },
         )
@@ -396,7 +449,9 @@ class SiniestroPorPolizaView(LoginRequiredMixin, View):
 
     def get(self, request, poliza_id):
         poliza = PolizaService.obtener_poliza(poliza_id)
-        siniestros = SiniestroService.listar_por_poliza(poliza_id)
+        siniestros = SiniestroService.listar_por_poliza_paginado(
+            poliza_id, request.GET.get("cursor")
+        )
 
         return render(
             request,
@@ -419,7 +474,7 @@ class SiniestroPorPolizaView(LoginRequiredMixin, View):
             messages.success(request, "Siniestro registrado correctamente")
             return redirect("siniestros_por_poliza", poliza_id=poliza_id)
 
-        siniestros = SiniestroService.listar_por_poliza(poliza_id)
+        siniestros = SiniestroService.listar_por_poliza_paginado(poliza_id)
         return render(
             request,
             self.template_name,
@@ -475,20 +530,12 @@ class SiniestroEditView(LoginRequiredMixin, View):
         return super().dispatch(request, *args, **kwargs)
 
     def get(self, request, pk):
-        print("=== INICIANDO EDICIÓN DE SINIESTRO ===")
-        print(f"Siniestro ID solicitado: {pk}")
-
         # Usamos el repositorio para obtener los datos
         siniestro = SiniestroRepository.get_by_id(pk)
         if not siniestro:
-            print(f"❌ Siniestro {pk} no encontrado")
+            logger.debug("Siniestro %s no encontrado", pk)
             return redirect("siniestros")
 
-        print(f"✅ Siniestro encontrado: {siniestro}")
-        print(f"  - Póliza: {siniestro.poliza.numero_poliza}")
-        print(f"  - Custodio actual: {siniestro.custodio}")
-        print(f"  - Bien actual: {siniestro.bien}")
-
         # Pre-poblamos campos que no están directamente en el modelo Siniestro
         initial_data = {}
         if siniestro.bien:
@@ -498,72 +545,51 @@ class SiniestroEditView(LoginRequiredMixin, View):
                 "serie": siniestro.bien.serie,
                 "bien_ajax": f"{siniestro.bien.codigo} - {siniestro.bien.detalle}",
             }
-            print(f"📋 Datos iniciales preparados: {initial_data}")
 
         form = SiniestroEditForm(instance=siniestro, initial=initial_data)
-        print(f"📝 Formulario de edición creado")
         return render(
             request, self.template_name, {"form": form, "siniestro": siniestro}
         )
 
     def post(self, request, pk):
-        print("=== INICIANDO ACTUALIZACIÓN DE SINIESTRO ===")
-        print(f"Siniestro ID solicitado: {pk}")
-        print(f"POST data recibido: {request.POST}")
-
         siniestro_instancia = SiniestroRepository.get_by_id(pk)
         if not siniestro_instancia:
-            print(f"❌ Siniestro {pk} no encontrado para actualizar")
+            logger.debug("Siniestro %s no encontrado para actualizar", pk)
             return redirect("siniestros")
 
-        print(f"✅ Siniestro encontrado para actualizar: {siniestro_instancia}")
-
         # Pasamos request.FILES por si algún día permites subir archivos aquí
         form = SiniestroEditForm(
             request.POST, request.FILES, instance=siniestro_instancia
         )
-        print(f"📝 Formulario de edición creado: {form}")
-        print(f"📝 Formulario es válido?: {form.is_valid()}")
-
-        if not form.is_valid():
-            print(f"❌ ERRORES DEL FORMULARIO: {form.errors}")
-            print(f"❌ ERRORES NO CAMPO: {form.non_field_errors()}")
 
         if form.is_valid():
             try:
-                print("✅ Formulario válido - Intentando actualizar siniestro...")
-                print(f"📋 Datos limpios: {form.cleaned_data}")
-
                 # Validación específica para edición
                 custodio = form.cleaned_data.get("custodio")
                 bien = form.cleaned_data.get("bien")
 
                 if custodio and bien:
-                    print(
-                        f"🔍 Verificando integridad - Custodio: {custodio}, Bien: {bien}"
-                    )
-                    print(f"🔍 Bien.custodio: {bien.custodio}")
-                    print(f"🔍 ¿Son iguales?: {bien.custodio == custodio}")
-
-                    if bien.custodio != custodio:
+                    if bien.custodio_id != custodio.pk:
                         error_msg = f"Error de Integridad: El bien '{bien.detalle}' no está registrado a nombre del custodio {custodio.nombre_completo}."
-                        print(f"❌ ERROR DE VALIDACIÓN: {error_msg}")
+                        logger.info(
+                            "Siniestro %s: bien %s no pertenece al custodio %s",
+                            pk,
+                            bien.pk,
+                            custodio.pk,
+                        )
                         messages.error(request, error_msg)
                         return render(
                             request,
                             self.template_name,
                             {"form": form, "siniestro": siniestro_instancia},
                         )
-                    else:
-                        print("✅ Validación de integridad OK")
 
                 # Si usas ModelForm, a veces basta con form.save(),
                 # pero respetamos tu servicio:
-                print("🔄 Llamando al servicio de actualización...")
-                siniestro_actualizado = SiniestroService.actualizar_siniestro(
-                    pk, form.cleaned_data
+                SiniestroService.actualizar_siniestro(pk, form.cleaned_data)
+                logger.info(
+                    "Siniestro actualizado id=%s usuario=%s", pk, request.user.pk
                 )
-                print(f"✅ Siniestro actualizado exitosamente: {siniestro_actualizado}")
 
                 messages.success(request, "Siniestro actualizado correctamente")
 
@@ -571,21 +597,24 @@ class SiniestroEditView(LoginRequiredMixin, View):
                 return redirect("siniestro_detail", pk=pk)
 
             except ValidationError as e:
-                print(f"❌ Error de validación al actualizar siniestro: {e}")
+                logger.info("Actualización del siniestro %s rechazada: %s", pk, e)
                 messages.error(request, str(e))
             except Exception as e:
-                print(f"❌ Error inesperado al actualizar siniestro: {e}")
+                logger.exception("Error inesperado al actualizar el siniestro %s", pk)
                 messages.error(request, f"Error inesperado: {str(e)}")
         else:
             # === AQUÍ ESTABA EL PROBLEMA ===
             # Antes solo hacías print(form.errors). Ahora enviamos el mensaje al usuario.
-            print("❌ Formulario inválido - Mostrando error al usuario")
+            logger.debug(
+                "Formulario de edición del siniestro %s inválido: %s",
+                pk,
+                form.errors.as_data(),
+            )
             messages.error(
                 request,
                 "No se pudo guardar. Verifique que el Bien pertenezca al Custodio seleccionado.",
             )
 
-        print("🔄 Renderizando página de edición con formulario y errores...")
         return render(
             request,
             self.template_name,
@@ -618,7 +647,7 @@ def lista_facturas(request):
     """
     # YA NO USAMOS: Factura.objects.all()
     # USAMOS EL SERVICIO:
-    facturas = FacturaService.listar_facturas()
+    facturas = FacturaService.listar_facturas_paginado(request.GET.get("cursor"))
     return render(request, "lista_facturas.html", {"facturas": facturas})
 
 
@@ -659,22 +688,15 @@ def generar_pdf_factura(request, factura_id):
     except ValidationError:
         return HttpResponse("La factura no existe", status=404)
 
-    template_path = "factura_pdf.html"
-    context = {"factura": factura}
+    # El PDF se renderiza una sola vez por versión de la factura
+    pdf = FacturaPDFService.obtener_pdf(factura)
+    if pdf is None:
+        return HttpResponse("Error al generar PDF", status=500)
 
-    response = HttpResponse(content_type="application/pdf")
+    response = HttpResponse(pdf, content_type="application/pdf")
     response["Content-Disposition"] = (
         f'inline; filename="factura_{factura.numero_factura}.pdf"'
     )
-
-    template = get_template(template_path)
-    html = template.render(context)
-
-    pisa_status = pisa.CreatePDF(html, dest=response)
-
-    if pisa_status.err:
-        return HttpResponse(f"Error al generar PDF: <pre>{html}</pre>")
-
     return response
 
 
@@ -738,7 +760,11 @@ class CustodioListView(LoginRequiredMixin, View):
     def get(self, request):
         # Solo obtenemos la lista para pintarla en el template
         custodios = CustodioService.listar_custodios()
-        return render(request, self.template_name, {"custodios": custodios})
+        return render(
+            request,
+            self.template_name,
+            {"custodios": custodios, "max_bienes": Bien.MAX_POR_CUSTODIO},
+        )
 
 
 # 2. DETALLE DE CUSTODIO (API JSON para el Modal)
@@ -805,26 +831,19 @@ class FiniquitoCreateView(LoginRequiredMixin, View):
     template_name = "finiquito_create.html"
 
     def get(self, request, siniestro_id):
-        print(
-            f"--- DEBUG: Entrando al GET de FiniquitoCreateView para Siniestro {siniestro_id} ---"
-        )
         siniestro = SiniestroRepository.get_by_id(siniestro_id)
-        print(f"--- DEBUG: Resultado de búsqueda siniestro: {siniestro} ---")
 
         # SEGURIDAD 1: Verificar que el siniestro existe
         if not siniestro:
-            print(f"--- DEBUG: Siniestro {siniestro_id} no existe ---")
+            logger.debug("Finiquito: siniestro %s no existe", siniestro_id)
             messages.error(request, "El siniestro no existe.")
             return redirect("siniestros")
 
         # SEGURIDAD 2: Verificar estado o existencia de finiquito
         ya_tiene_finiquito = FiniquitoRepository.get_by_siniestro(siniestro_id)
-        print(f"--- DEBUG: ¿Ya tiene finiquito? {ya_tiene_finiquito} ---")
 
         if siniestro.estado_tramite == "LIQUIDADO" or ya_tiene_finiquito:
-            print(
-                f"--- DEBUG: Siniestro {siniestro_id} ya liquidado o con finiquito existente ---"
-            )
+            logger.debug("Finiquito: siniestro %s ya liquidado", siniestro_id)
             messages.warning(
                 request,
                 "Este siniestro ya ha sido liquidado y no permite nuevas acciones.",
@@ -833,21 +852,14 @@ class FiniquitoCreateView(LoginRequiredMixin, View):
 
         # Si pasa las validaciones, mostramos el formulario
         form = FiniquitoForm(initial={"fecha_finiquito": date.today()})
-        print(
-            f"--- DEBUG: Mostrando formulario de finiquito para siniestro {siniestro_id} ---"
-        )
         return render(
             request, self.template_name, {"form": form, "siniestro": siniestro}
         )
 
     def post(self, request, siniestro_id):
-        print(f"--- DEBUG: Recibiendo POST para Siniestro {siniestro_id} ---")
         form = FiniquitoForm(request.POST, request.FILES)
-        print(f"--- DEBUG: Datos recibidos en POST: {request.POST} ---")
-        print(f"--- DEBUG: Archivos recibidos en POST: {request.FILES} ---")
 
         if form.is_valid():
-            print(f"--- DEBUG: Formulario válido para Siniestro {siniestro_id} ---")
             try:
                 # Llamamos al servicio para calcular y guardar
                 finiquito = FiniquitoService.liquidar_siniestro(
@@ -856,7 +868,13 @@ class FiniquitoCreateView(LoginRequiredMixin, View):
                     archivo_firmado=request.FILES.get("documento_firmado"),
                     usuario=request.user,
                 )
-                print(f"--- DEBUG: Finiquito creado correctamente: {finiquito} ---")
+                logger.info(
+                    "Siniestro liquidado id=%s finiquito=%s valor=%s usuario=%s",
+                    siniestro_id,
+                    finiquito.pk,
+                    finiquito.valor_final_pago,
+                    request.user.pk,
+                )
                 messages.success(
                     request,
                     f"Siniestro Liquidado. Valor a Pagar: ${finiquito.valor_final_pago}",
@@ -864,17 +882,16 @@ class FiniquitoCreateView(LoginRequiredMixin, View):
                 return redirect("siniestro_detail", pk=siniestro_id)
 
             except ValidationError as e:
-                print(
-                    f"--- DEBUG: Error de validación al liquidar siniestro {siniestro_id}: {e} ---"
-                )
+                logger.info("Liquidación del siniestro %s rechazada: %s", siniestro_id, e)
                 messages.error(request, str(e))
         else:
-            print(f"--- DEBUG: Errores del formulario: {form.errors} ---")
+            logger.debug(
+                "Formulario de finiquito del siniestro %s inválido: %s",
+                siniestro_id,
+                form.errors.as_data(),
+            )
 
         siniestro = SiniestroRepository.get_by_id(siniestro_id)
-        print(
-            f"--- DEBUG: Renderizando nuevamente formulario por error en POST para siniestro {siniestro_id} ---"
-        )
         return render(
             request, self.template_name, {"form": form, "siniestro": siniestro}
         )
@@ -976,7 +993,9 @@ def lista_notificaciones(request):
     # Si tu usuario está en request.session['usuario_id'], ajusta esto.
     # Usaremos request.user suponiendo autenticación estándar de Django:
 
-    notificaciones = NotificacionService.listar_mis_notificaciones(request.user)
+    notificaciones = NotificacionService.listar_mis_notificaciones_paginado(
+        request.user, request.GET.get("cursor")
+    )
 
     return render(
         request, "lista_notificaciones.html", {"notificaciones": notificaciones}
@@ -990,16 +1009,27 @@ def marcar_notificacion_leida(request, notificacion_id):
     return redirect("lista_notificaciones")
 
 
+@login_required
+@require_POST
+def marcar_notificaciones_leidas(request):
+    """Marca como leídas las alertas seleccionadas o todas ('todas' en el POST)"""
+    if request.POST.get("todas"):
+        ids = None
+    else:
+        ids = [i for i in request.POST.getlist("ids") if i.isdigit()]
+    marcadas = NotificacionService.marcar_leidas(request.user, ids)
+    messages.success(request, f"{marcadas} notificación(es) marcadas como leídas.")
+    return redirect("lista_notificaciones")
+
+
 def buscar_custodios_ajax(request):
     term = request.GET.get("term", "")
-    # Buscamos por nombre o cédula
-    custodios = ResponsableCustodio.objects.filter(
-        nombre_completo__icontains=term
-    ) | ResponsableCustodio.objects.filter(identificacion__icontains=term)
+    # Buscamos por nombre o cédula (sin tildes) en el índice en memoria
+    custodios = CustodioService.buscar_custodios(term)
 
     results = [
-        {"id": c.id, "text": f"{c.nombre_completo} ({c.identificacion})"}
-        for c in custodios[:10]
+        {"id": pk, "text": f"{nombre} ({identificacion})"}
+        for pk, nombre, identificacion in custodios
     ]
     return JsonResponse({"results": results})
 
@@ -1009,13 +1039,10 @@ def buscar_bienes_ajax(request):
     term = request.GET.get("term", "")
     custodio_id = request.GET.get("custodio_id")  # Viene del JS como string o vacío
 
-    query = Q(estado_operativo="ACTIVO") & (
-        Q(codigo__icontains=term) | Q(detalle__icontains=term)
-    )
-    bienes = Bien.objects.filter(query)
+    if not (custodio_id and custodio_id.isdigit()):  # Validación de seguridad
+        custodio_id = None
 
-    if custodio_id and custodio_id.isdigit():  # Validación de seguridad
-        bienes = bienes.filter(custodio_id=int(custodio_id))
+    bienes = BienService.buscar_bienes(term, custodio_id)
 
     results = []
     for b in bienes:
@@ -1038,6 +1065,54 @@ def buscar_bienes_ajax(request):
     return JsonResponse({"results": results})
 
 
+# Estado de una tarea en segundo plano (el frontend la consulta cada pocos segundos)
+@login_required
+def estado_tarea(request, tarea_id):
+    try:
+        return JsonResponse(TareaService.consultar_estado(tarea_id, request.user))
+    except ValidationError as e:
+        return JsonResponse({"error": e.messages[0]}, status=404)
+
+
+# Descarga CSV en streaming (?formato=gz para comprimir)
+@login_required
+def exportar_csv(request, tipo):
+    if request.user.rol not in ("admin", "analista"):
+        return HttpResponse("No autorizado", status=403)
+    comprimir = request.GET.get("formato") == "gz"
+    try:
+        nombre, contenido = ExportacionService.exportar(tipo, comprimir)
+    except ValidationError as e:
+        return HttpResponse(e.messages[0], status=404)
+
+    response = StreamingHttpResponse(
+        contenido,
+        content_type="application/gzip" if comprimir else "text/csv; charset=utf-8",
+    )
+    response["Content-Disposition"] = f'attachment; filename="{nombre}"'
+    return response
+
+
+# Métricas para Prometheus: el scraper manda "Authorization: Bearer <token>"
+# con METRICAS_TOKEN; un administrador con sesión también puede verlas
+def _puede_ver_metricas(request):
+    token = settings.METRICAS_TOKEN
+    cabecera = request.META.get("HTTP_AUTHORIZATION", "")
+    if token and cabecera.startswith("Bearer "):
+        enviado = cabecera.removeprefix("Bearer ")
+        return hmac.compare_digest(enviado.encode(), token.encode())
+    return request.user.is_authenticated and request.user.rol == Usuario.ADMINISTRADOR
+
+
+@require_GET
+def metricas(request):
+    if not _puede_ver_metricas(request):
+        return HttpResponse("No autorizado", status=403)
+    return HttpResponse(
+        registro.exposicion(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 class ReporteGeneralPDFView(LoginRequiredMixin, View):
     def dispatch(self, request, *args, **kwargs):
         if request.user.rol != 'admin':
@@ -1045,44 +1120,20 @@ class ReporteGeneralPDFView(LoginRequiredMixin, View):
         return super().dispatch(request, *args, **kwargs)
 
     def get(self, request):
-        # 1. Obtener datos
-        polizas = PolizaService.listar_polizas()
-        siniestros = SiniestroService.listar_todos()
-
-        # --- 2. LÓGICA NUEVA: CALCULAR LA PÓLIZA MÁS USADA ---
-        poliza_top = "Ninguna"
-        cantidad_top = 0
-
-        if siniestros:
-            # Extraemos los números de póliza de cada siniestro
-            numeros_polizas = [s.poliza.numero_poliza for s in siniestros]
-            # Contamos cual se repite más
-            conteo = Counter(numeros_polizas).most_common(1)
-            
-            if conteo:
-                poliza_top = conteo[0][0] # El nombre (ej. POL-004)
-                cantidad_top = conteo[0][1] # La cantidad (ej. 3)
-        # -----------------------------------------------------
-
-        # 3. Definir el template y el contexto
+        # 1. Obtener datos ya agregados (totales, ranking y desgloses)
         template_path = 'administrador/reporte_general_pdf.html'
-        context = {
-            'polizas': polizas,
-            'siniestros': siniestros,
-            'usuario': request.user,
-            # Pasamos los datos nuevos al HTML:
-            'poliza_mas_siniestrada': poliza_top,
-            'total_reclamos_top': cantidad_top
-        }
+        context = ReporteService.datos_reporte_general()
+        context['usuario'] = request.user
 
-        # 4. Renderizar y crear el PDF
+        # 2. Renderizar y crear el PDF
         response = HttpResponse(content_type='application/pdf')
         response['Content-Disposition'] = 'inline; filename="reporte_general.pdf"'
 
         template = get_template(template_path)
         html = template.render(context)
 
-        pisa_status = pisa.CreatePDF(html, dest=response)
+        with pdf_duracion.medir(documento="reporte_general"):
+            pisa_status = pisa.CreatePDF(html, dest=response)
 
         if pisa_status.err:
             return HttpResponse('Hubo un error al generar el reporte PDF <pre>' + html + '</pre>')
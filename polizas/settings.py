@@ -43,6 +43,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "apppolizas.middleware.MetricasMiddleware",
+    # Lo más afuera posible: cuenta también las consultas de sesión y usuario
+    "apppolizas.middleware.PerfilConsultasMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -64,6 +67,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "apppolizas.context_processors.notificaciones",
             ],
         },
     },
@@ -131,6 +135,99 @@ AUTH_USER_MODEL = "apppolizas.Usuario"
 
 LOGIN_URL = "/"
 
+# Caché compartida por todos los workers (Redis) para que las invalidaciones
+# (dashboard, badge de notificaciones, índice de custodios) lleguen a todos.
+# Sin REDIS_URL cada proceso tiene su propia LocMemCache: sirve para
+# desarrollo con un solo proceso.
+REDIS_URL = os.getenv("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+# Segundos que se guardan en caché los indicadores de los dashboards.
+DASHBOARD_STATS_TTL = 60
+
+# Segundos tras los que cada worker recarga entero el índice de custodios
+# del autocompletado, aunque no haya recibido aviso de cambios.
+INDICE_CUSTODIOS_TTL = 60
+
+# Segundos que se guarda en caché el badge de notificaciones no leídas
+# (se invalida en cuanto cambia el contador del usuario).
+NOTIFICACIONES_BADGE_TTL = 300
+
+# Días que una notificación leída permanece en la tabla viva antes de que
+# `manage.py archivar_notificaciones` la mueva al archivo comprimido.
+NOTIFICACIONES_RETENCION_DIAS = 180
+
+# Perfil de consultas por petición (apppolizas.middleware): cabeceras
+# X-Consultas-BD / X-Tiempo-BD-ms y aviso de N+1 en el log. None = según DEBUG.
+PERFIL_CONSULTAS = None
+# Repeticiones de una misma consulta en una petición para marcarla como N+1
+PERFIL_CONSULTAS_UMBRAL_N1 = 5
+
+# Métricas en formato Prometheus (apppolizas.metricas), publicadas en
+# /metricas/ para administradores con sesión y para quien mande
+# "Authorization: Bearer <METRICAS_TOKEN>". Sin token solo los administradores.
+METRICAS_ACTIVAS = True
+METRICAS_TOKEN = os.getenv("METRICAS_TOKEN") or None
+# Con varios workers (gunicorn) cada proceso vuelca aquí sus métricas y el
+# endpoint las suma; vaciar el directorio al arrancar. None = un solo proceso.
+METRICAS_DIRECTORIO = os.getenv("METRICAS_DIRECTORIO") or None
+
+# Nivel de los logs de la app: en DEBUG se ven los logger.debug(), en
+# producción ni se formatean. NIVELES_LOG ajusta módulos sueltos, p. ej.
+# "apppolizas.forms=DEBUG,apppolizas.tareas=WARNING".
+NIVEL_LOG = os.getenv("NIVEL_LOG", "DEBUG" if DEBUG else "INFO")
+NIVELES_LOG = dict(
+    par.strip().split("=", 1)
+    for par in os.getenv("NIVELES_LOG", "").split(",")
+    if "=" in par
+)
+
+# Todos los handlers van por apppolizas.bitacora.ManejadorCola: la petición
+# solo encola el mensaje y un hilo aparte lo escribe.
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "simple": {"format": "{asctime} {levelname} {name} {message}", "style": "{"},
+    },
+    "handlers": {
+        "consola": {
+            "()": "apppolizas.bitacora.ManejadorCola",
+            "destino": "logging.StreamHandler",
+            "formatter": "simple",
+        },
+        "perfil_consultas": {
+            "()": "apppolizas.bitacora.ManejadorCola",
+            "destino": "logging.handlers.RotatingFileHandler",
+            "filename": BASE_DIR / "perfil_consultas.log",
+            "maxBytes": 5 * 1024 * 1024,
+            "backupCount": 3,
+            "delay": True,
+            "formatter": "simple",
+        },
+    },
+    "loggers": {
+        "apppolizas": {
+            "handlers": ["consola"],
+            "level": NIVEL_LOG,
+        },
+        **{modulo: {"level": nivel.upper()} for modulo, nivel in NIVELES_LOG.items()},
+        "apppolizas.middleware": {
+            "handlers": ["perfil_consultas"],
+            "level": NIVELES_LOG.get("apppolizas.middleware", "INFO").upper(),
+            "propagate": False,
+        },
+    },
+}
+
 
 # Configuración para conectar con tu MinIO local
 # AWS_ACCESS_KEY_ID = 'admin'